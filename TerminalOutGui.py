@@ -1,16 +1,29 @@
 import serial
 import threading
+import queue
+import collections
+import struct
+import bisect
+import codecs
 import time
 import sys
-import math
-import tkinter as tk
-from tkinter import ttk, messagebox
-from tkinter import PhotoImage
-from PIL import Image, ImageTk
+import argparse
+import json
+import re
+import signal
+import subprocess
 import configparser
+import ctypes
+import ctypes.util
+import glob
+import mmap
 import os
+import weakref
+from array import array
 from datetime import datetime
 
+STARTUP_TIME = time.perf_counter()  # Time to first paint is measured from here
+
 CONFIG_FILE = "settings.ini"
 
 APP_NAME = "TerminalOutGui"
@@ -87,177 +100,5159 @@ DEFAULT_ALL_BAUD_RATES_LIST = [
     4000000,
 ]
 
-DEFAULT_LAST_COM_PORT_NUM = ""
-DEFAULT_BUAD_RATE = 115200
-DEFAULT_LOG_PATH = "logs\{COM}_{TIME}.txt"
-DEFAULT_SHOW_TIMESTAMP = False
-DEFAULT_UART_BUFFER_SIZE = 128  # 16 bytes
+COM_PORT_SCAN_POLL_MS = 50
+
+# Transmit, see Transmitter
+TX_CHUNK_BYTES = 16 * 1024  # File data per write when sending unpaced
+TX_STOP_TIMEOUT = 1.0  # Seconds to wait for the write in progress when a port is stopped
+DEFAULT_TX_LINE_ENDING = "LF"
+DEFAULT_TX_LINE_DELAY_MS = 0  # Pause after every line of a text or macro
+DEFAULT_TX_PACE_BYTES = 0  # Byte pacing of files, send this many bytes, 0 = unpaced
+DEFAULT_TX_PACE_DELAY_MS = 0  # then pause this long
+DEFAULT_FLOW_CONTROL = "none"
+MACRO_SECTION_PREFIX = "Macro:"  # Macros are read from settings.ini, see load_macros
+
+TX_LINE_ENDINGS_DICT = {
+    "LF": "\n",
+    "CRLF": "\r\n",
+    "CR": "\r",
+    "none": "",
+}
+
+# Flow control, keyword arguments of serial.Serial
+FLOW_CONTROL_DICT = {
+    "none": {},
+    "rtscts": {"rtscts": True},
+    "xonxoff": {"xonxoff": True},
+}
+
+# Replay of recorded sessions, see ReplayPort
+REPLAY_PREFIX = "replay:"  # Port names starting with this replay the file after it
+REPLAY_PORT_NAME = "Replay Log..."  # Combobox entry, asks for the file on Start
+REPLAY_MAX_READ_BYTES = 64 * 1024  # Largest chunk one read returns when replaying fast
+DEFAULT_REPLAY_SPEED = "original"
+DEFAULT_REPLAY_START = "0"  # Where in the recording replay starts, see parse_replay_start
+
+# Replay speed, multiple of the recorded timing, 0 = as fast as possible
+REPLAY_SPEEDS_DICT = {
+    "original": 1,
+    "10x": 10,
+    "100x": 100,
+    "max": 0,
+}
+LOG_TIMESTAMP_RE = re.compile(rb"(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d{6}) - ")
+
+# Hot-plug, see PortWatcher
+DEFAULT_AUTO_RECONNECT = True
+PORT_WATCH_DIRS = ["/dev", "/dev/serial/by-id"]
+PORT_POLL_INTERVAL = 1.0  # Port list comparison where inotify is not available
+RECONNECT_RETRY_INTERVAL = 0.5  # Retry opening even if no device event arrives
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+INOTIFY_MASK = 0x4 | 0x40 | 0x80 | 0x100 | 0x200  # ATTRIB, MOVED_FROM/TO, CREATE, DELETE
+
+DEFAULT_LAST_COM_PORT_NUM = ""
+DEFAULT_BUAD_RATE = 115200
+DEFAULT_LOG_PATH = "logs\{COM}_{TIME}.txt"
+DEFAULT_SHOW_TIMESTAMP = False
+DEFAULT_UART_BUFFER_SIZE = 128  # 16 bytes
+DEFAULT_READ_MIN_CHUNK = 0  # 0 = auto, about 1 ms worth of bytes at the selected baud rate
+DEFAULT_READ_MAX_WAIT_MS = 10  # Upper bound on how long a partial chunk is held back
+FRAME_GAP_CHARS = 4  # Idle character times that mark the end of a frame
+DEFAULT_GUI_REFRESH_HZ = 30
+GUI_REFRESH_RATES_LIST = [30, 60]
+GUI_QUEUE_MAX_CHUNKS = 4096  # Chunks buffered between the reader thread and the GUI
+DEFAULT_SCROLLBACK_LINES = 10000  # 0 = unlimited
+HISTORY_PAGE_LINES = 500  # Lines paged back in from the log file per scroll
+HISTORY_READ_BLOCK = 64 * 1024
+DEFAULT_LOG_FLUSH_MS = 200  # Longest time received data waits before it is written
+DEFAULT_LOG_FSYNC_ON_STOP = True
+LOG_BATCH_BYTES = 256 * 1024  # Write as soon as this much is pending
+LOG_MAX_QUEUED_BYTES = 64 * 1024 * 1024  # Beyond this the log writer drops data
+LOG_INDEX_INTERVAL_LINES = 1024  # Lines between the checkpoints of a LineIndex
+DEFAULT_LOG_ROTATE_MB = 0  # Start a new log file after this many MB of text, 0 = never
+DEFAULT_LOG_ROTATE_MINUTES = 0  # Also on wall clock boundaries, e.g. 60 = every hour
+DEFAULT_LOG_COMPRESSION = "none"
+DEFAULT_LOG_KEEP_FILES = 0  # Retention, delete the oldest logs beyond this count, 0 = keep all
+DEFAULT_LOG_KEEP_MB = 0  # and beyond this total size, 0 = unlimited
+LOG_GZIP_LEVEL = 6
+LOG_LZMA_PRESET = 1  # Higher presets cannot keep up with a fast port
+LOG_ZSTD_LEVEL = 3
+
+# Log compression, file name suffix per method
+LOG_COMPRESSION_DICT = {
+    "none": "",
+    "gzip": ".gz",
+    "zstd": ".zst",
+    "lzma": ".xz",
+}
+DEFAULT_RAW_CAPTURE = False
+DEFAULT_ENCODING = "utf-8"
+DEFAULT_DECODE_ERRORS = "hex"
+LINE_FLUSH_TIMEOUT_NS = 500_000_000  # An unterminated line (e.g. a prompt) is shown after this
+ENCODINGS_LIST = ["utf-8", "ascii", "latin-1", "cp1252", "cp950", "big5", "gbk", "shift_jis"]
+
+# How undecodable bytes are shown, mapped to codec error handlers
+DECODE_ERRORS_DICT = {
+    "hex": "backslashreplace",  # Inline \x.. escapes
+    "replace": "replace",
+    "ignore": "ignore",
+}
+
+# ANSI escape sequences, see AnsiParser
+DEFAULT_ANSI_VIEW = "render"
+DEFAULT_ANSI_LOG = "raw"
+ANSI_VIEW_MODES_LIST = ["render", "strip", "off"]  # Colours, plain text or the codes as is
+ANSI_LOG_MODES_LIST = ["raw", "stripped"]
+ANSI_SGR_CACHE_SIZE = 1024  # Distinct (SGR sequence, style) pairs remembered per port
+# CSI and OSC sequences, two character escapes and the carriage return. Without
+# capturing groups the regex engine can skip ahead to the next ESC or CR.
+ANSI_ESCAPE_RE = re.compile(
+    r"\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[ -/]*[0-Z\\^-~])|\r"
+)
+ANSI_PARTIAL_RE = re.compile(r"\x1b(?:\[[0-?]*[ -/]*|\][^\x07\x1b]*\x1b?|[ -/]*)$")
+# xterm colours of SGR 30-37 and 90-97, the 256 colour palette starts with them
+ANSI_COLORS_LIST = [
+    "#000000",
+    "#cd0000",
+    "#00cd00",
+    "#cdcd00",
+    "#0000ee",
+    "#cd00cd",
+    "#00cdcd",
+    "#e5e5e5",
+    "#7f7f7f",
+    "#ff0000",
+    "#00ff00",
+    "#ffff00",
+    "#5c5cff",
+    "#ff00ff",
+    "#00ffff",
+    "#ffffff",
+]
+
+WHEEL_ROWS = 3  # Rows per mouse wheel step of the virtual views, see VirtualTextView
+
+# Viewer of past logs, see MappedLog and LogViewer
+LOG_VIEW_INDEX_BLOCK = 256 * 1024  # File bytes per entry of the sparse line index
+LOG_VIEW_MAX_LINE_BYTES = 16 * 1024  # Longer lines are cut off on screen
+LOG_VIEW_POLL_MS = 100
+
+# Hex view of the raw bytes, see ByteRing and HexView
+HEX_ROW_BYTES = 16
+HEX_MAX_READS = 1 << 20  # Reads remembered for the time markers, older ones lose theirs
+HEX_ASCII_TABLE = bytes(b if 0x20 <= b < 0x7F else 0x2E for b in range(256))  # Others as "."
+DEFAULT_HEX_BUFFER_MB = 64  # Raw bytes kept per port for the hex view, 0 = no hex view
+DEFAULT_HEX_TIME_MARKERS = False
+
+# Raw capture container, see RawCapture
+CAPTURE_EXTENSION = ".cap"
+CAPTURE_INDEX_EXTENSION = ".idx"
+CAPTURE_MAGIC = b"TOGCAP01"
+CAPTURE_INDEX_MAGIC = b"TOGIDX01"
+CAPTURE_RECORD = struct.Struct("<qIHB")  # timestamp ns, length, port id, kind
+CAPTURE_INDEX_ENTRY = struct.Struct("<qQQB")  # timestamp ns, record offset, stream offset, kind
+CAPTURE_KIND_DATA = 0
+CAPTURE_KIND_SESSION = 1  # Payload is the utf-8 port name
+CAPTURE_INDEX_INTERVAL = 1024 * 1024  # Capture bytes between index entries
+
+SEARCH_BLOCK_BYTES = 4 * 1024 * 1024  # Log bytes matched per step of the search worker
+SEARCH_POLL_INTERVAL = 0.1  # How often a finished search looks for new log lines
+SEARCH_MATCH_COLOR = "yellow"
+SEARCH_CURRENT_COLOR = "orange"
+
+# Highlight rules are read from settings.ini, one section per rule, see load_highlight_rules
+HIGHLIGHT_SECTION_PREFIX = "Highlight:"
+# Numeric group references in a rule, escaped backslashes are matched to skip them
+GROUP_NUMBER_REF_RE = re.compile(r"\\\\|\\[1-9]|\(\?\(\d")
+
+# Live plots, extract rules are read from settings.ini, see load_plot_rules and PlotData
+PLOT_SECTION_PREFIX = "Plot:"
+PLOT_DECIMATION_LEVELS = (16, 256, 4096)  # Samples per min/max block of each level
+PLOT_WIDTH = 360  # Initial width of the plot panel
+PLOT_REFRESH_MS = 200
+PLOT_CSV_EXTENSION = ".csv"
+PLOT_COLORS_LIST = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2"]
+DEFAULT_PLOT_WINDOW_S = 60
+DEFAULT_PLOT_POINTS = 65536  # Samples kept per series
+DEFAULT_PLOT_CSV = False
+
+# Triggers are read from settings.ini, one section per trigger, see load_triggers
+TRIGGER_SECTION_PREFIX = "Trigger:"
+TRIGGER_ACTIONS_LIST = ["mark", "beep", "send", "stop", "command"]
+
+# Sharing a port with other programs over TCP and WebSocket
+DEFAULT_SHARE_PORT = 0  # TCP port of the first serial port, further ones take the next, 0 = off
+DEFAULT_SHARE_BIND = "127.0.0.1"  # 0.0.0.0 also lets other machines connect
+DEFAULT_SHARE_MODE = "lines"
+DEFAULT_SHARE_WRITE = False  # Clients may write to the port, opt-in
+# WebSocket upgrades from browser pages are only accepted from loopback origins and these,
+# comma separated, e.g. "http://dashboard:8080" or "null" for pages opened from a file
+DEFAULT_SHARE_ORIGINS = ""
+SHARE_LOOPBACK_HOSTS = ("localhost", "127.0.0.1", "::1")
+DEFAULT_SHARE_BUFFER_KB = 1024  # Unsent data per client before it counts as too slow
+DEFAULT_SHARE_SLOW_CLIENT = "skip"
+SHARE_MODES_LIST = ["raw", "lines"]  # The bytes as read, or the decoded lines as logged
+SHARE_SLOW_CLIENT_LIST = ["skip", "disconnect"]  # Skip data until it caught up, or drop it
+SHARE_MAX_PORTS = 16  # Listen ports tried from the configured one on
+SHARE_DETECT_TIMEOUT = 0.2  # A client silent this long is plain TCP, else "GET " = WebSocket
+SHARE_MAX_REQUEST = 16 * 1024  # Largest WebSocket handshake or message accepted
+WEBSOCKET_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC11B65"
+
+# Processing stages between the line framer and the log, see load_stages
+STAGE_SECTION_PREFIX = "Stage:"
+STAGE_TYPES_LIST = ["redact", "filter", "json", "python", "tee"]
+STAGE_MODES_LIST = ["inline", "thread", "process"]  # Reader thread, own thread, worker process
+STAGE_QUEUE_BATCHES = 4096  # Batches waiting for a thread or process stage before it drops
+STAGE_BATCH_LINES = 10000  # Most lines a stage takes at once when batches queued up
+STAGE_MAX_IN_FLIGHT = 4  # Batches of one process stage in the pool at once
+STAGE_PROCESS_WORKERS = 0  # Worker processes shared by all process stages, 0 = one per CPU
+
+# Instrumentation, see MetricsCollector
+METRICS_STATUS_INTERVAL_MS = 1000  # Status bar refresh
+METRICS_FORMATS_LIST = ["prometheus", "jsonl"]
+DEFAULT_METRICS_PATH = ""  # Empty = no metrics file
+DEFAULT_METRICS_FORMAT = "prometheus"
+DEFAULT_METRICS_INTERVAL_S = 10
+CHUNK_SIZE_BUCKETS = 24  # Read sizes are counted in power of two buckets, 1 B to 8 MiB
+PROCESS_TIME_BUCKETS = 24  # Same for the processing time of a read, 1 us to 8 s
+
+# Global variables
+highlighter = None  # Highlighter built from the settings, None until the GUI starts
+app_icon_image = None  # Decoded app_icon.ico, shared by the window and the About dialog
+startup_exit_code = 0
+sessions = {}  # Open ports, port name -> PortSession
+output_views = {}  # Output tabs, port name -> OutputView, None for the initial tab
+gui_queue = queue.Queue(maxsize=GUI_QUEUE_MAX_CHUNKS)  # (view, text, log offset, styles)
+gui_calls = queue.SimpleQueue()  # Functions other threads want run on the GUI thread
+trigger_rules = []  # See load_triggers, loaded when the GUI or the capture starts
+plot_rules = []  # See load_plot_rules, likewise
+stage_rules = []  # See load_stages, likewise
+stage_pool = None  # Worker processes of the process stages, see get_stage_pool
+trigger_dispatcher = None  # Started on first use, see get_trigger_dispatcher
+share_loop = None  # Event loop of the share servers, see get_share_loop
+port_watcher = None  # Started on first use, see get_port_watcher
+com_port_scan_generation = None  # Watcher generation the port list was last scanned at
+
+gConfig = configparser.ConfigParser()
+gConfig["Settings"] = {
+    "last_com_port": DEFAULT_LAST_COM_PORT_NUM,
+    "last_baud_rate": str(DEFAULT_BUAD_RATE),
+    "visible_baud_rates_list": ",".join(map(str, DEFAULT_COMMON_BAUD_RATES_LIST)),
+    "log_path": DEFAULT_LOG_PATH,
+    "show_timestamp": str(DEFAULT_SHOW_TIMESTAMP),
+    "read_min_chunk": str(DEFAULT_READ_MIN_CHUNK),
+    "read_max_wait_ms": str(DEFAULT_READ_MAX_WAIT_MS),
+    "gui_refresh_hz": str(DEFAULT_GUI_REFRESH_HZ),
+    "scrollback_lines": str(DEFAULT_SCROLLBACK_LINES),
+    "log_flush_ms": str(DEFAULT_LOG_FLUSH_MS),
+    "log_fsync_on_stop": str(DEFAULT_LOG_FSYNC_ON_STOP),
+    "raw_capture": str(DEFAULT_RAW_CAPTURE),
+    "encoding": DEFAULT_ENCODING,
+    "decode_errors": DEFAULT_DECODE_ERRORS,
+    "ansi_view": DEFAULT_ANSI_VIEW,
+    "ansi_log": DEFAULT_ANSI_LOG,
+    "hex_buffer_mb": str(DEFAULT_HEX_BUFFER_MB),
+    "hex_time_markers": str(DEFAULT_HEX_TIME_MARKERS),
+    "plot_window_s": str(DEFAULT_PLOT_WINDOW_S),
+    "plot_points": str(DEFAULT_PLOT_POINTS),
+    "plot_csv": str(DEFAULT_PLOT_CSV),
+    "auto_reconnect": str(DEFAULT_AUTO_RECONNECT),
+    "metrics_path": DEFAULT_METRICS_PATH,
+    "metrics_format": DEFAULT_METRICS_FORMAT,
+    "metrics_interval_s": str(DEFAULT_METRICS_INTERVAL_S),
+    "log_rotate_mb": str(DEFAULT_LOG_ROTATE_MB),
+    "log_rotate_minutes": str(DEFAULT_LOG_ROTATE_MINUTES),
+    "log_compression": DEFAULT_LOG_COMPRESSION,
+    "log_keep_files": str(DEFAULT_LOG_KEEP_FILES),
+    "log_keep_mb": str(DEFAULT_LOG_KEEP_MB),
+    "replay_speed": DEFAULT_REPLAY_SPEED,
+    "replay_start": DEFAULT_REPLAY_START,
+    "tx_line_ending": DEFAULT_TX_LINE_ENDING,
+    "tx_line_delay_ms": str(DEFAULT_TX_LINE_DELAY_MS),
+    "tx_pace_bytes": str(DEFAULT_TX_PACE_BYTES),
+    "tx_pace_delay_ms": str(DEFAULT_TX_PACE_DELAY_MS),
+    "flow_control": DEFAULT_FLOW_CONTROL,
+    "share_port": str(DEFAULT_SHARE_PORT),
+    "share_bind": DEFAULT_SHARE_BIND,
+    "share_mode": DEFAULT_SHARE_MODE,
+    "share_write": str(DEFAULT_SHARE_WRITE),
+    "share_origins": DEFAULT_SHARE_ORIGINS,
+    "share_buffer_kb": str(DEFAULT_SHARE_BUFFER_KB),
+    "share_slow_client": DEFAULT_SHARE_SLOW_CLIENT,
+}
+# Written to settings.ini as examples, disable them there with enabled = False
+gConfig[HIGHLIGHT_SECTION_PREFIX + "error"] = {
+    "enabled": "True",
+    "pattern": r"\b(?:ERROR|FATAL|PANIC)\b|\bassert(?:ion)?\b",
+    "ignore_case": "False",
+    "foreground": "red",
+    "background": "",
+    "bold": "True",
+}
+gConfig[HIGHLIGHT_SECTION_PREFIX + "warning"] = {
+    "enabled": "True",
+    "pattern": r"\bWARN(?:ING)?\b",
+    "ignore_case": "False",
+    "foreground": "#b58900",
+    "background": "",
+    "bold": "False",
+}
+gConfig[PLOT_SECTION_PREFIX + "sensors"] = {
+    "enabled": "False",
+    "pattern": r"temp=(?P<temp>-?\d+(?:\.\d+)?)",
+}
+gConfig[STAGE_SECTION_PREFIX + "redact_secrets"] = {
+    "enabled": "False",
+    "type": "redact",
+    "mode": "inline",
+    "pattern": r"(?i)\b(password|passwd|token|secret)=\S+",
+    "replacement": r"\1=***",
+}
+gConfig[TRIGGER_SECTION_PREFIX + "kernel_panic"] = {
+    "enabled": "False",
+    "pattern": "Kernel panic",
+    "regex": "False",
+    "ignore_case": "False",
+    "actions": "mark, beep",
+    "send": "",
+    "line_ending": DEFAULT_TX_LINE_ENDING,
+    "command": "",
+    "cooldown_ms": "1000",
+}
+
+
+# Get available COM ports
+def get_com_ports():
+    from serial.tools import list_ports
+
+    return [port.device for port in list_ports.comports()]
+
+
+def get_port_identity(device):
+    """
+    Identify the USB device behind a port, it may come back under another name.
+
+    :param device: Port name or path.
+    :return: (vid, pid, serial number), None if the port is not a USB device.
+    """
+    from serial.tools import list_ports
+
+    device = os.path.realpath(device)
+    for info in list_ports.comports():
+        if info.vid is not None and os.path.realpath(info.device) == device:
+            return (info.vid, info.pid, info.serial_number)
+    return None
+
+
+def find_port(device, identity=None):
+    """
+    Find a port that went away again.
+
+    :param device: The name the port had.
+    :param identity: Its get_port_identity, None to match by name only.
+    :return: The port name to open, None if it is not there.
+    """
+    if identity is None:
+        return device if os.path.exists(device) else None
+
+    from serial.tools import list_ports
+
+    matches = [
+        info.device
+        for info in list_ports.comports()
+        if (info.vid, info.pid, info.serial_number) == identity
+    ]
+    if not matches:
+        return None
+    # Prefer the old name, e.g. a by-id link, or identical adapters without serial numbers
+    if os.path.realpath(device) in matches:
+        return device
+    return matches[0]
+
+
+class PortWatcher:
+    """
+    Wake up whoever waits for serial devices to appear or disappear.
+
+    On Linux the device directories are watched with inotify, so a replugged adapter is
+    noticed as soon as its node is created. Elsewhere the port list is compared every
+    PORT_POLL_INTERVAL seconds. Waiters only see a generation number change, what
+    changed is looked up by them.
+    """
+
+    def __init__(self, directories=PORT_WATCH_DIRS):
+        self.generation = 0
+        self.condition = threading.Condition()
+        self._watched = set()
+        self._fd = None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+            self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            fd = libc.inotify_init1(os.O_CLOEXEC)
+            if fd >= 0:
+                self._fd = fd
+        except (OSError, AttributeError, TypeError):
+            pass  # No inotify on this platform
+        for directory in directories:
+            self.watch(directory)
+
+        target = self._run_inotify if self._fd is not None else self._run_polling
+        self._thread = threading.Thread(target=target, name="PortWatcher", daemon=True)
+        self._thread.start()
+
+    def watch(self, directory):
+        """Also watch this directory, e.g. the one a symlinked port lives in."""
+        if self._fd is None or not directory or directory in self._watched:
+            return
+        if self._add_watch(self._fd, os.fsencode(directory), INOTIFY_MASK) >= 0:
+            self._watched.add(directory)
+
+    def notify(self):
+        with self.condition:
+            self.generation += 1
+            self.condition.notify_all()
+
+    def wait(self, generation, timeout):
+        """
+        Wait until something changed after generation.
+
+        :return: The current generation.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.generation != generation, timeout)
+            return self.generation
+
+    def _run_inotify(self):
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except InterruptedError:
+                continue
+            except OSError as e:
+                print(f"OSError: {e}")
+                return
+            # One wake-up per read, however many nodes a replug creates
+            if len(data) >= INOTIFY_EVENT.size:
+                self.notify()
+
+    def _run_polling(self):
+        ports = None
+        while True:
+            try:
+                current = get_com_ports()
+            except Exception as e:
+                print(f"Port scan failed: {e}")
+                current = ports
+            if current != ports:
+                ports = current
+                self.notify()
+            time.sleep(PORT_POLL_INTERVAL)
+
+
+def get_port_watcher():
+    global port_watcher
+    if port_watcher is None:
+        port_watcher = PortWatcher()
+    return port_watcher
+
+
+def get_port_file_name(com_port):
+    # Device paths such as /dev/ttyUSB0 only contribute their name, URLs such as
+    # socket://host:port their characters that are safe in a file name
+    name = os.path.basename(com_port.rstrip("/\\"))
+    if "://" in com_port or not name:
+        name = re.sub(r"[^\w.-]+", "_", com_port).strip("_")
+    return name
+
+
+def parse_save_path(path_template, com_port, seq=0):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("%Y%m%d_%H%M%S")
+    com_name = get_port_file_name(com_port)
+    path = path_template.replace("{COM}", com_name).replace("{TIME}", formatted_time)
+    path = path.replace("{SEQ}", f"{seq:03d}")  # Log file number within a session
+    # The default template uses Windows separators, headless capture also runs elsewhere
+    path = path.replace("\\", os.sep)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def get_log_glob(path_template, com_port):
+    """
+    Match every log file the template produces for a port, of any session.
+
+    :return: A glob pattern, {TIME} matches its digits, {SEQ} and the suffix match
+             anything. None if the template has no {COM}, the logs of all ports would
+             match.
+    """
+    if "{COM}" not in path_template:
+        return None
+    path = path_template.replace("{COM}", get_port_file_name(com_port)).replace("\\", os.sep)
+    parts = re.split(r"(\{TIME\}|\{SEQ\})", path)
+    wildcards = {"{TIME}": "[0-9]" * 8 + "_" + "[0-9]" * 6, "{SEQ}": "*"}
+    return "".join(wildcards.get(part) or glob.escape(part) for part in parts) + "*"
+
+
+class LzmaStreamWriter:
+    """
+    Write an .xz file as one complete stream per flush.
+
+    LZMAFile.flush writes nothing until the file is closed, so a log being written
+    could not be read back and a crash lost the whole file. Readers decode the
+    concatenated streams as one.
+    """
+
+    def __init__(self, path, mode):
+        import lzma
+
+        self._compressor_class = lzma.LZMACompressor
+        self._file = open(path, mode)
+        self._compressor = None
+
+    def write(self, data):
+        if self._compressor is None:
+            self._compressor = self._compressor_class(preset=LOG_LZMA_PRESET)
+        self._file.write(self._compressor.compress(data))
+        return len(data)
+
+    def flush(self):
+        if self._compressor is not None:
+            self._file.write(self._compressor.flush())
+            self._compressor = None
+        self._file.flush()
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._file.close()
+
+
+def open_log_file(path, mode, compression="none"):
+    """
+    Open a log file, compressing or decompressing on the fly.
+
+    :param path: The file.
+    :param mode: "ab" to write, "rb" to read.
+    :param compression: A key of LOG_COMPRESSION_DICT, zstd needs Python 3.14 or the
+                        zstandard package.
+    :return: A binary file object.
+    """
+    if compression == "gzip":
+        import gzip
+
+        return gzip.open(path, mode, compresslevel=LOG_GZIP_LEVEL)
+    if compression == "lzma":
+        import lzma
+
+        if "r" in mode:
+            return lzma.open(path, mode)
+        return LzmaStreamWriter(path, mode)
+    if compression == "zstd":
+        try:
+            from compression import zstd
+
+            if "r" in mode:
+                return zstd.open(path, mode)
+            return zstd.open(path, mode, level=LOG_ZSTD_LEVEL)
+        except ImportError:
+            import zstandard
+
+            if "r" in mode:
+                return zstandard.open(path, mode)
+            return zstandard.ZstdCompressor(level=LOG_ZSTD_LEVEL).stream_writer(open(path, mode))
+    if compression != "none":
+        raise ValueError(f"Unknown compression: {compression}")
+    return open(path, mode)
+
+
+def create_stream_decoder(encoding=DEFAULT_ENCODING, errors=DEFAULT_DECODE_ERRORS):
+    """
+    Create a decoder for a byte stream that arrives in arbitrary chunks.
+
+    A multi-byte sequence split across two reads is kept in the decoder until its
+    remaining bytes arrive, so only the unfinished tail of a chunk is carried over.
+
+    :param encoding: Any codec name known to Python.
+    :param errors: A key of DECODE_ERRORS_DICT or a codec error handler name.
+    :return: An incremental decoder, call decode(data) per chunk and
+             decode(b"", final=True) at the end of the stream.
+    """
+    errors = DECODE_ERRORS_DICT.get(errors, errors)
+    return codecs.getincrementaldecoder(encoding)(errors)
+
+
+class DecodeErrorCounter:
+    """
+    A codec error handler that counts undecodable bytes and then defers to another one.
+
+    It is registered under its own name, set it as the errors of a decoder. It only runs
+    for undecodable bytes, clean data costs nothing.
+    """
+
+    def __init__(self, errors):
+        self.handler = codecs.lookup_error(errors)
+        self.count = 0
+        self.name = f"{errors}-counted-{id(self)}"
+        # Handlers cannot be unregistered, one per session is a negligible leak
+        codecs.register_error(self.name, self)
+
+    def __call__(self, exc):
+        self.count += exc.end - exc.start
+        return self.handler(exc)
+
+
+class LineFramer:
+    """
+    Split a decoded stream into whole lines.
+
+    Each line carries the time.monotonic_ns() arrival time of the chunk that brought
+    its first character, a line split across reads keeps a single time. The terminator
+    of a line taken early by flush is swallowed when it arrives, it ends no new line.
+    """
+
+    def __init__(self):
+        self._partial = []
+        self._partial_time = None
+        self._flushed = False  # The stream stopped at a flushed line, no terminator yet
+
+    def feed(self, text, arrival):
+        """
+        Add decoded text and take the lines it completed.
+
+        :param text: The decoded chunk.
+        :param arrival: time.monotonic_ns() when the chunk was read.
+        :return: List of (arrival, line) without line endings.
+        """
+        lines = text.replace("\r\n", "\n").split("\n")
+        tail = lines.pop()
+        framed = []
+        if self._flushed and text:
+            if text == "\r":
+                return []  # Its \n may come with the next read
+            self._flushed = False
+            if lines and not lines[0]:
+                del lines[0]
+        if lines:
+            if self._partial:
+                # A \r\n split across reads leaves the \r on the buffered part
+                first = "".join(self._partial) + lines[0]
+                framed.append((self._partial_time, first.removesuffix("\r")))
+                self._partial = []
+            else:
+                framed.append((arrival, lines[0]))
+            framed.extend((arrival, line) for line in lines[1:])
+        if tail:
+            if not self._partial:
+                self._partial_time = arrival
+            self._partial.append(tail)
+        return framed
+
+    def flush(self, now=None, timeout=0):
+        """
+        Take the unterminated line once it has waited at least timeout ns.
+
+        :param now: time.monotonic_ns(), None to flush unconditionally.
+        :param timeout: Minimum age of the line in ns.
+        :return: List with zero or one (arrival, line).
+        """
+        if not self._partial or (now is not None and now - self._partial_time < timeout):
+            return []
+        line = "".join(self._partial)
+        self._partial = []
+        self._flushed = True
+        # The \n of a \r\n may still come
+        return [(self._partial_time, line.removesuffix("\r"))]
+
+
+class TimestampFormatter:
+    """Format time.monotonic_ns() values as wall clock text, the date part is cached."""
+
+    def __init__(self):
+        self._epoch_ns = time.time_ns() - time.monotonic_ns()
+        self._second = None
+        self._prefix = ""
+
+    def format(self, monotonic_ns):
+        # Same text as datetime.strftime("%Y-%m-%d %H:%M:%S.%f")
+        second, ns = divmod(self._epoch_ns + monotonic_ns, 1_000_000_000)
+        if second != self._second:
+            self._second = second
+            self._prefix = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+        return f"{self._prefix}.{ns // 1000:06d}"
+
+
+def get_ansi_color(index):
+    # Colour of the 256 colour palette: the 16 basic ones, a 6x6x6 cube and 24 greys
+    if index < 16:
+        return ANSI_COLORS_LIST[index]
+    if index < 232:
+        index -= 16
+        levels = [0 if i == 0 else 55 + 40 * i for i in (index // 36, index // 6 % 6, index % 6)]
+        return "#{:02x}{:02x}{:02x}".format(*levels)
+    grey = 8 + 10 * (index - 232)
+    return f"#{grey:02x}{grey:02x}{grey:02x}"
+
+
+class AnsiParser:
+    """
+    Remove ANSI/VT100 escape sequences from framed lines and keep the styles they set.
+
+    SGR colours (16, 256 and 24 bit), bold and underline become style runs, text after
+    a carriage return or a cursor move to column 1 replaces the line, as progress
+    displays expect. Other sequences are dropped. The style carries over from line to
+    line, and a sequence cut off by a flushed partial line is completed by the next
+    one. Each line is scanned once by a single regex, lines without ESC or CR are
+    passed through untouched.
+
+    A style is a (foreground, background, bold, underline) tuple, colours are #rrggbb
+    or None, the default style is None. Styles are few and hashable, OutputView maps
+    each to one Tk tag.
+    """
+
+    def __init__(self):
+        self.style = None
+        self._carry = ""  # Start of a sequence at the end of the last line
+        self._sgr_cache = {}  # (parameters, style) -> style, devices repeat a few codes
+
+    @property
+    def busy(self):
+        """True if the next lines need parsing even without any ESC or CR in them."""
+        return self.style is not None or bool(self._carry)
+
+    def parse(self, lines):
+        """
+        :param lines: List of lines without line endings.
+        :return: (plain lines, runs), runs are (line index, start, end, style) of the
+                 text not in the default style.
+        """
+        plain = []
+        runs = []
+        for index, line in enumerate(lines):
+            if self._carry:
+                line = self._carry + line
+                self._carry = ""
+            if "\x1b" not in line and "\r" not in line:
+                if self.style is not None and line:
+                    runs.append((index, 0, len(line), self.style))
+                plain.append(line)
+                continue
+            plain.append(self._parse_line(line, index, runs))
+        return plain, runs
+
+    def _parse_line(self, line, index, runs):
+        parts = []
+        length = 0
+        style = self.style
+        run_start = 0
+        first_run = len(runs)
+        line_start = False  # A carriage return is pending
+        pos = 0
+        for match in ANSI_ESCAPE_RE.finditer(line):
+            start = match.start()
+            if start > pos:
+                if line_start:
+                    # Text after a carriage return replaces the line
+                    line_start = False
+                    del parts[:], runs[first_run:]
+                    length = run_start = 0
+                parts.append(line[pos:start])
+                length += start - pos
+            pos = match.end()
+            sequence = match.group()
+            final = sequence[-1]
+            if sequence == "\r" or (
+                final == "G" and sequence[1] == "[" and sequence[2:-1] in ("", "0", "1")
+            ):
+                line_start = True
+            elif final == "m" and sequence[1] == "[":
+                key = (sequence, style)
+                new_style = self._sgr_cache.get(key, key)
+                if new_style is key:
+                    if len(self._sgr_cache) >= ANSI_SGR_CACHE_SIZE:
+                        self._sgr_cache.clear()
+                    new_style = self._sgr_cache[key] = self._apply_sgr(sequence[2:-1], style)
+                if new_style != style:
+                    if style is not None and length > run_start:
+                        runs.append((index, run_start, length, style))
+                    style = new_style
+                    run_start = length
+        tail = line[pos:]
+        if tail:
+            partial = ANSI_PARTIAL_RE.search(tail)
+            if partial:
+                self._carry = partial.group()
+                tail = tail[: partial.start()]
+        if tail:
+            if line_start:
+                del parts[:], runs[first_run:]
+                length = run_start = 0
+            parts.append(tail)
+            length += len(tail)
+        if style is not None and length > run_start:
+            runs.append((index, run_start, length, style))
+        self.style = style
+        return "".join(parts)
+
+    @staticmethod
+    def _apply_sgr(params, style):
+        foreground, background, bold, underline = style or (None, None, False, False)
+        codes = [int(code) if code.isdigit() else 0 for code in params.replace(":", ";").split(";")]
+        i = 0
+        while i < len(codes):
+            code = codes[i]
+            if code == 0:
+                foreground, background, bold, underline = None, None, False, False
+            elif code == 1:
+                bold = True
+            elif code == 22:
+                bold = False
+            elif code == 4:
+                underline = True
+            elif code == 24:
+                underline = False
+            elif 30 <= code <= 37:
+                foreground = ANSI_COLORS_LIST[code - 30]
+            elif 90 <= code <= 97:
+                foreground = ANSI_COLORS_LIST[code - 90 + 8]
+            elif code == 39:
+                foreground = None
+            elif 40 <= code <= 47:
+                background = ANSI_COLORS_LIST[code - 40]
+            elif 100 <= code <= 107:
+                background = ANSI_COLORS_LIST[code - 100 + 8]
+            elif code == 49:
+                background = None
+            elif code in (38, 48):
+                # 38;5;n or 38;2;r;g;b, likewise 48 for the background
+                color = None
+                if i + 2 < len(codes) and codes[i + 1] == 5:
+                    color = get_ansi_color(min(codes[i + 2], 255))
+                    i += 2
+                elif i + 4 < len(codes) and codes[i + 1] == 2:
+                    color = "#{:02x}{:02x}{:02x}".format(
+                        *(min(c, 255) for c in codes[i + 2 : i + 5])
+                    )
+                    i += 4
+                if code == 38:
+                    foreground = color
+                else:
+                    background = color
+            i += 1
+        if foreground is None and background is None and not bold and not underline:
+            return None
+        return foreground, background, bold, underline
+
+
+def strip_ansi(text):
+    """Text without escape sequences, for log text shown outside the output view."""
+    return ANSI_ESCAPE_RE.sub("", text) if "\x1b" in text else text
+
+
+def calc_read_params(baudrate, min_chunk, max_wait_ms):
+    """
+    Work out the blocking read parameters for a baud rate.
+
+    :param baudrate: The selected baud rate.
+    :param min_chunk: Minimum bytes per read, 0 to derive it from the baud rate.
+    :param max_wait_ms: Longest time a read may hold back a partial chunk.
+    :return: (min_chunk, timeout, inter_byte_timeout) for the serial port.
+    """
+    # One character on the wire is 10 bits (start + 8 data + stop)
+    chars_per_second = baudrate / 10
+    if min_chunk <= 0:
+        min_chunk = max(1, min(DEFAULT_UART_BUFFER_SIZE * 32, int(chars_per_second / 1000)))
+    timeout = max(0.001, max_wait_ms / 1000)
+    # Windows honours the inter-byte timeout only in whole milliseconds
+    inter_byte_timeout = min(timeout, max(0.001, FRAME_GAP_CHARS / chars_per_second))
+    return min_chunk, timeout, inter_byte_timeout
+
+
+class ReplayPort:
+    """
+    A recorded session that reads like a serial port, see open_port.
+
+    Raw captures keep the timing of their records. Text logs saved with timestamps
+    keep the timing of their lines and lose the timestamp text, the pipeline adds its
+    own. Other text logs are paced at the baud rate. Compressed logs are read as they
+    are. Replay can start later in the recording, captures seek there with their index,
+    logs are read up to it. At the end of the recording is_open turns False and the
+    reader stops.
+    """
+
+    def __init__(self, path, speed=1, baudrate=DEFAULT_BUAD_RATE, timeout=1.0, start=0):
+        """
+        :param path: A raw capture or a session log.
+        :param speed: Multiple of the recorded timing, 0 to replay as fast as possible.
+        :param baudrate: Pace of text logs without timestamps.
+        :param timeout: Longest time a read waits for the next chunk to become due.
+        :param start: Seconds into the recording to start at, see parse_replay_start.
+        """
+        self.path = path
+        self.port = REPLAY_PREFIX + path
+        self.speed = speed
+        self.start = start
+        self.timeout = timeout
+        self.in_waiting = 0  # Everything due is returned by read
+        self.text_log = not path.endswith(CAPTURE_EXTENSION)  # Logs are utf-8
+        try:
+            if self.text_log:
+                compression = "none"
+                for method, extension in LOG_COMPRESSION_DICT.items():
+                    if extension and path.endswith(extension):
+                        compression = method
+                self._file = open_log_file(path, "rb", compression)
+                self._chunks = self._iter_log(baudrate)
+            else:
+                self._file = None
+                self._chunks = self._iter_capture()
+            self._pending = next(self._chunks, None)
+        except (OSError, ValueError, EOFError) as e:
+            raise serial.SerialException(f"Cannot replay {path}: {e}") from e
+        self.is_open = True
+        self._start = None  # time.monotonic() the recording started at
+        self._cancel = threading.Event()
+
+    def read(self, size=1):
+        if not self.is_open:
+            raise serial.PortNotOpenError()
+        now = time.monotonic()
+        if self._start is None:
+            self._start = now
+        deadline = now + self.timeout
+        chunks = []
+        count = 0
+        try:
+            while self._pending is not None and count < max(size, REPLAY_MAX_READ_BYTES):
+                when, data = self._pending
+                due = self._start + when / self.speed if self.speed else now
+                if due > now:
+                    # Hand over what is due, otherwise wait for the next chunk like a port
+                    if chunks or self._cancel.wait(min(due, deadline) - now):
+                        break
+                    now = time.monotonic()
+                    if now < due:
+                        break
+                chunks.append(data)
+                count += len(data)
+                self._pending = next(self._chunks, None)
+        except (OSError, ValueError, EOFError) as e:
+            print(f"Replay failed: {e}")
+            self._pending = None
+        if self._pending is None:
+            self.is_open = False
+            self._close_source()
+        return b"".join(chunks)
+
+    def cancel_read(self):
+        self._cancel.set()
+
+    def close(self):
+        # The source is closed by the reader thread, it may be iterating over it
+        self.is_open = False
+        self._cancel.set()
+
+    def open(self):
+        raise serial.SerialException("A replay cannot be reopened")
+
+    def write(self, data):
+        raise serial.SerialException("A replay cannot be written to")
+
+    def _close_source(self):
+        self._chunks.close()
+        if self._file:
+            self._file.close()
+
+    def _iter_capture(self):
+        records = iter_capture(self.path)
+        first = next(records, None)
+        records.close()
+        if first is None:
+            return
+        start_time_ns = first[0] + int(self.start * 1e9)
+        for timestamp, _, data in iter_capture(self.path, start_time_ns if self.start else None):
+            yield (timestamp - start_time_ns) / 1e9, data
+
+    def _iter_log(self, baudrate):
+        chars_per_second = baudrate / 10
+        first = None
+        sent = 0
+        for line in self._file:
+            match = LOG_TIMESTAMP_RE.match(line)
+            if match:
+                timestamp = datetime.fromisoformat(match.group(1).decode()).timestamp()
+                if first is None:
+                    first = timestamp
+                line = line[match.end() :]
+                when = timestamp - first
+            else:
+                when = sent / chars_per_second
+            sent += len(line)
+            if when >= self.start:
+                yield when - self.start, line
+
+
+def open_port(
+    port,
+    baudrate,
+    read_params,
+    replay_speed=1,
+    flow_control=DEFAULT_FLOW_CONTROL,
+    replay_start=0,
+):
+    """
+    Open a serial port, or replay a recording if the name starts with REPLAY_PREFIX.
+
+    :param port: Port name, or a pyserial URL such as loop:// or socket://host:port.
+    :param baudrate: The selected baud rate.
+    :param read_params: See calc_read_params.
+    :param replay_speed: See ReplayPort.
+    :param flow_control: A key of FLOW_CONTROL_DICT, applied by the driver to both
+                         directions.
+    :param replay_start: See ReplayPort.
+    :return: serial.Serial or ReplayPort.
+    """
+    min_chunk, timeout, inter_byte_timeout = read_params
+    if port.startswith(REPLAY_PREFIX):
+        return ReplayPort(port[len(REPLAY_PREFIX) :], replay_speed, baudrate, timeout, replay_start)
+    return serial.serial_for_url(
+        port,
+        baudrate,
+        timeout=timeout,
+        inter_byte_timeout=inter_byte_timeout,
+        **FLOW_CONTROL_DICT[flow_control],
+    )
+
+
+def parse_replay_speed(text):
+    """
+    :param text: A key of REPLAY_SPEEDS_DICT or a number, e.g. "10x" or "2.5".
+    :return: The speed for ReplayPort.
+    """
+    if text in REPLAY_SPEEDS_DICT:
+        return REPLAY_SPEEDS_DICT[text]
+    speed = float(text.lower().removesuffix("x"))
+    if speed < 0:
+        raise ValueError(f"Invalid replay speed: {text}")
+    return speed
+
+
+def parse_share_origins(text):
+    """
+    :param text: Comma separated origins, e.g. "http://dashboard:8080, null".
+    :return: The origins for ShareServer, lower case without a trailing slash.
+    """
+    return [origin.strip().lower().rstrip("/") for origin in text.split(",") if origin.strip()]
+
+
+def parse_replay_start(text):
+    """
+    :param text: Seconds into the recording, or [hours:]minutes:seconds, e.g. "1:30".
+    :return: The start for ReplayPort in seconds.
+    """
+    start = 0.0
+    for part in text.strip().split(":"):
+        start = start * 60 + float(part)
+    if start < 0 or text.count(":") > 2:
+        raise ValueError(f"Invalid replay start: {text}")
+    return start
+
+
+def read_chunk(ser, min_chunk):
+    # Block in the driver until min_chunk bytes arrived, the line stayed idle for a frame
+    # gap or the port timeout expired, then take whatever else is already buffered
+    data = ser.read(min_chunk)
+    waiting = ser.in_waiting
+    if waiting:
+        data += ser.read(waiting)
+    return data
+
+
+def encode_log_text(text):
+    # The log is written in binary so the reader can track exact file offsets,
+    # keep the platform line endings the text mode file used to produce
+    if os.linesep != "\n":
+        text = text.replace("\n", os.linesep)
+    return text.encode("utf-8")
+
+
+class LogWriterPool:
+    """One background thread that writes out the queued data of any number of LogWriters."""
+
+    def __init__(self, flush_interval=DEFAULT_LOG_FLUSH_MS / 1000):
+        self.flush_interval = flush_interval
+        self._writers = []
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def add(self, writer):
+        with self._cond:
+            self._writers.append(writer)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="LogWriterPool", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not any(w._pending or w._closing for w in self._writers):
+                    self._cond.wait()
+                # Give the batches time to fill up unless one already did
+                if not any(w._pending_bytes >= w.batch_size or w._closing for w in self._writers):
+                    self._cond.wait(self.flush_interval)
+                batches = []
+                for writer in self._writers:
+                    if writer._pending or writer._closing:
+                        batches.append((writer, writer._pending, writer._pending_bytes))
+                        writer._pending = []
+                        writer._pending_bytes = 0
+                closing = [writer for writer in self._writers if writer._closing]
+                self._writers = [writer for writer in self._writers if not writer._closing]
+
+            for writer, chunks, size in batches:
+                if chunks:
+                    writer._write_batch(chunks, size)
+            for writer in closing:
+                writer._finish()
+
+
+class LineIndex:
+    """
+    Sparse line numbers of a session log, kept by its LogWriter.
+
+    A checkpoint is a stream offset and the number of line ends before it, one about
+    every LOG_INDEX_INTERVAL_LINES lines and one at the start of every log file, so
+    the index grows by 16 bytes per interval rather than per line. Exact positions are
+    counted from the nearest checkpoint by reading the log. Line numbers count from
+    the offset the session started at.
+    """
+
+    def __init__(self, start_offset):
+        # Appended lines first, a reader on another thread only looks at len(offsets)
+        self.lines = array("Q", [0])
+        self.offsets = array("Q", [start_offset])
+        self.line_count = 0  # Line ends written so far
+
+    def add(self, offset, data):
+        # On the log writer thread, once data is written at offset
+        count = data.count(b"\n")
+        if not count:
+            return
+        self.line_count += count
+        if self.line_count - self.lines[-1] >= LOG_INDEX_INTERVAL_LINES:
+            self.lines.append(self.line_count)
+            self.offsets.append(offset + data.rfind(b"\n") + 1)
+
+    def mark(self, offset):
+        # A new log file starts here, retention can delete everything before it
+        if offset > self.offsets[-1]:
+            self.lines.append(self.line_count)
+            self.offsets.append(offset)
+
+    def checkpoint(self, offset):
+        """:return: (offset, line number) of the last checkpoint at or before offset."""
+        pos = max(0, bisect.bisect_right(self.offsets, offset, 0, len(self.offsets)) - 1)
+        return self.offsets[pos], self.lines[pos]
+
+    def line_at(self, offset, log_reader):
+        """:return: Number of line ends before offset, None if the log cannot be read."""
+        start, line = self.checkpoint(offset)
+        data = log_reader.read(start, offset - start)
+        if len(data) < offset - start:
+            return None
+        return line + data.count(b"\n")
+
+    def line_offset(self, line, log_reader):
+        """:return: Stream offset the line starts at, None if the log cannot be read."""
+        count = len(self.offsets)
+        pos = max(0, bisect.bisect_left(self.lines, line, 0, count) - 1)
+        offset, found = self.offsets[pos], self.lines[pos]
+        while found < line:
+            block = log_reader.read(offset, HISTORY_READ_BLOCK)
+            if not block:
+                return None
+            end = 0
+            while found < line:
+                end = block.find(b"\n", end) + 1
+                if not end:
+                    break
+                found += 1
+            if found == line:
+                return offset + end
+            offset += len(block)
+        return offset
+
+
+class LogWriter:
+    """
+    Append data to a log file, the writes are batched on a LogWriterPool thread.
+
+    The log can be split into several files by size or on wall clock boundaries and
+    compressed as it is written, both on the pool thread. Offsets are positions in
+    the uncompressed stream of the whole session, open_reader reads them back across
+    files. With rotation the files are named from path_template with {SEQ} counting
+    up, a template without {SEQ} gets _{SEQ} before its extension.
+    """
+
+    def __init__(
+        self,
+        path,
+        pool=None,
+        batch_size=LOG_BATCH_BYTES,
+        max_queued_bytes=LOG_MAX_QUEUED_BYTES,
+        fsync_on_stop=DEFAULT_LOG_FSYNC_ON_STOP,
+        index_lines=False,
+        path_template=None,
+        port="",
+        rotate_bytes=0,
+        rotate_interval_s=0,
+        compression=DEFAULT_LOG_COMPRESSION,
+        keep_files=0,
+        keep_bytes=0,
+    ):
+        self.pool = pool or log_writer_pool
+        self.batch_size = batch_size
+        self.max_queued_bytes = max_queued_bytes
+        self.fsync_on_stop = fsync_on_stop
+        self.compression = compression
+        self.rotate_bytes = rotate_bytes
+        self.rotate_interval_s = rotate_interval_s
+        self.keep_files = keep_files
+        self.keep_bytes = keep_bytes
+        self.port = port
+        self.path_template = path_template
+        if (keep_files or keep_bytes) and path_template and "{COM}" not in path_template:
+            # Retention would delete the logs of other ports
+            print(f"Log retention needs {{COM}} in the log path, keeping all logs: {path}")
+            self.keep_files = self.keep_bytes = 0
+        if path_template and "{SEQ}" not in path_template:
+            root, ext = os.path.splitext(path_template)
+            self.path_template = root + "_{SEQ}" + ext
+
+        self.seq = 0
+        self.path = path + LOG_COMPRESSION_DICT[compression]
+        if compression != "none":
+            # The uncompressed size of an existing file is unknown, start a new one
+            while os.path.exists(self.path) and self.path_template:
+                self.seq += 1
+                self.path = self._segment_path()
+        self.file = open_log_file(self.path, "ab", compression)  # Text is utf-8 encoded
+        # Offset the next accepted write will land at, a plain log continues an existing file
+        self.offset = self.file.tell() if compression == "none" else 0
+        self.start_offset = self.offset
+        self.closed = False
+
+        # (stream offset, path, file offset) per log file of the session, oldest first
+        self.segments = [(0, self.path, 0)]
+        self._segment_bytes = 0
+        self._rotate_time = self._next_rotate_time()
+
+        # Line numbers of what is on disk, for search and the scrollback
+        self.line_index = LineIndex(self.offset) if index_lines else None
+        self.written_offset = self.offset  # Everything before it is on disk, see LogReader
+
+        # Counters, read them from any thread
+        self.queued_bytes = 0
+        self.written_bytes = 0
+        self.dropped_bytes = 0
+        self.write_count = 0
+        self.last_write_latency = 0.0
+        self.max_write_latency = 0.0
+
+        # Guarded by the pool's condition
+        self._pending = []
+        self._pending_bytes = 0
+        self._closing = False
+        self._cond = self.pool._cond
+        self._closed = threading.Event()
+        self.pool.add(self)
+
+    def write(self, data):
+        """
+        Queue data for writing without blocking on the disk.
+
+        :param data: The bytes to append.
+        :return: The file offset the data will be written at, None if it was dropped.
+        """
+        size = len(data)
+        with self._cond:
+            if self.queued_bytes + size > self.max_queued_bytes:
+                self.dropped_bytes += size
+                return None
+            offset = self.offset
+            self.offset += size
+            self.queued_bytes += size
+            self._pending.append(data)
+            self._pending_bytes += size
+            # Wake the writer to start its flush timer, or early when a batch is full
+            if len(self._pending) == 1 or self._pending_bytes >= self.batch_size:
+                self._cond.notify()
+        return offset
+
+    def close(self):
+        """Write everything still queued, fsync if requested and close the file."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._closed.wait()
+
+    def stats(self):
+        return {
+            "queued_bytes": self.queued_bytes,
+            "written_bytes": self.written_bytes,
+            "dropped_bytes": self.dropped_bytes,
+            "write_count": self.write_count,
+            "last_write_latency": self.last_write_latency,
+            "max_write_latency": self.max_write_latency,
+        }
+
+    def open_reader(self):
+        return LogReader(self)
+
+    def _segment_path(self):
+        return (
+            parse_save_path(self.path_template, self.port, self.seq)
+            + LOG_COMPRESSION_DICT[self.compression]
+        )
+
+    def _next_rotate_time(self):
+        # Boundaries are aligned to local wall clock time, e.g. every hour on the hour
+        if not self.rotate_interval_s or not self.path_template:
+            return None
+        now = time.time()
+        utc_offset = datetime.now().astimezone().utcoffset().total_seconds()
+        return ((now + utc_offset) // self.rotate_interval_s + 1) * self.rotate_interval_s - (
+            utc_offset
+        )
+
+    def _rotate(self):
+        # Batches hold whole lines, so every file starts at the beginning of a line
+        self._close_file()
+        self.seq += 1
+        self.path = self._segment_path()
+        while os.path.exists(self.path):
+            self.seq += 1
+            self.path = self._segment_path()
+        self.file = open_log_file(self.path, "ab", self.compression)
+        self.segments = self.segments + [(self.written_offset, self.path, 0)]
+        if self.line_index is not None:
+            self.line_index.mark(self.written_offset)
+        self._segment_bytes = 0
+        self._rotate_time = self._next_rotate_time()
+        self._apply_retention()
+
+    def _apply_retention(self):
+        # Oldest first by modification time, the file being written is never deleted
+        if not (self.keep_files or self.keep_bytes) or not self.path_template:
+            return
+        files = []
+        for path in glob.glob(get_log_glob(self.path_template, self.port)):
+            try:
+                files.append((os.path.getmtime(path), os.path.getsize(path), path))
+            except OSError:
+                pass
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        count = len(files)
+        removed = set()
+        for _, size, path in files:
+            if not (
+                (self.keep_files and count > self.keep_files)
+                or (self.keep_bytes and total > self.keep_bytes)
+            ):
+                break
+            if os.path.abspath(path) == os.path.abspath(self.path):
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"OSError: {e}")
+                continue
+            removed.add(path)
+            count -= 1
+            total -= size
+        if removed:
+            self.segments = [segment for segment in self.segments if segment[1] not in removed]
+
+    def _close_file(self):
+        try:
+            self.file.flush()
+            if self.fsync_on_stop and hasattr(self.file, "fileno"):
+                os.fsync(self.file.fileno())
+        except OSError as e:
+            print(f"OSError: {e}")
+        finally:
+            self.file.close()
+
+    def _write_batch(self, chunks, size):
+        start = time.perf_counter()
+        data = b"".join(chunks)
+        try:
+            if (self.rotate_bytes and self._segment_bytes >= self.rotate_bytes) or (
+                self._rotate_time and time.time() >= self._rotate_time
+            ):
+                self._rotate()
+            self.file.write(data)
+            # For compressed logs this ends a block (a stream for lzma), so everything
+            # written can be read back
+            self.file.flush()
+            self._segment_bytes += size
+        except OSError as e:
+            print(f"OSError: {e}")
+            self.dropped_bytes += size
+        else:
+            self.written_bytes += size
+            if self.line_index is not None:
+                self.line_index.add(self.written_offset, data)
+        self.written_offset += size
+        latency = time.perf_counter() - start
+        self.write_count += 1
+        self.last_write_latency = latency
+        self.max_write_latency = max(self.max_write_latency, latency)
+        with self._cond:
+            self.queued_bytes -= size
+
+    def _finish(self):
+        try:
+            self._close_file()
+            self._apply_retention()
+        finally:
+            self.closed = True
+            self._closed.set()
+
+
+class LogReader:
+    """
+    Read a session log back by stream offset, across rotated and compressed files.
+
+    The last file is kept open, so reading forward through a compressed file does not
+    decompress it again from the start. Ranges of deleted files read as nothing.
+    """
+
+    def __init__(self, log_writer):
+        self.log_writer = log_writer
+        self._segment = None
+        self._file = None
+
+    def read(self, offset, size):
+        """
+        :param offset: Stream offset, see LogWriter.write.
+        :param size: Number of bytes.
+        :return: Up to size bytes starting at offset, shorter if not all of them can be read.
+        """
+        chunks = []
+        while size > 0:
+            segments = self.log_writer.segments
+            pos = bisect.bisect_right([segment[0] for segment in segments], offset) - 1
+            if pos < 0:
+                break
+            segment = segments[pos]
+            # Only what is on disk, a decompressor fails or stops for good past its end
+            end = (
+                segments[pos + 1][0] if pos + 1 < len(segments) else self.log_writer.written_offset
+            )
+            file_offset = segment[2] + offset - segment[0]
+            if offset >= end or file_offset < 0:
+                break
+            try:
+                data = self._read_segment(segment, file_offset, min(size, end - offset))
+            except (OSError, EOFError, ValueError) as e:
+                # Deleted by retention, or a compressed file cut short by a crash
+                print(f"Log read failed: {e}")
+                self.close()
+                break
+            if not data:
+                break
+            chunks.append(data)
+            offset += len(data)
+            size -= len(data)
+        return b"".join(chunks)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+        self._file = None
+        self._segment = None
+
+    def _read_segment(self, segment, file_offset, size):
+        compression = self.log_writer.compression
+        # Compressed files only seek forward cheaply, start over for anything earlier
+        if segment != self._segment or (compression != "none" and file_offset < self._file.tell()):
+            self.close()
+            self._file = open_log_file(segment[1], "rb", compression)
+            self._segment = segment
+        self._file.seek(file_offset)
+        return self._file.read(size)
+
+
+# Shared by the logs of all open ports
+log_writer_pool = LogWriterPool()
+
+
+class RawCapture:
+    """
+    Record received bytes verbatim into a chunked container with a sidecar index.
+
+    The capture file is CAPTURE_MAGIC followed by records, each a CAPTURE_RECORD header
+    and its payload. Every session starts with a CAPTURE_KIND_SESSION record naming the
+    port. The index file is CAPTURE_INDEX_MAGIC followed by CAPTURE_INDEX_ENTRY items,
+    written for every session record and then about every CAPTURE_INDEX_INTERVAL bytes,
+    so a capture can be seeked by time or by stream offset without scanning it.
+    """
+
+    def __init__(self, path, port, port_id=0, **writer_kwargs):
+        self.path = path
+        self.port_id = port_id
+        self.data = LogWriter(path, **writer_kwargs)
+        self.index = LogWriter(path + CAPTURE_INDEX_EXTENSION, **writer_kwargs)
+        if self.data.offset == 0:
+            self.data.write(CAPTURE_MAGIC)
+        if self.index.offset == 0:
+            self.index.write(CAPTURE_INDEX_MAGIC)
+
+        # Timestamps come from the monotonic clock, anchored to the wall clock once
+        self._epoch_ns = time.time_ns() - time.monotonic_ns()
+        self.stream_offset = 0  # Payload bytes recorded in this session
+        self._last_index_offset = None
+        self._append(CAPTURE_KIND_SESSION, port.encode("utf-8"))
+
+    def record(self, data):
+        # A record the LogWriter dropped is not in the stream the index counts
+        if self._append(CAPTURE_KIND_DATA, data):
+            self.stream_offset += len(data)
+
+    def new_session(self, port):
+        # The port was reopened, possibly under another name
+        self._append(CAPTURE_KIND_SESSION, port.encode("utf-8"))
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+    def _append(self, kind, payload):
+        """:return: True if the record was queued, False if the LogWriter dropped it."""
+        timestamp = self._epoch_ns + time.monotonic_ns()
+        offset = self.data.write(
+            CAPTURE_RECORD.pack(timestamp, len(payload), self.port_id, kind) + payload
+        )
+        if offset is None:
+            return False
+        if (
+            kind != CAPTURE_KIND_DATA
+            or self._last_index_offset is None
+            or offset - self._last_index_offset >= CAPTURE_INDEX_INTERVAL
+        ):
+            self.index.write(CAPTURE_INDEX_ENTRY.pack(timestamp, offset, self.stream_offset, kind))
+            self._last_index_offset = offset
+        return True
+
+
+def load_capture_index(path):
+    """
+    Load the sidecar index of a raw capture.
+
+    :param path: The capture file.
+    :return: List of (timestamp ns, record offset, stream offset, kind) ordered by offset.
+    """
+    with open(path + CAPTURE_INDEX_EXTENSION, "rb") as file:
+        data = file.read()
+    if not data.startswith(CAPTURE_INDEX_MAGIC):
+        raise ValueError(f"Not a capture index: {path}{CAPTURE_INDEX_EXTENSION}")
+    size = CAPTURE_INDEX_ENTRY.size
+    end = len(data) - (len(data) - len(CAPTURE_INDEX_MAGIC)) % size  # Ignore a torn entry
+    return list(CAPTURE_INDEX_ENTRY.iter_unpack(data[len(CAPTURE_INDEX_MAGIC) : end]))
+
+
+def iter_capture(path, start_time_ns=None):
+    """
+    Iterate over the data records of a raw capture.
+
+    :param path: The capture file.
+    :param start_time_ns: Skip records older than this wall clock time, the index is
+                          used to seek close to it.
+    :return: Generator of (timestamp ns, port name, data).
+    """
+    offset = len(CAPTURE_MAGIC)
+    port_names = {}
+    with open(path, "rb") as file:
+        if file.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise ValueError(f"Not a raw capture: {path}")
+
+        if start_time_ns is not None:
+            try:
+                index = load_capture_index(path)
+            except (OSError, ValueError):
+                index = []
+            pos = bisect.bisect_right([entry[0] for entry in index], start_time_ns) - 1
+            if pos >= 0:
+                offset = index[pos][1]
+                # The port names of a session are in its session record
+                for entry in reversed(index[: pos + 1]):
+                    if entry[3] == CAPTURE_KIND_SESSION:
+                        file.seek(entry[1])
+                        timestamp, length, port_id, kind = CAPTURE_RECORD.unpack(
+                            file.read(CAPTURE_RECORD.size)
+                        )
+                        port_names[port_id] = file.read(length).decode("utf-8", "replace")
+                        break
+
+        file.seek(offset)
+        while True:
+            header = file.read(CAPTURE_RECORD.size)
+            if len(header) < CAPTURE_RECORD.size:
+                break
+            timestamp, length, port_id, kind = CAPTURE_RECORD.unpack(header)
+            payload = file.read(length)
+            if len(payload) < length:
+                break  # Torn record at the end of a capture still being written
+            if kind == CAPTURE_KIND_SESSION:
+                port_names[port_id] = payload.decode("utf-8", "replace")
+            elif start_time_ns is None or timestamp >= start_time_ns:
+                yield timestamp, port_names.get(port_id, str(port_id)), payload
+
+
+class ByteRing:
+    """
+    The latest raw bytes of a port in a fixed size ring, and where each read started.
+
+    The ring is anonymous mapped memory, pages are only committed as it fills. Rows of
+    the hex view are addressed by number: either every HEX_ROW_BYTES of the stream, or,
+    with time markers, starting afresh with each read. Written by the reader thread,
+    read by the GUI thread under the lock.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.total = 0  # Stream bytes written so far
+        self.lock = threading.Lock()
+        self._buffer = mmap.mmap(-1, capacity)
+        # Per read: stream offset, time.monotonic_ns() and first row with time markers
+        self._read_offsets = array("Q")
+        self._read_times = array("q")
+        self._read_rows = array("Q")
+        self._rows = 0  # Rows with time markers
+
+    @property
+    def start(self):
+        """Stream offset of the oldest byte still in the ring."""
+        return max(0, self.total - self.capacity)
+
+    def write(self, data, arrival):
+        size = len(data)
+        if not size:
+            return
+        with self.lock:
+            self._read_offsets.append(self.total)
+            self._read_times.append(arrival)
+            self._read_rows.append(self._rows)
+            self._rows += -(-size // HEX_ROW_BYTES)
+            if len(self._read_offsets) > HEX_MAX_READS:
+                del self._read_offsets[: HEX_MAX_READS // 2]
+                del self._read_times[: HEX_MAX_READS // 2]
+                del self._read_rows[: HEX_MAX_READS // 2]
+
+            view = memoryview(data)[-self.capacity :]
+            offset = self.total + size - len(view)
+            pos = offset % self.capacity
+            first = min(len(view), self.capacity - pos)
+            self._buffer[pos : pos + first] = view[:first]
+            self._buffer[: len(view) - first] = view[first:]
+            self.total += size
+
+    def row_range(self, markers=False):
+        """:return: (first row, end row) of the rows still in the ring."""
+        with self.lock:
+            if not markers:
+                return self.start // HEX_ROW_BYTES, -(-self.total // HEX_ROW_BYTES)
+            read = self._find_read(self.start)
+            if read is None:
+                return self._rows, self._rows
+            offset = max(self.start, self._read_offsets[read])
+            first = self._read_rows[read] + (offset - self._read_offsets[read]) // HEX_ROW_BYTES
+            return first, self._rows
+
+    def get_rows(self, first_row, count, markers=False):
+        """
+        :return: List of (stream offset, bytes, read time or None), the time is given
+                 for the first row of a read when markers is set.
+        """
+        rows = []
+        with self.lock:
+            start = self.start
+            for row in range(first_row, first_row + count):
+                arrival = None
+                if markers:
+                    read = bisect.bisect_right(self._read_rows, row) - 1
+                    if read < 0:
+                        continue
+                    offset = (
+                        self._read_offsets[read] + (row - self._read_rows[read]) * HEX_ROW_BYTES
+                    )
+                    if read + 1 < len(self._read_offsets):
+                        end = min(offset + HEX_ROW_BYTES, self._read_offsets[read + 1])
+                    else:
+                        end = min(offset + HEX_ROW_BYTES, self.total)
+                    if row == self._read_rows[read]:
+                        arrival = self._read_times[read]
+                else:
+                    offset = row * HEX_ROW_BYTES
+                    end = min(offset + HEX_ROW_BYTES, self.total)
+                offset = max(offset, start)
+                if offset < end:
+                    rows.append((offset, self._read(offset, end), arrival))
+        return rows
+
+    def _find_read(self, offset):
+        # Index of the read containing offset, or the oldest one remembered
+        if not self._read_offsets:
+            return None
+        return max(0, bisect.bisect_right(self._read_offsets, offset) - 1)
+
+    def _read(self, start, end):
+        pos = start % self.capacity
+        size = end - start
+        if pos + size <= self.capacity:
+            return self._buffer[pos : pos + size]
+        return self._buffer[pos:] + self._buffer[: pos + size - self.capacity]
+
+
+def load_plot_rules(config):
+    r"""
+    Read the plot extract rules from the settings.
+
+    Every [Plot:<name>] section is one rule with the keys enabled and pattern, a regex
+    whose named groups are numbers, e.g. temp=(?P<temp>[-.\d]+). Each named group is a
+    series, the series of a rule share one chart lane and its scale.
+
+    :param config: A ConfigParser, see load_configs.
+    :return: List of (name, compiled pattern).
+    """
+    rules = []
+    for section in config.sections():
+        if not section.startswith(PLOT_SECTION_PREFIX):
+            continue
+        rule = config[section]
+        if not rule.getboolean("enabled", fallback=True) or not rule.get("pattern"):
+            continue
+        name = section[len(PLOT_SECTION_PREFIX) :]
+        try:
+            regex = re.compile(rule.get("pattern"))
+        except re.error as e:
+            print(f"Plot rule {name}: {e}")
+            continue
+        if not regex.groupindex:
+            print(f"Plot rule {name}: the pattern has no named groups")
+            continue
+        rules.append((name, regex))
+    return rules
+
+
+class SeriesRing:
+    """
+    The latest samples of one series in fixed size arrays, with min/max blocks.
+
+    Every level of PLOT_DECIMATION_LEVELS keeps the min and max of consecutive blocks of
+    samples, updated as samples are appended. decimate picks the level whose blocks
+    come closest to one per pixel, so drawing costs the same for a window of a hundred
+    or a million samples.
+    """
+
+    def __init__(self, capacity):
+        block = PLOT_DECIMATION_LEVELS[-1]
+        self.capacity = max(block, -(-capacity // block) * block)
+        self.total = 0  # Samples appended so far
+        self.times = array("d", bytes(8 * self.capacity))  # time.monotonic() seconds
+        self.values = array("d", bytes(8 * self.capacity))
+        self.levels = [
+            (
+                size,
+                array("d", bytes(8 * (self.capacity // size))),
+                array("d", bytes(8 * (self.capacity // size))),
+            )
+            for size in PLOT_DECIMATION_LEVELS
+        ]
+
+    @property
+    def last(self):
+        return self.values[(self.total - 1) % self.capacity] if self.total else None
+
+    def append(self, t, value):
+        total = self.total
+        i = total % self.capacity
+        self.times[i] = t
+        self.values[i] = value
+        for size, minimums, maximums in self.levels:
+            block = (total // size) % len(minimums)
+            if total % size == 0:
+                minimums[block] = maximums[block] = value
+            elif value < minimums[block]:
+                minimums[block] = value
+            elif value > maximums[block]:
+                maximums[block] = value
+        self.total = total + 1
+
+    def decimate(self, start_time, end_time, width):
+        """
+        :return: (minimums, maximums), one value or None per pixel column across the
+                 time window.
+        """
+        minimums = [None] * width
+        maximums = [None] * width
+        oldest = max(0, self.total - self.capacity)
+        # First sample in the window, the times only grow
+        lo, hi = oldest, self.total
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.times[mid % self.capacity] < start_time:
+                lo = mid + 1
+            else:
+                hi = mid
+        count = self.total - lo
+        if count <= 0 or end_time <= start_time:
+            return minimums, maximums
+        scale = width / (end_time - start_time)
+
+        size, block_minimums, block_maximums = 1, self.values, self.values
+        for level in self.levels:
+            if count // size <= 2 * width:
+                break
+            size, block_minimums, block_maximums = level
+        for block in range(lo // size, (self.total - 1) // size + 1):
+            first = max(block * size, lo)
+            x = int((self.times[first % self.capacity] - start_time) * scale)
+            if not 0 <= x < width:
+                continue
+            if block * size < oldest:
+                # Partly overwritten, its min/max slot now belongs to the newest block
+                values = [self.values[i % self.capacity] for i in range(first, (block + 1) * size)]
+                low, high = min(values), max(values)
+            else:
+                index = block % len(block_minimums)
+                low = block_minimums[index]
+                high = block_maximums[index]
+            if minimums[x] is None:
+                minimums[x], maximums[x] = low, high
+            else:
+                minimums[x] = min(minimums[x], low)
+                maximums[x] = max(maximums[x], high)
+        return minimums, maximums
+
+
+class PlotData:
+    """
+    Series of one session, extracted from its framed lines by the plot rules.
+
+    Fed by the reader thread, each rule's regex runs once over the text of a batch of
+    lines. Samples can also be written to a CSV file through a LogWriter, one column
+    per series, so the capture thread never waits on the disk.
+    """
+
+    def __init__(self, rules, capacity=DEFAULT_PLOT_POINTS, csv_path=None):
+        self.rules = rules
+        self.lock = threading.Lock()  # Held while feeding and while a lane is drawn
+        self.series = [
+            [(group, SeriesRing(capacity)) for group in regex.groupindex] for name, regex in rules
+        ]
+        self.columns = [(name, group) for name, regex in rules for group in regex.groupindex]
+        self.csv_writer = None
+        if csv_path:
+            self.csv_writer = LogWriter(csv_path)
+            self.formatter = TimestampFormatter()
+            if self.csv_writer.offset == 0:
+                header = ",".join(f"{name}.{group}" for name, group in self.columns)
+                self.csv_writer.write(encode_log_text(f"time,{header}\n"))
+
+    def feed(self, lines):
+        """:param lines: List of (arrival, line), see LineFramer.feed."""
+        text = "\n".join(line for _, line in lines)
+        line_starts = None
+        rows = []
+        with self.lock:
+            column = 0
+            for (_, regex), series in zip(self.rules, self.series, strict=True):
+                for match in regex.finditer(text):
+                    if line_starts is None:
+                        line_starts = [0]
+                        for _, line in lines[:-1]:
+                            line_starts.append(line_starts[-1] + len(line) + 1)
+                    arrival = lines[bisect.bisect_right(line_starts, match.start()) - 1][0]
+                    values = []
+                    for group, ring in series:
+                        try:
+                            value = float(match.group(group))
+                        except (TypeError, ValueError):
+                            values.append("")
+                            continue
+                        ring.append(arrival / 1e9, value)
+                        values.append(match.group(group))
+                    if self.csv_writer:
+                        cells = [""] * len(self.columns)
+                        cells[column : column + len(values)] = values
+                        rows.append(f"{self.formatter.format(arrival)},{','.join(cells)}\n")
+                column += len(series)
+        if rows:
+            self.csv_writer.write(encode_log_text("".join(rows)))
+
+    def close(self):
+        if self.csv_writer:
+            self.csv_writer.close()
+
+
+class MappedLog:
+    """
+    A log file opened read only through mmap, with a sparse line index.
+
+    The index holds the number of lines before each LOG_VIEW_INDEX_BLOCK of the file,
+    counted on a background thread, a few bytes per block. A line is found by
+    bisecting the index and stepping through the newlines of one block. Only the
+    pages that are looked at are read, and the OS can drop them again, so memory use
+    does not grow with the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        # An empty file cannot be mapped, it has no lines to look up anyway
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.block_lines = array("Q", [0])  # Lines before each block, one more as blocks are done
+        self.line_count = None  # Set when the index is complete
+        self.cancelled = False
+        self._thread = threading.Thread(target=self._index, name="Log index", daemon=True)
+        self._thread.start()
+
+    @property
+    def indexed_lines(self):
+        """Lines that can be looked up so far, all of them once line_count is set."""
+        return self.line_count if self.line_count is not None else self.block_lines[-1]
+
+    @property
+    def progress(self):
+        return min(1.0, (len(self.block_lines) - 1) * LOG_VIEW_INDEX_BLOCK / max(1, self.size))
+
+    def close(self):
+        self.cancelled = True
+        self._thread.join()
+        if self.size:
+            self.map.close()
+        self.file.close()
+
+    def line_offset(self, line):
+        """:return: File offset of a line counted from 0, None if it is not indexed yet."""
+        if line <= 0:
+            return 0
+        # The block holding the newline that ends the line before
+        block = bisect.bisect_left(self.block_lines, line) - 1
+        if block + 1 >= len(self.block_lines):
+            return None
+        pos = block * LOG_VIEW_INDEX_BLOCK
+        for _ in range(line - self.block_lines[block]):
+            pos = self.map.find(b"\n", pos) + 1
+        return pos
+
+    def offset_line(self, offset):
+        """:return: Line number of a file offset, None if it is not indexed yet."""
+        block = offset // LOG_VIEW_INDEX_BLOCK
+        if block >= len(self.block_lines):
+            return None
+        return self.block_lines[block] + self.map[block * LOG_VIEW_INDEX_BLOCK : offset].count(
+            b"\n"
+        )
+
+    def read_lines(self, first_line, count):
+        """:return: List of up to count lines from first_line on, decoded."""
+        pos = self.line_offset(first_line)
+        lines = []
+        while pos is not None and pos < self.size and len(lines) < count:
+            end = self.map.find(b"\n", pos)
+            end = self.size if end < 0 else end
+            data = self.map[pos : min(end, pos + LOG_VIEW_MAX_LINE_BYTES)]
+            lines.append(data.decode("utf-8", "replace").rstrip("\r"))
+            pos = end + 1
+        return lines
+
+    def line_start(self, offset):
+        return self.map.rfind(b"\n", 0, offset) + 1 if offset > 0 else 0
+
+    def next_line_start(self, offset):
+        end = self.map.find(b"\n", offset)
+        return self.size if end < 0 else end + 1
+
+    def find_time(self, target):
+        """
+        Binary search over the timestamp prefix of the lines, see TimestampFormatter.
+
+        :param target: Start of a timestamp as bytes, e.g. b"2024-05-01 12:30".
+        :return: Offset of the first line stamped at or after target, lines without a
+                 stamp take the time of the next stamped line.
+        """
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            stamp = self._next_stamp(self.next_line_start(mid) if mid else 0)
+            if stamp is None or stamp[: len(target)] >= target:
+                hi = mid
+            else:
+                lo = mid + 1
+        return self.next_line_start(lo) if lo else 0
+
+    def first_stamp(self):
+        return self._next_stamp(0)
+
+    def find(self, regex, offset, backwards=False):
+        """
+        Search in blocks of whole lines, so a search can be cancelled between blocks.
+
+        :param regex: Compiled bytes pattern.
+        :return: (start, end) offsets of the first match at or after offset, or of the
+                 last match before it, None if there is none or the log was closed.
+        """
+        if not backwards:
+            pos = offset
+            while pos < self.size and not self.cancelled:
+                end = self.next_line_start(min(self.size, pos + SEARCH_BLOCK_BYTES))
+                match = regex.search(self.map, pos, end)
+                self._release(pos, end)
+                if match:
+                    return match.span()
+                pos = end
+            return None
+        end = offset
+        while end > 0 and not self.cancelled:
+            start = self.line_start(max(0, end - SEARCH_BLOCK_BYTES))
+            if start >= end:
+                start = max(0, end - SEARCH_BLOCK_BYTES)
+            last = None
+            for match in regex.finditer(self.map, start, end):
+                last = match
+            self._release(start, end)
+            if last:
+                return last.span()
+            end = start
+        return None
+
+    def _release(self, start, end):
+        # Unmap pages after a scan, they stay in the OS file cache but not in our memory
+        if hasattr(mmap, "MADV_DONTNEED"):
+            start -= start % mmap.PAGESIZE
+            self.map.madvise(mmap.MADV_DONTNEED, start, min(end, self.size) - start)
+
+    def _next_stamp(self, pos, max_lines=100):
+        # Timestamp of the first stamped line at or after pos
+        for _ in range(max_lines):
+            if pos >= self.size:
+                return None
+            match = LOG_TIMESTAMP_RE.match(self.map, pos)
+            if match:
+                return match.group(1)
+            pos = self.next_line_start(pos)
+        return None
+
+    def _index(self):
+        count = 0
+        for start in range(0, self.size, LOG_VIEW_INDEX_BLOCK):
+            if self.cancelled:
+                return
+            count += self.map[start : start + LOG_VIEW_INDEX_BLOCK].count(b"\n")
+            self.block_lines.append(count)
+            self._release(start, start + LOG_VIEW_INDEX_BLOCK)
+        # A last line without a line ending counts too
+        self.line_count = count + (1 if self.size and self.map[-1:] != b"\n" else 0)
+
+
+class LogSearch:
+    """
+    Find the lines of a session log that match a pattern, on a background thread.
+
+    The worker reads whole lines in large blocks and counts their numbers itself, keeps
+    following the log as it grows and only hands the matches over to the GUI.
+    """
+
+    def __init__(self, log_writer, pattern, use_regex=False, ignore_case=True, keep_lines=0):
+        flags = re.IGNORECASE if ignore_case else 0
+        self.regex = re.compile(pattern if use_regex else re.escape(pattern), flags)
+        self.log_writer = log_writer
+        self.scanned_offset = log_writer.start_offset
+        self.scanned_lines = 0
+
+        # Guarded by lock, the worker appends and the GUI takes snapshots
+        self.lock = threading.Lock()
+        self.matches = array("Q")  # Matching line numbers, ascending
+        self.recent = collections.deque(maxlen=keep_lines or None)  # (line number, text)
+
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="LogSearch", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._stopped.set()
+
+    def is_done(self):
+        # Caught up with the log and the log will not grow any more
+        return self.log_writer.closed and self.scanned_offset >= self.log_writer.written_offset
+
+    def take_recent(self, count):
+        """
+        Take the newest matches.
+
+        :param count: Number of matches the caller already has.
+        :return: (total matches, list of (line number, text) found after the first count).
+        """
+        with self.lock:
+            total = len(self.matches)
+            new = min(total - count, len(self.recent))
+            if new <= 0:
+                return total, []
+            return total, list(self.recent)[-new:]
+
+    def _run(self):
+        log_writer = self.log_writer
+        reader = log_writer.open_reader()
+        while not self._stopped.is_set():
+            # Read before written_offset, a closed log has nothing more to come
+            closed = log_writer.closed
+            start = self.scanned_offset
+            size = min(log_writer.written_offset - start, SEARCH_BLOCK_BYTES)
+            oldest = log_writer.segments[0][0]
+            if start < oldest:
+                # The oldest files of the log were deleted by retention, a new file
+                # starts with a checkpoint
+                start, line = log_writer.line_index.checkpoint(oldest)
+                if start < oldest:
+                    break
+                self.scanned_offset, self.scanned_lines = start, line
+                continue
+            data = reader.read(start, size) if size > 0 else b""
+            # Whole lines, the last one only once nothing more can follow it
+            end = data.rfind(b"\n") + 1
+            if closed or (not end and len(data) == SEARCH_BLOCK_BYTES):
+                end = len(data)
+            if not end:
+                if closed:
+                    break
+                self._stopped.wait(SEARCH_POLL_INTERVAL)
+                continue
+            data = data[:end]
+            self._search_block(data.decode("utf-8", "replace"), self.scanned_lines)
+            self.scanned_lines += data.count(b"\n")
+            self.scanned_offset = start + end
+        reader.close()
+
+    def _search_block(self, text, first_line):
+        lines = []
+        texts = []
+        line = first_line
+        pos = 0
+        for match in self.regex.finditer(text):
+            line += text.count("\n", pos, match.start())
+            pos = match.start()
+            if lines and lines[-1] == line:
+                continue  # One entry per line
+            line_start = text.rfind("\n", 0, pos) + 1
+            line_end = text.find("\n", pos)
+            if line_end < 0:
+                line_end = len(text)  # The last line of a closed log may have no line end
+            lines.append(line)
+            texts.append(text[line_start:line_end].removesuffix("\r"))
+        if lines:
+            with self.lock:
+                self.matches.extend(lines)
+                self.recent.extend(zip(lines, texts, strict=True))
+
+
+class Transmitter:
+    """
+    Send text, macros and files to the port of a session from its own thread.
+
+    Jobs are sent in the order they were queued, the reader and the GUI never wait
+    for the port. Lines can be paced with a pause after each one, files with a pause
+    after every few bytes, unpaced files are streamed in TX_CHUNK_BYTES writes to keep
+    the UART busy. Hardware and software flow control are done by the driver, see
+    open_port, a write simply blocks while the other side holds us off. Progress is
+    kept in plain attributes for MetricsCollector.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.jobs = queue.Queue()  # (generation, kind, description, arguments), None stops
+
+        # Progress, only written by the transmit thread
+        self.bytes_sent = 0
+        self.job = None  # Description of the job being sent
+        self.job_total = 0  # Bytes of the job, 0 if unknown
+        self.job_sent = 0
+        self.last_error = None
+
+        # A cancel bumps the generation, jobs queued before it are skipped
+        self._generation = 0
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name=f"Transmitter {session.port}", daemon=True
+        )
+        self._thread.start()
+
+    def send_text(self, text, line_ending="\n", line_delay=0, encoding=DEFAULT_ENCODING):
+        """
+        Queue lines of text, each followed by line_ending.
+
+        :param line_delay: Seconds to pause after each line, e.g. for a slow command shell.
+        """
+        self.jobs.put((self._generation, "text", text, (line_ending, line_delay, encoding)))
+
+    def send_file(self, path, pace_bytes=0, pace_delay=0):
+        """
+        Queue a file, it is streamed from disk and never loaded as a whole.
+
+        :param pace_bytes: Send this many bytes at a time, 0 to send as fast as possible.
+        :param pace_delay: Seconds to pause after every pace_bytes.
+        """
+        self.jobs.put((self._generation, "file", path, (pace_bytes, pace_delay)))
+
+    def send_bytes(self, data, description="data"):
+        """Queue bytes to be written as they are, e.g. what a share client sent."""
+        self.jobs.put((self._generation, "bytes", description, (data,)))
+
+    def cancel(self):
+        # Drop the queued jobs and stop the one being sent after its current write
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+        if hasattr(self.session.ser, "cancel_write"):
+            self.session.ser.cancel_write()
+
+    def stop(self):
+        self.cancel()
+        self.jobs.put(None)
+        # A write held off by flow control only returns once the port is closed
+        self._thread.join(TX_STOP_TIMEOUT)
+
+    def _pause(self, generation, delay):
+        # Sleep unless cancelled, True if the job goes on
+        with self._cond:
+            return not self._cond.wait_for(lambda: self._generation != generation, delay)
+
+    def _write(self, generation, data):
+        if self._generation != generation:
+            return False
+        self.session.ser.write(data)
+        self.bytes_sent += len(data)
+        self.job_sent += len(data)
+        return True
+
+    def _report(self, text):
+        if self.session.view is not None:
+            post_to_gui(self.session.view, text)
+        else:
+            print(text, end="", file=sys.stderr)
+
+    def _run(self):
+        while True:
+            item = self.jobs.get()
+            if item is None:
+                break
+            generation, kind, description, arguments = item
+            if generation != self._generation:
+                continue  # Cancelled while queued
+            self.job = description
+            self.job_sent = 0
+            start = time.perf_counter()
+            try:
+                if kind == "text":
+                    done = self._send_text(generation, description, *arguments)
+                elif kind == "bytes":
+                    self.job_total = len(arguments[0])
+                    done = self._write(generation, arguments[0])
+                else:
+                    done = self._send_file(generation, description, *arguments)
+                if done and kind == "file":
+                    self.session.ser.flush()  # Wait until the last byte is on the wire
+                    elapsed = max(time.perf_counter() - start, 1e-9)
+                    self._report(
+                        f"Sent {description}: {self.job_sent} bytes in {elapsed:.2f} s, "
+                        f"{self.job_sent / elapsed / 1024:.1f} KiB/s\n"
+                    )
+                elif not done:
+                    self._report(f"Cancelled sending {description} after {self.job_sent} bytes\n")
+            except (serial.SerialException, OSError, UnicodeError) as e:
+                self.last_error = str(e)
+                self._report(f"Failed to send {description}: {e}\n")
+            self.job = None
+            self.job_total = 0
+
+    def _send_text(self, generation, text, line_ending, line_delay, encoding):
+        lines = text.splitlines()
+        self.job_total = sum(len(line) + len(line_ending) for line in lines)
+        if not line_delay:
+            data = "".join(line + line_ending for line in lines).encode(encoding)
+            if not self._write(generation, data):
+                return False
+            for line in lines:
+                self._report(f"Sent: {line}\n")
+            return True
+        for line in lines:
+            if not self._write(generation, (line + line_ending).encode(encoding)):
+                return False
+            self._report(f"Sent: {line}\n")
+            if not self._pause(generation, line_delay):
+                return False
+        return True
+
+    def _send_file(self, generation, path, pace_bytes, pace_delay):
+        self.job_total = os.path.getsize(path)
+        chunk_size = pace_bytes if pace_bytes > 0 else TX_CHUNK_BYTES
+        with open(path, "rb") as file:
+            while True:
+                data = file.read(chunk_size)
+                if not data:
+                    return True
+                if not self._write(generation, data):
+                    return False
+                if pace_bytes > 0 and pace_delay > 0 and not self._pause(generation, pace_delay):
+                    return False
+
+
+def load_triggers(config):
+    """
+    Read the triggers from the settings.
+
+    Every [Trigger:<name>] section is one trigger with the keys enabled, pattern (a
+    literal string, or a regex if regex is set; write % as %%), ignore_case, actions
+    (comma separated, see TRIGGER_ACTIONS_LIST), send and line_ending (text for the
+    send action), command (a shell command for the command action, the trigger name,
+    matched text and port are in TRIGGER_NAME, TRIGGER_MATCH and TRIGGER_PORT) and
+    cooldown_ms (fire at most once in this time).
+
+    :param config: A ConfigParser, see load_configs.
+    :return: List of (name, pattern, regex, ignore case, actions, send, command,
+             cooldown ns, line ending).
+    """
+    triggers = []
+    for section in config.sections():
+        if not section.startswith(TRIGGER_SECTION_PREFIX):
+            continue
+        trigger = config[section]
+        if not trigger.getboolean("enabled", fallback=True) or not trigger.get("pattern"):
+            continue
+        name = section[len(TRIGGER_SECTION_PREFIX) :]
+        actions = [a.strip() for a in trigger.get("actions", "mark").split(",") if a.strip()]
+        unknown = [a for a in actions if a not in TRIGGER_ACTIONS_LIST]
+        if unknown:
+            print(f"Trigger {name}: unknown actions {', '.join(unknown)}")
+        line_ending = TX_LINE_ENDINGS_DICT.get(
+            trigger.get("line_ending", DEFAULT_TX_LINE_ENDING), "\n"
+        )
+        triggers.append(
+            (
+                name,
+                trigger.get("pattern"),
+                trigger.getboolean("regex", fallback=False),
+                trigger.getboolean("ignore_case", fallback=False),
+                [a for a in actions if a in TRIGGER_ACTIONS_LIST],
+                trigger.get("send", ""),
+                trigger.get("command", ""),
+                int(trigger.getfloat("cooldown_ms", fallback=0) * 1_000_000),
+                line_ending,
+            )
+        )
+    return triggers
+
+
+class AhoCorasick:
+    """
+    Find any number of literal strings in one pass over a stream.
+
+    Each state holds its own transitions merged with those of its failure states
+    except the root, so a character costs one or two dict lookups whatever the number
+    of patterns. While in the root state, characters that cannot start a pattern are
+    skipped by a regex character class in C. The caller keeps the state between
+    chunks, so a match split across two reads is found with the second one.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = patterns
+        goto = [{}]
+        outputs = [[]]
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = goto[state][char] = len(goto)
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(index)
+
+        # Breadth first, the failure state of a state is always finished before it
+        root = goto[0]
+        fail = [0] * len(goto)
+        delta = [root] + [None] * (len(goto) - 1)
+        pending = collections.deque()
+        for state in root.values():
+            delta[state] = goto[state]
+            pending.append(state)
+        while pending:
+            state = pending.popleft()
+            for char, next_state in goto[state].items():
+                failure = delta[fail[state]].get(char) or root.get(char, 0)
+                fail[next_state] = failure
+                outputs[next_state] = outputs[next_state] + outputs[failure]
+                if failure:
+                    delta[next_state] = {**delta[failure], **goto[next_state]}
+                else:
+                    delta[next_state] = goto[next_state]
+                pending.append(next_state)
+        self._delta = delta
+        self._outputs = outputs
+        first_chars = "".join(sorted(root))
+        self._skip = re.compile(f"[{re.escape(first_chars)}]") if first_chars else None
+
+    def feed(self, text, state=0):
+        """
+        :param text: The next part of the stream.
+        :param state: The state returned for the previous part, 0 at the start.
+        :return: (state, matches), matches are (end position in text, pattern index).
+        """
+        matches = []
+        if self._skip is None:
+            return state, matches
+        delta = self._delta
+        root = delta[0]
+        outputs = self._outputs
+        skip = self._skip.search
+        pos = 0
+        end = len(text)
+        while pos < end:
+            if state == 0:
+                match = skip(text, pos)
+                if match is None:
+                    break
+                pos = match.start()
+            char = text[pos]
+            state = delta[state].get(char) or root.get(char, 0)
+            if outputs[state]:
+                matches.extend((pos + 1, index) for index in outputs[state])
+            pos += 1
+        return state, matches
+
+
+def join_rule_patterns(regexes):
+    """
+    Combine rules into one alternation, so a text is scanned once for all of them.
+
+    Joining must not change what a rule matches: a numeric group reference would
+    count the groups of the rules before it, and a group name may only be used once.
+    Such rules are left out, the caller searches them on their own.
+
+    :param regexes: Compiled rules, each a (?:...) group.
+    :return: (compiled alternation or None, indexes of the joined rules).
+    """
+    joined = []
+    names = set()
+    for index, regex in enumerate(regexes):
+        refs = [m for m in GROUP_NUMBER_REF_RE.findall(regex.pattern) if m != "\\\\"]
+        if refs or names.intersection(regex.groupindex):
+            continue
+        names.update(regex.groupindex)
+        joined.append(index)
+    if not joined:
+        return None, joined
+    return re.compile("|".join(regexes[index].pattern for index in joined)), joined
+
+
+class TriggerEngine:
+    """
+    Match the triggers of one port against its decoded stream, see load_triggers.
+
+    Literal triggers are matched on the decoded chunks by one AhoCorasick automaton per
+    case setting, so they fire as soon as the read with their last character arrives.
+    Regex triggers are combined into one regex by join_rule_patterns and matched on
+    whole lines, every joined trigger is then searched for in the lines it hits, the
+    others in every line. The reader thread only matches and queues, the actions run on
+    the TriggerDispatcher thread, except for mark, which adds a line to the log after
+    the lines of the current read.
+    """
+
+    def __init__(self, triggers, session):
+        self.triggers = triggers
+        self.session = session
+        self.marks = []  # (arrival, line) for the reader to emit
+        self.fires = 0
+        self.latency_max_ns = 0  # From the read that matched to its actions starting
+        self._last_fire = [None] * len(triggers)
+
+        self._automata = []  # (AhoCorasick, ignore case, trigger indexes)
+        for ignore_case in (False, True):
+            indexes = [i for i, t in enumerate(triggers) if not t[2] and t[3] == ignore_case]
+            if indexes:
+                patterns = [triggers[i][1] for i in indexes]
+                if ignore_case:
+                    patterns = [pattern.lower() for pattern in patterns]
+                self._automata.append((AhoCorasick(patterns), ignore_case, indexes))
+        self._states = [0] * len(self._automata)
+
+        matchers = []  # (trigger index, compiled regex)
+        for index, (name, pattern, regex, ignore_case, *_) in enumerate(triggers):
+            if not regex:
+                continue
+            flags = "?i:" if ignore_case else "?:"
+            try:
+                compiled = re.compile(f"({flags}{pattern})")
+            except re.error as e:
+                print(f"Trigger {name}: {e}")
+                continue
+            matchers.append((index, compiled))
+        self._regex, joined = join_rule_patterns([regex for _, regex in matchers])
+        self._matchers = [matchers[i] for i in joined]
+        self._alone = [m for i, m in enumerate(matchers) if i not in joined]
+
+    def feed(self, text, lines, arrival):
+        """
+        :param text: The decoded chunk, for the literal triggers.
+        :param lines: The lines the chunk completed, see LineFramer.feed.
+        :param arrival: time.monotonic_ns() of the read.
+        """
+        for i, (automaton, ignore_case, indexes) in enumerate(self._automata):
+            self._states[i], matches = automaton.feed(
+                text.lower() if ignore_case else text, self._states[i]
+            )
+            for _, pattern in matches:
+                self._fire(indexes[pattern], self.triggers[indexes[pattern]][1], arrival)
+        if not lines:
+            return
+        search = self._regex.search if self._regex else None
+        for line_arrival, line in lines:
+            match = search(line) if search else None
+            if match:
+                # The alternation only tells the first trigger, no trigger matches before it
+                start = match.start()
+                for index, regex in self._matchers:
+                    found = regex.search(line, start)
+                    if found:
+                        self._fire(index, found.group(), line_arrival)
+            for index, regex in self._alone:
+                found = regex.search(line)
+                if found:
+                    self._fire(index, found.group(), line_arrival)
+
+    def take_marks(self):
+        marks = self.marks
+        self.marks = []
+        return marks
+
+    def _fire(self, index, matched, arrival):
+        trigger = self.triggers[index]
+        last = self._last_fire[index]
+        if last is not None and arrival - last < trigger[7]:
+            return
+        self._last_fire[index] = arrival
+        self.fires += 1
+        actions = trigger[4]
+        if "mark" in actions:
+            self.marks.append((arrival, f"--- trigger {trigger[0]}: {matched} ---"))
+        if any(action != "mark" for action in actions):
+            get_trigger_dispatcher().dispatch(self, trigger, matched, arrival)
+
+    def run_actions(self, trigger, matched, arrival):
+        # On the dispatcher thread
+        self.latency_max_ns = max(self.latency_max_ns, time.monotonic_ns() - arrival)
+        session = self.session
+        name, pattern, regex, ignore_case, actions, send, command, cooldown, line_ending = trigger
+        for action in actions:
+            if action == "beep":
+                if session.view is not None:
+                    gui_calls.put(root.bell)
+                else:
+                    print("\a", end="", file=sys.stderr, flush=True)
+            elif action == "send" and send and session.transmitter:
+                session.transmitter.send_text(send, line_ending, 0)
+            elif action == "stop":
+                session.request_stop()
+                if session.view is not None:
+                    gui_calls.put(lambda: stop_communication(session.view))
+            elif action == "command" and command:
+                env = dict(
+                    os.environ, TRIGGER_NAME=name, TRIGGER_MATCH=matched, TRIGGER_PORT=session.port
+                )
+                try:
+                    subprocess.Popen(command, shell=True, env=env)
+                except OSError as e:
+                    print(f"Trigger {name}: {e}")
+
+
+class TriggerDispatcher:
+    """Run the trigger actions of all ports on one thread, in the order they fired."""
+
+    def __init__(self):
+        self.jobs = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="Trigger actions", daemon=True)
+        self._thread.start()
+
+    def dispatch(self, engine, trigger, matched, arrival):
+        self.jobs.put((engine, trigger, matched, arrival))
+
+    def _run(self):
+        while True:
+            engine, trigger, matched, arrival = self.jobs.get()
+            try:
+                engine.run_actions(trigger, matched, arrival)
+            except Exception as e:
+                # A failing action must not take the other triggers down
+                print(f"Trigger {trigger[0]}: {e}")
+
+
+def get_trigger_dispatcher():
+    global trigger_dispatcher
+    if trigger_dispatcher is None:
+        trigger_dispatcher = TriggerDispatcher()
+    return trigger_dispatcher
+
+
+def get_share_loop():
+    # One asyncio loop for the clients of all ports, imported on first use to keep startup fast
+    global share_loop
+    if share_loop is None:
+        import asyncio
+
+        share_loop = asyncio.new_event_loop()
+        threading.Thread(target=share_loop.run_forever, name="Share server", daemon=True).start()
+    return share_loop
+
+
+def encode_websocket_frame(payload, opcode=0x2):
+    # Server frames are never masked or fragmented
+    size = len(payload)
+    if size < 126:
+        return struct.pack("!BB", 0x80 | opcode, size) + payload
+    if size < 0x10000:
+        return struct.pack("!BBH", 0x80 | opcode, 126, size) + payload
+    return struct.pack("!BBQ", 0x80 | opcode, 127, size) + payload
+
+
+class ShareClient:
+    """
+    One connection to a ShareServer, an asyncio protocol.
+
+    A client that starts with "GET " is answered with a WebSocket handshake and
+    gets the stream as binary (raw) or text (lines) messages, any other client
+    gets it as plain TCP. What a client sends, the payload of its messages for a
+    WebSocket, is written to the port as is. A handshake from a browser page is
+    refused unless its Origin is allowed, see ShareServer.origin_allowed, so other web
+    sites cannot reach the port through the user's browser.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.name = None  # Peer address
+        self.websocket = None  # Unknown until the first bytes or SHARE_DETECT_TIMEOUT
+        self.received = bytearray()  # Handshake or frames not complete yet
+        self.skipped_bytes = 0  # Not sent since the client fell behind
+        self.close_reason = ""
+        self._detect_timer = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        peer = transport.get_extra_info("peername")
+        self.name = f"{peer[0]}:{peer[1]}" if peer else "client"
+        self._detect_timer = self.server.loop.call_later(SHARE_DETECT_TIMEOUT, self._accept, False)
+
+    def data_received(self, data):
+        if self.websocket is None:
+            self.received += data
+            if not self.received.startswith(b"GET "[: len(self.received)]):
+                self._accept(False)
+            elif len(self.received) >= 4:
+                self._handshake()
+        elif self.websocket:
+            self.received += data
+            self._read_frames()
+        else:
+            self.server.write(data, self)
+
+    def eof_received(self):
+        return None  # Close our side as well
+
+    def connection_lost(self, exc):
+        if self._detect_timer:
+            self._detect_timer.cancel()
+        if self.websocket is not None:
+            self.server.remove(self)
+
+    def pause_writing(self):
+        pass  # The buffer is checked before every send, see send
+
+    def resume_writing(self):
+        pass
+
+    def send(self, data):
+        """Send a chunk of the stream unless the client is too far behind."""
+        transport = self.transport
+        if transport.is_closing():
+            return
+        server = self.server
+        if transport.get_write_buffer_size() + len(data) > server.buffer_bytes:
+            server.dropped_bytes += len(data)
+            if server.slow_client == "disconnect":
+                server.slow_disconnects += 1
+                self.close_reason = ", too slow"
+                transport.abort()
+            else:
+                self.skipped_bytes += len(data)
+            return
+        if self.skipped_bytes and server.mode == "lines":
+            # Text clients see the gap like the output view does
+            data = f"[{self.skipped_bytes} bytes not sent, client too slow]\n".encode() + data
+        self.skipped_bytes = 0
+        if self.websocket:
+            transport.write(encode_websocket_frame(data, 0x1 if server.mode == "lines" else 0x2))
+        else:
+            transport.write(data)
+
+    def _accept(self, websocket):
+        if self.websocket is not None or self.transport.is_closing():
+            return
+        self._detect_timer.cancel()
+        self.websocket = websocket
+        self.server.add(self)
+        if not websocket and self.received:
+            self.server.write(bytes(self.received), self)
+            self.received.clear()
+
+    def _handshake(self):
+        end = self.received.find(b"\r\n\r\n")
+        if end < 0:
+            if len(self.received) > SHARE_MAX_REQUEST:
+                self.transport.abort()
+            return
+        import base64
+        import hashlib
+
+        lines = self.received[:end].decode("latin-1").split("\r\n")
+        del self.received[: end + 4]
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if not key or headers.get("upgrade", "").lower() != "websocket":
+            self.transport.write(b"HTTP/1.1 400 Bad Request\r\nConnection: close\r\n\r\n")
+            self.transport.close()
+            return
+        origin = headers.get("origin")
+        if origin is not None and not self.server.origin_allowed(origin):
+            self.server.report(f"Share client {self.name} refused, origin {origin}\n")
+            self.transport.write(b"HTTP/1.1 403 Forbidden\r\nConnection: close\r\n\r\n")
+            self.transport.close()
+            return
+        accept = base64.b64encode(hashlib.sha1(key.encode() + WEBSOCKET_GUID).digest())
+        self.transport.write(
+            b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+            b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n"
+        )
+        self._accept(True)
+        self._read_frames()
+
+    def _read_frames(self):
+        received = self.received
+        while len(received) >= 2:
+            opcode = received[0] & 0x0F
+            masked = received[1] & 0x80
+            size = received[1] & 0x7F
+            header = 2
+            if size == 126:
+                header = 4
+            elif size == 127:
+                header = 10
+            if len(received) < header:
+                return
+            if size == 126:
+                size = struct.unpack_from("!H", received, 2)[0]
+            elif size == 127:
+                size = struct.unpack_from("!Q", received, 2)[0]
+            if size > SHARE_MAX_REQUEST:
+                self.transport.abort()
+                return
+            mask = bytes(received[header : header + 4]) if masked else None
+            header += 4 if masked else 0
+            if len(received) < header + size:
+                return
+            payload = bytes(received[header : header + size])
+            del received[: header + size]
+            if mask:
+                # Unmask the whole payload in one big integer XOR
+                key = (mask * (size // 4 + 1))[:size]
+                payload = (
+                    int.from_bytes(payload, "little") ^ int.from_bytes(key, "little")
+                ).to_bytes(size, "little")
+            if opcode in (0x0, 0x1, 0x2):
+                # Fragments need no reassembly, their payloads are written in order anyway
+                if payload:
+                    self.server.write(payload, self)
+            elif opcode == 0x8:
+                self.transport.write(encode_websocket_frame(payload[:2], 0x8))
+                self.transport.close()
+                return
+            elif opcode == 0x9:
+                self.transport.write(encode_websocket_frame(payload, 0xA))
+
+
+class ShareServer:
+    """
+    Republish the stream of one port to any number of TCP and WebSocket clients.
+
+    Only one program can open a serial port, this lets test scripts and other
+    viewers follow the live stream and write to the port while it is captured.
+    The reader thread only appends to a pending list and wakes the event loop of
+    get_share_loop once per batch, the loop then sends the batch to every client.
+    Each client has a send buffer of buffer_bytes, a client that lets it fill up
+    loses data or its connection, see slow_client, it never holds up the reader.
+    Counters are plain attributes for MetricsCollector.
+    """
+
+    def __init__(
+        self,
+        session,
+        port=DEFAULT_SHARE_PORT,
+        bind=DEFAULT_SHARE_BIND,
+        mode=DEFAULT_SHARE_MODE,
+        write=DEFAULT_SHARE_WRITE,
+        buffer_bytes=DEFAULT_SHARE_BUFFER_KB * 1024,
+        slow_client=DEFAULT_SHARE_SLOW_CLIENT,
+        origins=(),
+    ):
+        """
+        :param session: PortSession whose stream is shared, clients write through its Transmitter.
+        :param port: TCP port to listen on, taken ports are skipped up to SHARE_MAX_PORTS,
+                     0 picks any free port.
+        :param mode: "raw" for the bytes as read, "lines" for the decoded lines as logged.
+        :param write: Whether data from clients is written to the port.
+        :param origins: Origins of browser pages allowed besides loopback, see
+                        parse_share_origins.
+        :raise OSError: If none of the ports can be listened on.
+        """
+        import asyncio
+
+        self.session = session
+        self.mode = mode
+        self.write_enabled = write
+        self.origins = set(origins)
+        self.buffer_bytes = buffer_bytes
+        self.slow_client = slow_client
+        self.clients = set()  # Only changed on the event loop
+
+        # Counters, only written on the event loop
+        self.clients_total = 0
+        self.bytes_received = 0
+        self.dropped_bytes = 0  # Not sent to a client because it was too slow, per client
+        self.slow_disconnects = 0
+
+        self._pending = []  # Chunks published since the loop last sent
+        self._lock = threading.Lock()
+        self.loop = get_share_loop()
+        self._server = asyncio.run_coroutine_threadsafe(
+            self._listen(bind, port), self.loop
+        ).result()
+        self.address = self._server.sockets[0].getsockname()[:2]
+
+    def origin_allowed(self, origin):
+        """:return: True for a page served from this machine or an allowed origin."""
+        from urllib.parse import urlsplit
+
+        if origin.lower().rstrip("/") in self.origins:
+            return True
+        try:
+            host = urlsplit(origin).hostname
+        except ValueError:
+            return False
+        return host in SHARE_LOOPBACK_HOSTS or bool(host and host.startswith("127."))
+
+    async def _listen(self, bind, port):
+        for candidate in range(port, port + SHARE_MAX_PORTS):
+            try:
+                return await self.loop.create_server(lambda: ShareClient(self), bind, candidate)
+            except OSError as e:
+                error = e  # Most likely in use, e.g. by the share of another serial port
+        raise error
+
+    def publish(self, data):
+        # Called from the reader thread, an unused share costs one check
+        if not self.clients:
+            return
+        with self._lock:
+            self._pending.append(data)
+            if len(self._pending) > 1:
+                return  # The loop has not sent the earlier chunks yet, they go together
+        self.loop.call_soon_threadsafe(self._send_pending)
+
+    def _send_pending(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+        data = b"".join(pending)
+        for client in list(self.clients):
+            client.send(data)
+
+    def add(self, client):
+        self.clients.add(client)
+        self.clients_total += 1
+        kind = "WebSocket" if client.websocket else "TCP"
+        self.report(f"Share client {client.name} connected ({kind})\n")
+
+    def remove(self, client):
+        self.clients.discard(client)
+        self.report(f"Share client {client.name} disconnected{client.close_reason}\n")
+
+    def write(self, data, client):
+        self.bytes_received += len(data)
+        transmitter = self.session.transmitter
+        if self.write_enabled and transmitter:
+            transmitter.send_bytes(data, f"share {client.name}")
+
+    def report(self, text):
+        if self.session.view is not None:
+            post_to_gui(self.session.view, text)
+        else:
+            print(text, end="", file=sys.stderr)
+
+    def close(self):
+        # Called after the reader stopped, whatever it published is still sent
+        self.loop.call_soon_threadsafe(self._close)
+
+    def _close(self):
+        self._send_pending()
+        self._server.close()
+        for client in list(self.clients):
+            client.transport.close()  # After its buffer is sent
+
+
+def load_stages(config):
+    """
+    Read the processing stages from the settings.
+
+    Every [Stage:<name>] section is one stage with the keys enabled, type (see
+    STAGE_TYPES_LIST), mode (see STAGE_MODES_LIST) and the options of its type:
+      redact  pattern, replacement (re.sub syntax, default ***)
+      filter  pattern, invert; keeps the lines that match, or those that do not
+      json    renders lines that end in a JSON object as key=value pairs
+      python  function, "module:function" importable from the app's directory, called
+              with a list of (arrival ns, line) and returning such a list
+      tee     path, a copy of the lines at this point goes to this file ({COM}, {TIME})
+    Stages run in their order in the file, write % as %% in patterns.
+
+    :param config: A ConfigParser, see load_configs.
+    :return: List of (name, type, mode, options dict).
+    """
+    stages = []
+    for section in config.sections():
+        if not section.startswith(STAGE_SECTION_PREFIX):
+            continue
+        stage = config[section]
+        if not stage.getboolean("enabled", fallback=True):
+            continue
+        name = section[len(STAGE_SECTION_PREFIX) :]
+        kind = stage.get("type", "")
+        mode = stage.get("mode", "inline")
+        if kind not in STAGE_TYPES_LIST or mode not in STAGE_MODES_LIST:
+            print(f"Stage {name}: unknown type {kind!r} or mode {mode!r}")
+            continue
+        options = {
+            "pattern": stage.get("pattern", ""),
+            "replacement": stage.get("replacement", "***"),
+            "invert": stage.getboolean("invert", fallback=False),
+            "function": stage.get("function", ""),
+            "path": stage.get("path", ""),
+        }
+        try:
+            if kind in ("redact", "filter"):
+                re.compile(options["pattern"])
+        except re.error as e:
+            print(f"Stage {name}: {e}")
+            continue
+        if kind == "tee" and mode == "process":
+            mode = "thread"  # The file is written by this process
+        stages.append((name, kind, mode, options))
+    return stages
+
+
+def run_stage(kind, options, lines):
+    """
+    Apply one stage to a batch of lines, at module level so process workers can run it.
+
+    :param lines: List of (arrival, line), see LineFramer.feed.
+    :return: (lines after the stage, time it took in ns).
+    """
+    start = time.perf_counter_ns()
+    if kind == "redact":
+        sub = re.compile(options["pattern"]).sub
+        replacement = options["replacement"]
+        lines = [(arrival, sub(replacement, line)) for arrival, line in lines]
+    elif kind == "filter":
+        search = re.compile(options["pattern"]).search
+        keep = not options["invert"]
+        lines = [(arrival, line) for arrival, line in lines if bool(search(line)) == keep]
+    elif kind == "json":
+        rendered = []
+        for arrival, line in lines:
+            start_brace = line.find("{")
+            if start_brace >= 0 and line.rstrip().endswith("}"):
+                try:
+                    value = json.loads(line[start_brace:])
+                except ValueError:
+                    value = None
+                if isinstance(value, dict):
+                    pairs = " ".join(f"{key}={item}" for key, item in value.items())
+                    line = line[:start_brace] + pairs
+            rendered.append((arrival, line))
+        lines = rendered
+    elif kind == "python":
+        import importlib
+
+        module, _, function = options["function"].partition(":")
+        lines = getattr(importlib.import_module(module), function)(lines)
+    return lines, time.perf_counter_ns() - start
+
+
+def get_stage_pool():
+    # Worker processes for the process stages of all ports, started on first use
+    global stage_pool
+    if stage_pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Spawned rather than forked, this process has threads and maybe Tk running. The
+        # workers leave Ctrl+C to this process, which stops the ports and then the pool.
+        stage_pool = ProcessPoolExecutor(
+            STAGE_PROCESS_WORKERS or None,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=signal.signal,
+            initargs=(signal.SIGINT, signal.SIG_IGN),
+        )
+    return stage_pool
+
+
+class Stage:
+    """One stage of a StagePipeline, see load_stages. Counters are for MetricsCollector."""
+
+    def __init__(self, spec, session):
+        self.name, self.kind, self.mode, self.options = spec
+        self.writer = None
+        if self.kind == "tee":
+            self.writer = LogWriter(parse_save_path(self.options["path"], session.port))
+
+        # Counters, only written by the thread the stage runs on
+        self.batches = 0
+        self.lines_in = 0
+        self.lines_out = 0
+        self.busy_ns = 0  # Time spent in the stage itself, in the worker for process stages
+        self.max_ns = 0
+        self.dropped_lines = 0  # Lost because the stage fell behind, see StageSegment.put
+        self.errors = 0
+
+    def run(self, lines):
+        if self.writer:
+            start = time.perf_counter_ns()
+            self.writer.write(encode_log_text(join_lines([line for arrival, line in lines])))
+            self.count(lines, lines, time.perf_counter_ns() - start)
+            return lines
+        try:
+            result, elapsed = run_stage(self.kind, self.options, lines)
+        except Exception as e:
+            # A broken python stage must not stop the reader, the lines go on as they came
+            self.errors += 1
+            if self.errors == 1:
+                print(f"Stage {self.name}: {e}")
+            return lines
+        self.count(lines, result, elapsed)
+        return result
+
+    def count(self, lines, result, elapsed):
+        self.batches += 1
+        self.lines_in += len(lines)
+        self.lines_out += len(result)
+        self.busy_ns += elapsed
+        self.max_ns = max(self.max_ns, elapsed)
+
+
+class StageSegment:
+    """
+    A thread or process stage of a StagePipeline and the inline stages after it.
+
+    Batches wait in a bounded queue, what queued up while the segment was busy is
+    taken as one batch of up to STAGE_BATCH_LINES. A process stage keeps up to
+    STAGE_MAX_IN_FLIGHT batches in the pool and passes the results on in the order
+    they were submitted.
+    """
+
+    def __init__(self, pipeline, stage):
+        self.pipeline = pipeline
+        self.stages = [stage]
+        self.next = None  # Following segment, None to hand the lines to emit_lines
+        self.queue = queue.Queue(maxsize=STAGE_QUEUE_BATCHES)  # (lines, formatter), None ends
+        self.dropped = 0  # Lines dropped since the last batch that got through
+        self.formatter = None  # Of the last batch, for the marker close may have to add
+        self.thread = threading.Thread(
+            target=self._run, name=f"Stage {stage.name} {pipeline.session.port}", daemon=True
+        )
+
+    def put(self, lines, formatter):
+        # Never blocks the thread in front, a full queue costs lines and leaves a marker
+        self.formatter = formatter
+        try:
+            self.queue.put_nowait((self._mark(lines), formatter))
+            self.dropped = 0
+        except queue.Full:
+            self.dropped += len(lines)
+            self.stages[0].dropped_lines += len(lines)
+
+    def close(self):
+        if self.dropped:
+            self.queue.put((self._mark([]), self.formatter))
+        self.queue.put(None)
+        self.thread.join()
+
+    def _mark(self, lines):
+        if not self.dropped:
+            return lines
+        marker = f"--- {self.dropped} lines dropped, stage {self.stages[0].name} fell behind ---"
+        return [(time.monotonic_ns(), marker)] + lines
+
+    def _take(self):
+        # One queued batch, or all that queued up, None once closed
+        item = self.queue.get()
+        if item is None:
+            return None
+        lines, formatter = item
+        lines = list(lines)
+        while len(lines) < STAGE_BATCH_LINES:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)  # Seen on the next take, after this batch
+                break
+            lines += item[0]
+        return lines, formatter
+
+    def _deliver(self, lines, formatter):
+        for stage in self.stages[1:]:
+            lines = stage.run(lines)
+        if self.next:
+            self.next.put(lines, formatter)
+        else:
+            emit_lines(self.pipeline.session, lines, formatter)
+
+    def _run(self):
+        first = self.stages[0]
+        in_flight = collections.deque()  # (future, lines, formatter) of a process stage
+        while True:
+            item = self._take()
+            if item is None:
+                break
+            lines, formatter = item
+            if first.mode != "process":
+                self._deliver(first.run(lines), formatter)
+                continue
+            try:
+                future = get_stage_pool().submit(run_stage, first.kind, first.options, lines)
+            except Exception as e:
+                # No worker processes, e.g. a broken pool, run the stage on this thread
+                print(f"Stage {first.name}: {e}")
+                first.mode = "thread"
+                self._deliver(first.run(lines), formatter)
+                continue
+            in_flight.append((future, lines, formatter))
+            # Results go on in order, wait for them once nothing else is queued
+            while in_flight and (
+                in_flight[0][0].done()
+                or len(in_flight) >= STAGE_MAX_IN_FLIGHT
+                or self.queue.empty()
+            ):
+                self._finish(*in_flight.popleft())
+        while in_flight:
+            self._finish(*in_flight.popleft())
+
+    def _finish(self, future, lines, formatter):
+        first = self.stages[0]
+        try:
+            result, elapsed = future.result()
+        except Exception:
+            # Lost worker or an error in the stage, run it here so a redact still applies
+            self._deliver(first.run(lines), formatter)
+            return
+        first.count(lines, result, elapsed)
+        self._deliver(result, formatter)
+
+
+class StagePipeline:
+    """
+    The [Stage:...] stages of one session, between the line framer and emit_lines.
+
+    Stages run in the order of settings.ini. The inline stages in front run on the
+    reader thread. A thread or process stage starts a StageSegment with its own
+    thread, the inline stages after it run on that thread too, and the last segment
+    hands its lines to emit_lines, so the log, the GUI and the share clients get
+    them in the order they were read. A process stage keeps regex heavy work off the
+    GIL of the reader. The reader never waits for a stage that falls behind, see
+    StageSegment.put.
+    """
+
+    def __init__(self, stages, session):
+        self.session = session
+        self.stages = [Stage(spec, session) for spec in stages]
+        self.head = []  # Inline stages run by the reader
+        self.segments = []
+        for stage in self.stages:
+            if stage.mode != "inline":
+                self.segments.append(StageSegment(self, stage))
+            elif self.segments:
+                self.segments[-1].stages.append(stage)
+            else:
+                self.head.append(stage)
+        for segment, following in zip(self.segments, self.segments[1:], strict=False):
+            segment.next = following
+        for segment in self.segments:
+            segment.thread.start()
+
+    def queued(self, stage):
+        # Batches waiting for a stage, 0 for the ones that do not start a segment
+        segment = next((s for s in self.segments if s.stages[0] is stage), None)
+        return segment.queue.qsize() if segment else 0
+
+    def feed(self, lines, formatter=None):
+        for stage in self.head:
+            lines = stage.run(lines)
+        if self.segments:
+            self.segments[0].put(lines, formatter)
+        else:
+            emit_lines(self.session, lines, formatter)
+
+    def close(self):
+        # Called after the reader stopped, in order so every batch gets through
+        for segment in self.segments:
+            segment.close()
+        for stage in self.stages:
+            if stage.writer:
+                stage.writer.close()
+
+
+class PortSession:
+    """An open port with its reader thread, log files and output view."""
+
+    def __init__(
+        self,
+        ser,
+        log_writer,
+        min_chunk,
+        show_timestamp,
+        raw_capture=None,
+        decoder=None,
+        view=None,
+        reconnect=False,
+        ansi_view="off",
+        ansi_log=DEFAULT_ANSI_LOG,
+        byte_ring=None,
+        triggers=None,
+        plot_data=None,
+        stages=None,
+    ):
+        self.ser = ser
+        self.port = ser.port
+        self.log_writer = log_writer
+        self.min_chunk = min_chunk
+        self.show_timestamp = show_timestamp
+        self.raw_capture = raw_capture
+        self.byte_ring = byte_ring  # Raw bytes for the hex view
+        self.triggers = TriggerEngine(triggers, self) if triggers else None
+        self.plot_data = plot_data  # Series for the plot panel and the CSV file
+        self.share = None  # ShareServer, set before start if the port is shared
+        self.pipeline = StagePipeline(stages, self) if stages else None
+        self.decoder = decoder or create_stream_decoder()
+        self.view = view  # None when nothing displays this port
+        self.reconnect = reconnect  # Reopen the port when the device goes away
+        # Escape sequences are only parsed when someone needs them removed
+        self.ansi_view = ansi_view if view is not None else "off"
+        self.ansi_log = ansi_log
+        self.ansi_parser = None
+        if self.ansi_view != "off" or ansi_log == "stripped":
+            self.ansi_parser = AnsiParser()
+        self.identity = None  # See get_port_identity, looked up by the reader
+        self.stopping = threading.Event()
+        self.start_time = time.monotonic()  # Reset by start
+
+        self.decode_errors = DecodeErrorCounter(self.decoder.errors)
+        self.decoder.errors = self.decode_errors.name
+
+        # Counters, only written by the reader thread and read by MetricsCollector
+        self.bytes_read = 0
+        self.lines_read = 0
+        self.reconnects = 0
+        self.serial_errors = 0
+        self.last_error = None
+        self.chunk_sizes = [0] * CHUNK_SIZE_BUCKETS  # By len(chunk).bit_length()
+        self.chunks_read = 0
+        self.process_ns = 0  # Time from a read returning to its lines being handed over
+        self.process_times = [0] * PROCESS_TIME_BUCKETS  # By (us).bit_length()
+        self.thread = threading.Thread(
+            target=read_from_port, args=(self,), name=f"Reader {self.port}", daemon=True
+        )
+        self.transmitter = None  # Created by start
+
+    def emit(self, lines, formatter=None):
+        # Lines of the reader go through the stages, if any, on their way to emit_lines
+        if self.pipeline:
+            self.pipeline.feed(lines, formatter)
+        else:
+            emit_lines(self, lines, formatter)
+
+    def start(self):
+        self.start_time = time.monotonic()
+        self.transmitter = Transmitter(self)
+        self.thread.start()
+
+    def request_stop(self):
+        # Let the reader finish on its own, e.g. from a trigger, stop still has to be called
+        self.stopping.set()
+        if hasattr(self.ser, "cancel_read"):
+            self.ser.cancel_read()
+
+    def stop(self):
+        self.stopping.set()
+        if self.transmitter:
+            self.transmitter.stop()
+        if self.reconnect and port_watcher:
+            port_watcher.notify()  # In case the reader waits for the device
+        # Wake the reader out of its blocking read before closing the port
+        if hasattr(self.ser, "cancel_read"):
+            self.ser.cancel_read()
+        self.ser.close()
+        self.thread.join()
+        if self.pipeline:
+            self.pipeline.close()
+        # Blocks until everything queued is on disk
+        self.log_writer.close()
+        if self.raw_capture:
+            self.raw_capture.close()
+        if self.plot_data:
+            self.plot_data.close()
+        if self.share:
+            self.share.close()
+
+
+def post_to_gui(view, text, log_span=None, styles=None):
+    # Called from the reader threads, never touch Tk here. log_span is the (start, end)
+    # stream offsets of the text in the session log, None for text that is not logged
+    try:
+        gui_queue.put_nowait((view, text, log_span, styles))
+    except queue.Full:
+        # The GUI fell behind, keep draining the port and report the gap on the next frame
+        view.dropped_chunks += 1
+
+
+def emit_lines(session, lines, formatter=None):
+    # Every consumer gets the same framed text, the log and the GUI stay line aligned
+    if not lines:
+        return
+    prefixes = [f"{formatter.format(arrival)} - " for arrival, line in lines] if formatter else None
+    text = join_lines([line for arrival, line in lines], prefixes)
+    view_text = text
+    styles = None
+    parser = session.ansi_parser
+    plot_lines = lines
+    if parser and (parser.busy or "\x1b" in text or "\r" in text):
+        plain, runs = parser.parse([line for arrival, line in lines])
+        plot_lines = [(arrival, line) for (arrival, _), line in zip(lines, plain, strict=True)]
+        view_text = join_lines(plain, prefixes)
+        if session.ansi_log == "stripped":
+            text = view_text
+        if session.ansi_view == "off":
+            view_text = text
+        elif session.ansi_view == "render" and runs:
+            styles = runs
+            if prefixes:
+                styles = [
+                    (index, start + len(prefixes[index]), end + len(prefixes[index]), style)
+                    for index, start, end, style in runs
+                ]
+    if session.plot_data:
+        session.plot_data.feed(plot_lines)
+    # Disk I/O happens on the log writer thread
+    data = encode_log_text(text)
+    log_offset = session.log_writer.write(data)
+    if session.share and session.share.mode == "lines":
+        session.share.publish(data)
+    session.lines_read += len(lines)
+    if session.view is not None:
+        log_span = None if log_offset is None else (log_offset, log_offset + len(data))
+        post_to_gui(session.view, view_text, log_span, styles)
+
+
+def join_lines(lines, prefixes=None):
+    if prefixes:
+        return "".join(f"{prefix}{line}\n" for prefix, line in zip(prefixes, lines, strict=True))
+    return "".join(f"{line}\n" for line in lines)
+
+
+def read_from_port(session):
+    ser = session.ser
+    decoder = session.decoder
+    framer = LineFramer()
+    formatter = TimestampFormatter() if session.show_timestamp else None
+    if session.reconnect:
+        # Enumerating ports can be slow, do it here rather than on the GUI thread
+        session.identity = get_port_identity(ser.port)
+        get_port_watcher()
+    triggers = session.triggers
+    share = session.share if session.share and session.share.mode == "raw" else None
+    while ser.is_open and not session.stopping.is_set():
+        try:
+            data = read_chunk(ser, session.min_chunk)
+            arrival = time.monotonic_ns()
+            if data:
+                size = len(data)
+                session.bytes_read += size
+                session.chunk_sizes[min(size.bit_length(), CHUNK_SIZE_BUCKETS - 1)] += 1
+                if session.raw_capture:
+                    # Verbatim copy before any decoding
+                    session.raw_capture.record(data)
+                if session.byte_ring:
+                    session.byte_ring.write(data, arrival)
+                if share:
+                    share.publish(data)
+                text = decoder.decode(data)
+                lines = framer.feed(text, arrival)
+                if triggers:
+                    triggers.feed(text, lines, arrival)
+                session.emit(lines, formatter)
+                if triggers and triggers.marks:
+                    session.emit(triggers.take_marks(), formatter)
+                elapsed = time.monotonic_ns() - arrival
+                session.chunks_read += 1
+                session.process_ns += elapsed
+                bucket = min((elapsed // 1000).bit_length(), PROCESS_TIME_BUCKETS - 1)
+                session.process_times[bucket] += 1
+            else:
+                # The line went idle, let an unterminated line such as a prompt through
+                lines = framer.flush(arrival, LINE_FLUSH_TIMEOUT_NS)
+                if triggers and lines:
+                    triggers.feed("", lines, arrival)
+                session.emit(lines, formatter)
+                if triggers and triggers.marks:
+                    session.emit(triggers.take_marks(), formatter)
+        except TypeError:
+            # pyserial on POSIX reads from fd None once stop closed the port, a bug otherwise
+            if ser.is_open and not session.stopping.is_set():
+                raise
+            break
+        except serial.SerialException as e:
+            if not ser.is_open or session.stopping.is_set():
+                break
+            print(f"SerialException: {e}")
+            session.serial_errors += 1
+            session.last_error = str(e)
+            if not session.reconnect:
+                break
+            # Keep what arrived before the device went away, a reset starts a fresh stream
+            now = time.monotonic_ns()
+            session.emit(framer.feed(decoder.decode(b"", final=True), now), formatter)
+            session.emit(framer.flush(), formatter)
+            decoder.reset()
+            if not reconnect_port(session, e, formatter):
+                break
+
+    # Whatever is left of the stream, including an unfinished multi-byte sequence
+    lines = framer.feed(decoder.decode(b"", final=True), time.monotonic_ns()) + framer.flush()
+    session.emit(lines, formatter)
+
+
+def reconnect_port(session, error, formatter=None):
+    """
+    Reopen the port of a session once its device is back, the same log file continues.
+
+    :param session: The PortSession whose port failed.
+    :param error: Why the port failed, written to the disconnect marker.
+    :param formatter: TimestampFormatter of the session, if any.
+    :return: True once the port is open again, False if the session was stopped first.
+    """
+    ser = session.ser
+    lost = time.monotonic_ns()
+    session.emit([(lost, f"--- {session.port} disconnected: {error} ---")], formatter)
+    try:
+        ser.close()
+    except (serial.SerialException, OSError):
+        pass
+
+    watcher = get_port_watcher()
+    # A symlinked port, e.g. /dev/serial/by-id, may live outside the default directories
+    watcher.watch(os.path.dirname(os.path.abspath(session.port)))
+    generation = watcher.generation
+    while not session.stopping.is_set():
+        device = find_port(session.port, session.identity)
+        if device is not None:
+            try:
+                ser.port = device
+                ser.open()
+            except (serial.SerialException, OSError):
+                pass  # The node can show up before it is accessible, retry on the next event
+            else:
+                if session.stopping.is_set():
+                    ser.close()
+                    return False
+                session.reconnects += 1
+                if session.raw_capture:
+                    session.raw_capture.new_session(device)
+                elapsed_ms = (time.monotonic_ns() - lost) / 1e6
+                marker = f"--- reconnected to {device} after {elapsed_ms:.0f} ms ---"
+                session.emit([(time.monotonic_ns(), marker)], formatter)
+                return True
+        generation = watcher.wait(generation, RECONNECT_RETRY_INTERVAL)
+    return False
+
+
+def flush_gui_queue():
+    # Coalesce everything the readers queued since the last frame into one insert per view
+    frames = {}
+    try:
+        while True:
+            view, text, log_span, styles = gui_queue.get_nowait()
+            frame = frames.get(view)
+            if frame is None:
+                # Chunks, marks, styles, lines, log offset the frame's text continues at
+                frames[view] = frame = [[], [], [], 0, None]
+            # A mark wherever the text stops continuing the log: after dropped chunks,
+            # and around text that is not logged
+            if log_span is None:
+                if frame[4] is not None or not frame[1]:
+                    frame[1].append((frame[3], None))
+                frame[4] = None
+            else:
+                if log_span[0] != frame[4]:
+                    frame[1].append((frame[3], log_span[0]))
+                frame[4] = log_span[1]
+            if styles:
+                # Style runs count lines from their chunk, the insert counts from the frame
+                first = frame[3]
+                frame[2].extend(
+                    (first + index, start, end, style) for index, start, end, style in styles
+                )
+            frame[0].append(text)
+            frame[3] += text.count("\n")
+    except queue.Empty:
+        pass
+
+    for view in output_views.values():
+        dropped = view.dropped_chunks - view.dropped_shown
+        if dropped:
+            view.dropped_shown += dropped
+            frame = frames.setdefault(view, [[], [], [], 0, None])
+            if frame[4] is not None or not frame[1]:
+                frame[1].append((frame[3], None))
+            frame[0].append(f"[{dropped} chunks not displayed, see log file]\n")
+
+    for view, (chunks, marks, styles, *_) in frames.items():
+        view.append(chunks, marks, styles)
+
+
+class MetricsCollector:
+    """
+    Turn the counters of the sessions into one sample per port.
+
+    The reader threads only increment plain attributes, rates and averages are
+    computed here from the difference to the previous collect, so each consumer
+    (status bar, metrics file, console) keeps its own collector. The state is kept per
+    session object, a port that is started again begins from zero, and the state of a
+    session goes away with it.
+    """
+
+    def __init__(self):
+        # PortSession -> (monotonic time, bytes, lines, chunks, process ns)
+        self._last = weakref.WeakKeyDictionary()
+        # PortSession -> process_times at the last collect
+        self._last_process_times = weakref.WeakKeyDictionary()
+        # PortSession -> {stage name: busy ns at the last collect}
+        self._last_stage_busy = weakref.WeakKeyDictionary()
+
+    def collect(self, sessions):
+        """
+        :param sessions: PortSession objects to sample.
+        :return: One dict per session, see the keys below.
+        """
+        now = time.monotonic()
+        samples = []
+        for session in sessions:
+            counters = (
+                now,
+                session.bytes_read,
+                session.lines_read,
+                session.chunks_read,
+                session.process_ns,
+            )
+            last = self._last.get(session) or (session.start_time, 0, 0, 0, 0)
+            self._last[session] = counters
+            elapsed = max(now - last[0], 1e-9)
+            chunks = counters[3] - last[3]
+            # The slowest read since the last collect, to the next power of two microseconds
+            process_times = list(session.process_times)
+            last_times = self._last_process_times.get(session) or [0] * len(process_times)
+            self._last_process_times[session] = process_times
+            slowest = max(
+                (
+                    b
+                    for b, (n, m) in enumerate(zip(process_times, last_times, strict=True))
+                    if n != m
+                ),
+                default=-1,
+            )
+            log = session.log_writer.stats()
+            view = session.view
+            transmitter = session.transmitter
+            share = session.share
+            stages = []
+            last_busy = self._last_stage_busy.setdefault(session, {})
+            for stage in session.pipeline.stages if session.pipeline else []:
+                busy = stage.busy_ns - last_busy.get(stage.name, 0)
+                last_busy[stage.name] = stage.busy_ns
+                stages.append(
+                    {
+                        "name": stage.name,
+                        "mode": stage.mode,
+                        "lines_total": stage.lines_in,
+                        "busy_s_total": stage.busy_ns / 1e9,
+                        "busy_percent": busy / 1e9 / elapsed * 100,
+                        "max_ms": stage.max_ns / 1e6,
+                        "queued_batches": session.pipeline.queued(stage),
+                        "dropped_lines": stage.dropped_lines,
+                    }
+                )
+            samples.append(
+                {
+                    "time": time.time(),
+                    "port": session.port,
+                    "bytes_total": counters[1],
+                    "lines_total": counters[2],
+                    "bytes_per_s": (counters[1] - last[1]) / elapsed,
+                    "lines_per_s": (counters[2] - last[2]) / elapsed,
+                    "chunk_sizes": list(session.chunk_sizes),
+                    "process_avg_us": (counters[4] - last[4]) / chunks / 1000 if chunks else 0,
+                    "process_max_us": 2**slowest if slowest >= 0 else 0,
+                    "gui_queue_depth": gui_queue.qsize(),
+                    "gui_dropped_chunks": view.dropped_chunks if view else 0,
+                    "log_queued_bytes": log["queued_bytes"],
+                    "log_dropped_bytes": log["dropped_bytes"],
+                    "log_max_write_ms": log["max_write_latency"] * 1000,
+                    "decode_errors": session.decode_errors.count,
+                    "serial_errors": session.serial_errors,
+                    "reconnects": session.reconnects,
+                    "last_error": session.last_error,
+                    "bytes_sent": transmitter.bytes_sent if transmitter else 0,
+                    "trigger_fires": session.triggers.fires if session.triggers else 0,
+                    "trigger_latency_max_us": (
+                        session.triggers.latency_max_ns / 1000 if session.triggers else 0
+                    ),
+                    "share_clients": len(share.clients) if share else 0,
+                    "share_dropped_bytes": share.dropped_bytes if share else 0,
+                    "stages": stages,
+                    "tx_job": transmitter.job if transmitter else None,
+                    "tx_progress": (
+                        transmitter.job_sent / transmitter.job_total
+                        if transmitter and transmitter.job_total
+                        else 0
+                    ),
+                }
+            )
+        return samples
+
+
+def format_metrics(samples, metrics_format):
+    """
+    Render samples of MetricsCollector.
+
+    :param metrics_format: "prometheus" for the text exposition format (e.g. for the
+                           node exporter textfile collector) or "jsonl", one JSON object
+                           per sample and line.
+    :return: The text to write.
+    """
+    if metrics_format == "jsonl":
+        return "".join(json.dumps(sample) + "\n" for sample in samples)
+
+    counters = [
+        "bytes_total",
+        "lines_total",
+        "decode_errors",
+        "serial_errors",
+        "reconnects",
+        "bytes_sent",
+        "trigger_fires",
+        "share_dropped_bytes",
+    ]
+    gauges = [
+        "bytes_per_s",
+        "lines_per_s",
+        "process_avg_us",
+        "process_max_us",
+        "gui_queue_depth",
+        "gui_dropped_chunks",
+        "log_queued_bytes",
+        "log_dropped_bytes",
+        "log_max_write_ms",
+        "share_clients",
+    ]
+    lines = []
+    for names, kind in ((counters, "counter"), (gauges, "gauge")):
+        for name in names:
+            lines.append(f"# TYPE terminaloutgui_{name} {kind}")
+            for sample in samples:
+                port = sample["port"].replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'terminaloutgui_{name}{{port="{port}"}} {sample[name]}')
+
+    # Read sizes as a cumulative histogram, bucket i holds chunks of 2**(i-1) to 2**i - 1 bytes
+    lines.append("# TYPE terminaloutgui_read_chunk_bytes histogram")
+    for sample in samples:
+        port = sample["port"].replace("\\", "\\\\").replace('"', '\\"')
+        total = 0
+        for bucket, count in enumerate(sample["chunk_sizes"]):
+            total += count
+            # The last bucket also holds every larger read
+            le = 2**bucket - 1 if bucket < CHUNK_SIZE_BUCKETS - 1 else "+Inf"
+            lines.append(
+                f'terminaloutgui_read_chunk_bytes_bucket{{port="{port}",le="{le}"}} {total}'
+            )
+        lines.append(
+            f'terminaloutgui_read_chunk_bytes_sum{{port="{port}"}} {sample["bytes_total"]}'
+        )
+        lines.append(f'terminaloutgui_read_chunk_bytes_count{{port="{port}"}} {total}')
+
+    # One series per processing stage
+    for name, kind in (
+        ("lines_total", "counter"),
+        ("busy_s_total", "counter"),
+        ("dropped_lines", "counter"),
+        ("queued_batches", "gauge"),
+    ):
+        lines.append(f"# TYPE terminaloutgui_stage_{name} {kind}")
+        for sample in samples:
+            port = sample["port"].replace("\\", "\\\\").replace('"', '\\"')
+            for stage in sample["stages"]:
+                stage_name = stage["name"].replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(
+                    f'terminaloutgui_stage_{name}{{port="{port}",stage="{stage_name}"}} '
+                    f"{stage[name]}"
+                )
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path, samples, metrics_format):
+    # JSON lines accumulate, the Prometheus file is replaced so scrapers never see half of it
+    text = format_metrics(samples, metrics_format)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    if metrics_format == "jsonl":
+        with open(path, "a", encoding="utf-8") as file:
+            file.write(text)
+    else:
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(path + ".tmp", path)
+
+
+def format_status(sample):
+    """One line summary of a sample for the status bar and the console."""
+    text = (
+        f"{sample['port']}: {sample['bytes_per_s'] / 1024:.1f} KiB/s, "
+        f"{sample['lines_per_s']:.0f} lines/s, "
+        f"read {sample['process_avg_us']:.0f}/{sample['process_max_us']:.0f} us avg/max, "
+        f"queue {sample['gui_queue_depth']}, log backlog {sample['log_queued_bytes']} B"
+    )
+    lost = sample["gui_dropped_chunks"] + sample["log_dropped_bytes"]
+    if lost:
+        text += f", dropped {sample['gui_dropped_chunks']} chunks/{sample['log_dropped_bytes']} B"
+    if sample["decode_errors"]:
+        text += f", {sample['decode_errors']} undecodable B"
+    if sample["serial_errors"]:
+        text += f", {sample['serial_errors']} errors ({sample['last_error']})"
+    if sample["trigger_fires"]:
+        text += f", {sample['trigger_fires']} triggers"
+    busiest = max(sample["stages"], key=lambda stage: stage["busy_percent"], default=None)
+    if busiest and busiest["busy_percent"] >= 1:
+        text += f", stage {busiest['name']} {busiest['busy_percent']:.0f}% busy"
+    if sample["share_clients"]:
+        text += f", {sample['share_clients']} share clients"
+    if sample["tx_job"]:
+        text += f", sending {os.path.basename(sample['tx_job'])} {sample['tx_progress']:.0%}"
+    return text
+
+
+def get_log_flush_ms():
+    try:
+        return max(1, int(log_flush_var.get()))
+    except ValueError:
+        return DEFAULT_LOG_FLUSH_MS
+
+
+def get_log_rotation():
+    """LogWriter arguments for rotation, compression and retention from the settings."""
+    try:
+        return {
+            "rotate_bytes": int(float(log_rotate_mb_var.get()) * 1024 * 1024),
+            "rotate_interval_s": int(float(log_rotate_minutes_var.get()) * 60),
+            "compression": log_compression_var.get(),
+            "keep_files": int(log_keep_files_var.get()),
+            "keep_bytes": int(float(log_keep_mb_var.get()) * 1024 * 1024),
+        }
+    except ValueError:
+        return {}
+
+
+def get_scrollback_limit():
+    try:
+        return max(0, int(scrollback_var.get()))
+    except ValueError:
+        return DEFAULT_SCROLLBACK_LINES
+
+
+def read_history_page(log_reader, end_offset, max_lines):
+    """
+    Read the whole lines of a log that precede an offset.
+
+    :param log_reader: LogReader of the log.
+    :param end_offset: Stream offset the page has to end at.
+    :param max_lines: Maximum number of lines to return.
+    :return: (start offset of the page, decoded text).
+    """
+    start = end_offset
+    data = b""
+    while start > 0 and data.count(b"\n") <= max_lines:
+        step = min(HISTORY_READ_BLOCK, start)
+        block = log_reader.read(start - step, step)
+        if len(block) < step:
+            break  # Older data was deleted or belongs to no file of this session
+        start -= step
+        data = block + data
+
+    # Walk back max_lines line ends from the end of the page, the first line is
+    # partial unless the start of the file was reached
+    pos = len(data) - 1
+    for _ in range(max_lines):
+        pos = data.rfind(b"\n", 0, pos)
+        if pos < 0:
+            break
+    cut = pos + 1 if pos >= 0 else 0
+    text = data[cut:].decode("utf-8", "replace").replace("\r\n", "\n")
+    if text and not text.endswith("\n"):
+        text += "\n"
+    return start + cut, text
+
+
+def load_highlight_rules(config):
+    """
+    Read the highlight rules from the settings.
+
+    Every [Highlight:<name>] section is one rule with the keys enabled, pattern (a
+    regex, write % as %%), ignore_case, foreground, background (Tk colour names or
+    #rrggbb, empty to keep the default) and bold. Rules keep their order in the file.
+
+    :param config: A ConfigParser, see load_configs.
+    :return: List of (name, pattern, ignore case, foreground, background, bold).
+    """
+    rules = []
+    for section in config.sections():
+        if not section.startswith(HIGHLIGHT_SECTION_PREFIX):
+            continue
+        rule = config[section]
+        if not rule.getboolean("enabled", fallback=True) or not rule.get("pattern"):
+            continue
+        rules.append(
+            (
+                section[len(HIGHLIGHT_SECTION_PREFIX) :],
+                rule.get("pattern"),
+                rule.getboolean("ignore_case", fallback=False),
+                rule.get("foreground", ""),
+                rule.get("background", ""),
+                rule.getboolean("bold", fallback=False),
+            )
+        )
+    return rules
+
+
+class Highlighter:
+    """
+    Colour whole output lines by rules, see load_highlight_rules.
+
+    The rules are compiled once into a single regex by join_rule_patterns, so a line is
+    scanned once however many rules there are; rules that cannot be joined scan the
+    text on their own. The alternation adds no capturing groups, which lets the regex
+    engine skip ahead to possible first characters; which rule matched is only worked
+    out for lines that matched at all. Only text that is being inserted is
+    matched, and Tk drops the tags together with evicted lines, so the cost per line
+    does not depend on the size of the session. When several rules match a line, the
+    one matching first in the line wins, then the one listed first.
+    """
+
+    def __init__(self, rules):
+        self.rules = []  # (tag name, foreground, background, bold)
+        matchers = []  # (tag name, compiled rule) in rule order
+        for name, pattern, ignore_case, foreground, background, bold in rules:
+            flags = "?i:" if ignore_case else "?:"
+            try:
+                regex = re.compile(f"({flags}{pattern})")
+            except re.error as e:
+                print(f"Highlight rule {name}: {e}")
+                continue
+            tag = f"highlight_{len(self.rules)}"
+            self.rules.append((tag, foreground, background, bold))
+            matchers.append((tag, regex))
+        self.regex, joined = join_rule_patterns([regex for _, regex in matchers])
+        self._matchers = [matchers[i] for i in joined]
+        self._alone = [m for i, m in enumerate(matchers) if i not in joined]
+        self._order = {tag: i for i, (tag, _) in enumerate(matchers)}
+
+    def configure(self, text_widget):
+        from tkinter import font as tkfont
+
+        bold_font = tkfont.Font(font=text_widget.cget("font"))
+        bold_font.configure(weight="bold")
+        for tag, foreground, background, bold in self.rules:
+            options = {
+                "foreground": foreground,
+                "background": background,
+                "font": bold_font if bold else None,
+            }
+            text_widget.tag_configure(
+                tag, **{key: value for key, value in options.items() if value}
+            )
+        # The search marks stay visible on highlighted lines
+        text_widget.tag_raise("search_match")
+        text_widget.tag_raise("search_current")
+        text_widget.bold_font = bold_font  # Keep a reference, like the window icon
+
+    def match_lines(self, text, first_line=1):
+        """
+        Find the lines of a text that a rule matches.
+
+        :param text: Whole lines as they are inserted.
+        :param first_line: Widget line number of the first line of text.
+        :return: Dict of tag name -> list of line numbers.
+        """
+        lines = {}
+        best = {}  # Line -> ((position, rule order), tag name), with rules searched alone
+        scans = [(self.regex, None)] if self.regex else []
+        scans += [(regex, tag) for tag, regex in self._alone]
+        for regex, rule_tag in scans:
+            for line, start in self._scan(text, first_line, regex):
+                tag = rule_tag
+                if tag is None:
+                    # The alternation took the first rule that matches here
+                    tag = next(
+                        (tag for tag, rule in self._matchers if rule.match(text, start)),
+                        self._matchers[0][0],
+                    )
+                if not self._alone:
+                    lines.setdefault(tag, []).append(line)
+                    continue
+                key = (start, self._order[tag])
+                if line not in best or key < best[line][0]:
+                    best[line] = (key, tag)
+        for line in sorted(best):
+            lines.setdefault(best[line][1], []).append(line)
+        return lines
+
+    @staticmethod
+    def _scan(text, first_line, regex):
+        """:return: Generator of (line number, position) of the first match in each line."""
+        search = regex.search
+        line = first_line
+        pos = 0  # Always the start of a line
+        while True:
+            match = search(text, pos)
+            if match is None:
+                break
+            start = match.start()
+            line += text.count("\n", pos, start)
+            yield line, start
+            # One rule per line, continue with the next line
+            pos = text.find("\n", start) + 1
+            if pos == 0:
+                break
+            line += 1
+
+    def apply(self, text_widget, text, first_line):
+        # One tag_add call per rule for the whole batch
+        for tag, line_numbers in self.match_lines(text, first_line).items():
+            indices = []
+            for line in line_numbers:
+                indices += (f"{line}.0", f"{line + 1}.0")
+            text_widget.tag_add(tag, *indices)
+
+
+class VirtualTextView:
+    """
+    A Text widget showing a window of numbered rows, only the rows on screen are in it.
+
+    Rows are rendered again when the view scrolls or the content changes, so scrolling
+    costs the same however many rows there are. The scrollbar works on row numbers
+    instead of the widget contents. Subclasses provide row_range, content_state and
+    render_rows.
+    """
+
+    def __init__(self, parent):
+        from tkinter import font as tkfont
+
+        self.first_row = 0
+        self.follow = False  # Keep the last rows in view as rows are added
+        self.visible_rows = 15
+        self.rendered = None  # What is on screen, see refresh
+
+        self.frame = ttk.Frame(parent)
+        self.text = tk.Text(self.frame, height=15, width=50, wrap="none")
+        self.text.grid(row=0, column=0, sticky="nsew")
+        self.y_scroll = tk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scroll)
+        self.y_scroll.grid(row=0, column=1, sticky="ns")
+        self.frame.grid_rowconfigure(0, weight=1)
+        self.frame.grid_columnconfigure(0, weight=1)
+        self.line_height = tkfont.Font(font=self.text.cget("font")).metrics("linespace")
+
+        self.text.bind("<Configure>", self.on_configure)
+        self.text.bind("<MouseWheel>", lambda e: self.scroll_rows(-e.delta // 120 * WHEEL_ROWS))
+        self.text.bind("<Button-4>", lambda e: self.scroll_rows(-WHEEL_ROWS))
+        self.text.bind("<Button-5>", lambda e: self.scroll_rows(WHEEL_ROWS))
+        self.text.bind("<Prior>", lambda e: self.scroll_rows(-self.visible_rows))
+        self.text.bind("<Next>", lambda e: self.scroll_rows(self.visible_rows))
+        self.text.bind("<Home>", lambda e: self.scroll_rows(-sys.maxsize))
+        self.text.bind("<End>", lambda e: self.scroll_rows(sys.maxsize))
+
+    def row_range(self):
+        """:return: (first row, end row) of the rows that can be shown."""
+        return 0, 0
+
+    def content_state(self):
+        """Anything that changes when rendered rows would change, besides the position."""
+        return None
+
+    def render_rows(self, first_row, count):
+        """:return: The text of count rows from first_row on."""
+        return ""
+
+    def on_configure(self, event):
+        self.visible_rows = max(1, event.height // self.line_height)
+        self.refresh()
+
+    def on_scroll(self, *args):
+        first, end = self.row_range()
+        if args[0] == "moveto":
+            self.first_row = first + int(float(args[1]) * (end - first))
+            self.scroll_rows(0)
+        elif args[0] == "scroll":
+            self.scroll_rows(int(args[1]) * (self.visible_rows if args[2] == "pages" else 1))
+
+    def scroll_rows(self, rows):
+        first, end = self.row_range()
+        last_first = max(first, end - self.visible_rows)
+        self.first_row = max(first, min(last_first, self.first_row + rows))
+        self.follow = self.first_row >= last_first
+        self.refresh()
+        return "break"
+
+    def show_row(self, row):
+        # Scroll a row to the middle of the view
+        self.first_row = row - self.visible_rows // 2
+        self.follow = False
+        self.scroll_rows(0)
+
+    def refresh(self):
+        # Called once per frame while shown, only redraws if something changed
+        first, end = self.row_range()
+        last_first = max(first, end - self.visible_rows)
+        self.first_row = last_first if self.follow else max(first, min(last_first, self.first_row))
+        state = (self.content_state(), self.first_row, self.visible_rows)
+        if state == self.rendered:
+            return
+        self.rendered = state
+        text = self.render_rows(self.first_row, min(self.visible_rows, end - self.first_row))
+        self.text.configure(state=tk.NORMAL)
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", text)
+        self.text.configure(state=tk.DISABLED)
+        count = max(1, end - first)
+        self.y_scroll.set(
+            (self.first_row - first) / count,
+            min(1.0, (self.first_row - first + self.visible_rows) / count),
+        )
+
+
+class HexView(VirtualTextView):
+    """Offset, hex and ASCII columns of the raw bytes of a port, read from its ByteRing."""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.ring = None
+        self.markers = False  # Start a row with each read and show its time
+        self.follow = True  # Keep the newest bytes in view
+        self.formatter = TimestampFormatter()
+
+    def set_ring(self, ring, markers):
+        self.ring = ring
+        self.markers = markers
+        self.follow = True
+        self.refresh()
+
+    def row_range(self):
+        return self.ring.row_range(self.markers) if self.ring else (0, 0)
+
+    def content_state(self):
+        return self.ring.total if self.ring else 0, self.markers
+
+    def render_rows(self, first_row, count):
+        if self.ring is None:
+            return ""
+        lines = []
+        for offset, data, arrival in self.ring.get_rows(first_row, count, self.markers):
+            line = f"{offset:08X}  "
+            if self.markers:
+                line += f"{self.formatter.format(arrival)[11:] if arrival else '':15}  "
+            line += f"{data.hex(' '):{HEX_ROW_BYTES * 3 - 1}}  "
+            lines.append(line + data.translate(HEX_ASCII_TABLE).decode("ascii"))
+        return "\n".join(lines)
+
+
+class LogView(VirtualTextView):
+    """The lines of a MappedLog, the current search match is marked."""
+
+    def __init__(self, parent, log):
+        super().__init__(parent)
+        self.log = log
+        self.match = None  # (line, start column, end column)
+        self.text.tag_configure("search_current", background=SEARCH_CURRENT_COLOR)
+
+    def row_range(self):
+        return 0, self.log.indexed_lines
+
+    def content_state(self):
+        return self.log.indexed_lines, self.match
+
+    def render_rows(self, first_row, count):
+        return "\n".join(self.log.read_lines(first_row, count))
+
+    def refresh(self):
+        rendered = self.rendered
+        super().refresh()
+        if self.rendered != rendered and self.match:
+            line, start, end = self.match
+            row = line - self.first_row + 1
+            self.text.tag_add("search_current", f"{row}.{start}", f"{row}.{end}")
+
+
+class LogViewer:
+    """
+    A window showing a past log, opened with File > Open Log.
+
+    The file is mapped, see MappedLog, the window is up before the index is built.
+    Go to takes a line number or the start of a timestamp (a time alone is taken on
+    the day of the first stamped line). Find searches on a background thread from the
+    current match or the top of the view.
+    """
+
+    def __init__(self, path):
+        self.log = MappedLog(path)
+        self.search_thread = None
+        self.search_result = None
+
+        self.window = tk.Toplevel(root)
+        self.window.title(f"{os.path.basename(path)} - {APP_NAME}")
+        self.window.geometry("900x600")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.window.grid_rowconfigure(1, weight=1)
+        self.window.grid_columnconfigure(0, weight=1)
+
+        toolbar = ttk.Frame(self.window)
+        toolbar.grid(row=0, column=0, padx=5, pady=5, sticky="ew")
+        ttk.Label(toolbar, text="Go to Line / Time:").pack(side=tk.LEFT)
+        self.goto_var = tk.StringVar()
+        goto_entry = ttk.Entry(toolbar, textvariable=self.goto_var, width=22)
+        goto_entry.pack(side=tk.LEFT, padx=5)
+        goto_entry.bind("<Return>", self.go_to)
+        ttk.Label(toolbar, text="Find:").pack(side=tk.LEFT, padx=(10, 0))
+        self.find_var = tk.StringVar()
+        self.regex_var = tk.BooleanVar(value=False)
+        self.case_var = tk.BooleanVar(value=False)
+        find_entry = ttk.Entry(toolbar, textvariable=self.find_var, width=30)
+        find_entry.pack(side=tk.LEFT, padx=5)
+        find_entry.bind("<Return>", lambda e: self.find())
+        find_entry.bind("<Shift-Return>", lambda e: self.find(backwards=True))
+        ttk.Checkbutton(toolbar, text="Regex", variable=self.regex_var).pack(side=tk.LEFT)
+        ttk.Checkbutton(toolbar, text="Match Case", variable=self.case_var).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="Prev", command=lambda: self.find(backwards=True)).pack(
+            side=tk.LEFT, padx=2
+        )
+        ttk.Button(toolbar, text="Next", command=self.find).pack(side=tk.LEFT, padx=2)
+        self.status_var = tk.StringVar()
+        ttk.Label(toolbar, textvariable=self.status_var).pack(side=tk.LEFT, padx=5)
+        self.window.bind("<Control-f>", lambda e: find_entry.focus_set())
+        self.window.bind("<Control-g>", lambda e: goto_entry.focus_set())
+
+        self.view = LogView(self.window, self.log)
+        self.view.frame.grid(row=1, column=0, sticky="nsew")
+        self.view.text.focus_set()
+        self.poll()
+
+    def close(self):
+        self.log.cancelled = True
+        if self.search_thread:
+            self.search_thread.join()
+        self.log.close()
+        self.window.destroy()
+
+    def poll(self):
+        if not self.window.winfo_exists():
+            return
+        self.view.refresh()
+        status = f"{self.log.indexed_lines} lines"
+        if self.log.line_count is None:
+            status += f", indexing {self.log.progress:.0%}"
+        if self.search_thread:
+            if self.search_thread.is_alive():
+                status += ", searching..."
+            else:
+                self.search_thread = None
+                self.show_match(self.search_result)
+        if self.view.match is None and self.search_result == ():
+            status += ", not found"
+        self.status_var.set(status)
+        self.window.after(LOG_VIEW_POLL_MS, self.poll)
+
+    def go_to(self, event=None):
+        text = self.goto_var.get().strip()
+        if text.isdigit():
+            line = int(text) - 1
+        else:
+            target = text.encode()
+            first = self.log.first_stamp()
+            if first and re.fullmatch(rb"\d\d:[\d:.]*", target):
+                target = first[:11] + target  # The date of the first line
+            line = self.log.offset_line(self.log.find_time(target))
+            if line is None:
+                self.status_var.set("Still indexing, try again in a moment")
+                return
+        self.search_result = None
+        self.view.match = None
+        self.view.show_row(line)
+
+    def find(self, backwards=False):
+        pattern = self.find_var.get()
+        if not pattern or self.search_thread:
+            return
+        if not self.regex_var.get():
+            pattern = re.escape(pattern)
+        try:
+            regex = re.compile(pattern.encode(), 0 if self.case_var.get() else re.IGNORECASE)
+        except re.error as e:
+            self.status_var.set(f"Invalid pattern: {e}")
+            return
+        # Continue from the current match, or from the top of the view
+        if self.view.match:
+            offset = self.log.line_offset(self.view.match[0])
+            if not backwards:
+                offset = self.log.next_line_start(offset)
+        else:
+            offset = self.log.line_offset(self.view.first_row) or 0
+
+        def run():
+            self.search_result = self.log.find(regex, offset, backwards) or ()
+
+        self.search_result = None
+        self.search_thread = threading.Thread(target=run, name="Log find", daemon=True)
+        self.search_thread.start()
+
+    def show_match(self, span):
+        if not span:
+            self.view.match = None
+            self.view.refresh()
+            return
+        line = self.log.offset_line(span[0])
+        if line is None:
+            self.status_var.set("Still indexing, try again in a moment")
+            return
+        start = self.log.line_start(span[0])
+        # Columns count characters, not bytes
+        column = len(self.log.map[start : span[0]].decode("utf-8", "replace"))
+        length = len(self.log.map[span[0] : span[1]].decode("utf-8", "replace"))
+        self.view.match = (line, column, column + length)
+        self.view.show_row(line)
+
+
+def open_log():
+    from tkinter import filedialog
+
+    directory = os.path.dirname(save_path_var.get().replace("\\", os.sep))
+    path = filedialog.askopenfilename(
+        title="Open Log",
+        initialdir=directory if os.path.isdir(directory) else ".",
+        filetypes=[("Log files", "*.txt *.log"), ("All files", "*.*")],
+    )
+    if not path:
+        return
+    if path.endswith(tuple(ext for ext in LOG_COMPRESSION_DICT.values() if ext)):
+        messagebox.showerror("Error", "Compressed logs cannot be opened, decompress them first.")
+        return
+    try:
+        LogViewer(path)
+    except (OSError, ValueError) as e:
+        messagebox.showerror("Error", f"Failed to open log: {str(e)}")
+
+
+class PlotView:
+    """
+    Strip chart of the series of a PlotData, one lane per plot rule, drawn on a Canvas.
+
+    Each series is one line item through the min and max of every pixel column, see
+    SeriesRing.decimate, so a redraw costs the panel width times the series.
+    """
+
+    def __init__(self, parent):
+        self.plot_data = None
+        self.window = DEFAULT_PLOT_WINDOW_S
+        self.canvas = tk.Canvas(parent, width=PLOT_WIDTH, background="white", highlightthickness=0)
+        self.last_draw = 0
+
+    def refresh(self, force=False):
+        # Called once per frame while shown, the time axis moves even without new samples
+        now = time.monotonic()
+        if not force and now - self.last_draw < PLOT_REFRESH_MS / 1000:
+            return
+        self.last_draw = now
+        canvas = self.canvas
+        canvas.delete("all")
+        if self.plot_data is None or not self.plot_data.rules:
+            canvas.create_text(10, 10, anchor="nw", text="No plot rules in settings.ini")
+            return
+        width = max(1, canvas.winfo_width())
+        lane_height = max(1, canvas.winfo_height()) / len(self.plot_data.rules)
+        margin = 14  # Room for the labels of a lane
+        for lane, ((name, _), series) in enumerate(
+            zip(self.plot_data.rules, self.plot_data.series, strict=True)
+        ):
+            top = lane * lane_height
+            with self.plot_data.lock:
+                columns = [
+                    (group, ring.last, ring.decimate(now - self.window, now, width))
+                    for group, ring in series
+                ]
+            values = [
+                v for group, last, (lows, highs) in columns for v in lows + highs if v is not None
+            ]
+            low, high = (min(values), max(values)) if values else (0.0, 1.0)
+            if high - low < 1e-12:
+                low, high = low - 0.5, high + 0.5
+            scale = (lane_height - 2 * margin) / (high - low)
+            bottom = top + lane_height - margin
+
+            canvas.create_line(0, top, width, top, fill="#cccccc")
+            canvas.create_text(2, bottom, anchor="sw", text=f"{low:.6g}", fill="#808080")
+            canvas.create_text(2, top + margin, anchor="nw", text=f"{high:.6g}", fill="#808080")
+            legend = name
+            for i, (group, last, (lows, highs)) in enumerate(columns):
+                color = PLOT_COLORS_LIST[i % len(PLOT_COLORS_LIST)]
+                # Down to the min and up to the max of each column in turn
+                points = []
+                for x, (minimum, maximum) in enumerate(zip(lows, highs, strict=True)):
+                    if minimum is not None:
+                        points += (
+                            x,
+                            bottom - (maximum - low) * scale,
+                            x,
+                            bottom - (minimum - low) * scale,
+                        )
+                if len(points) >= 4:
+                    canvas.create_line(*points, fill=color)
+                if last is not None:
+                    canvas.create_text(
+                        width - 2,
+                        top + 2 + 12 * i,
+                        anchor="ne",
+                        text=f"{group}={last:.6g}",
+                        fill=color,
+                    )
+            canvas.create_text(2, top + 2, anchor="nw", text=legend)
+
+
+class OutputView:
+    """
+    One tab of the output notebook.
+
+    A Text widget whose scrollback is bounded, lines evicted from its head are paged
+    back in from the session log when the view is scrolled to the top.
+    """
+
+    def __init__(self, notebook, title):
+        self.title = title
+        self.log_path = None
+        self.log_writer = None  # Log of the latest session, its line index backs the search
+
+        self.frame = ttk.Frame(notebook)
+        self.text = tk.Text(self.frame, height=15, width=50, wrap="none")
+        self.text.grid(row=0, column=0, sticky="nsew")
+        self.text.bind("<Button-3>", show_right_click_menu)
+
+        # Set scrollbars
+        x_scroll = tk.Scrollbar(self.frame, orient=tk.HORIZONTAL, command=self.text.xview)
+        self.y_scroll = tk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.text.yview)
+        self.text.configure(xscrollcommand=x_scroll.set, yscrollcommand=self.on_yscroll)
+        x_scroll.grid(row=1, column=0, sticky="ew")
+        self.y_scroll.grid(row=0, column=1, sticky="ns")
+        self.frame.grid_rowconfigure(0, weight=1)
+        self.frame.grid_columnconfigure(0, weight=1)
+        notebook.add(self.frame, text=title)
+
+        self.text.tag_configure("search_match", background=SEARCH_MATCH_COLOR)
+        self.text.tag_configure("search_current", background=SEARCH_CURRENT_COLOR)
+        if highlighter:
+            highlighter.configure(self.text)
+        # One tag per ANSI style, the basic foreground colours are set up front
+        self.ansi_tags = {}
+        for color in ANSI_COLORS_LIST:
+            self.ansi_tag((color, None, False, False))
+        self.history_ansi = False  # The log keeps escape sequences, parse them when paging in
+
+        # Search state, GUI thread only
+        self.search = None
+        self.search_query = None  # (pattern, regex, ignore case) of the running search
+        self.search_line = -1  # Log line of the match last jumped to
+        self.highlight_pending = False
+        self.filter_text = None  # Shows only the matching lines while filtering
+        self.filter_count = 0  # Matches already in filter_text
+        self.byte_ring = None  # Raw bytes of the latest session, see HexView
+        self.hex_view = None  # Shown over the text while the hex view is on
+        self.plot_data = None  # Series of the latest session
+        self.plot_view = None  # Shown right of the text while the plot is on
+
+        self.dropped_chunks = 0  # Only written by the reader thread
+        self.dropped_shown = 0  # Only written by the GUI thread
+
+        # Scrollback state, GUI thread only
+        self.base_line = 0  # Lines removed from the head of the widget so far
+        # (absolute line, log stream offset) where inserted text starts or stops continuing
+        # the log, the offset is None for text that is not in the log
+        self.marks = collections.deque()
+        self.history_reader = None  # LogReader of the current session's log
+        self.history_offset = 0  # Log stream offset of the first line still in the widget
+        self.history_pending = False
+
+    def rename(self, title):
+        self.title = title
+        self.frame.master.tab(self.frame, text=title)
+
+    def insert_message(self, text):
+        self.add_marks(self.text.index("end-1c"), [(0, None)])
+        self.text.insert(tk.END, text)
+        self.text.see(tk.END)
+
+    def add_marks(self, insert_index, marks):
+        """
+        :param insert_index: Widget index the text is inserted at.
+        :param marks: List of (line within the text, log stream offset or None).
+        """
+        line = int(insert_index.split(".")[0])
+        for index, offset in marks:
+            if index == 0 and not insert_index.endswith(".0"):
+                offset = None  # The line starts with text inserted before
+            if self.marks and self.marks[-1][0] == self.base_line + line + index:
+                self.marks.pop()  # Nothing was inserted after that mark
+            self.marks.append((self.base_line + line + index, offset))
+
+    def ansi_tag(self, style):
+        tag = self.ansi_tags.get(style)
+        if tag is None:
+            from tkinter import font as tkfont
+
+            foreground, background, bold, underline = style
+            tag = f"ansi_{len(self.ansi_tags)}"
+            options = {"foreground": foreground, "background": background}
+            if bold:
+                if not hasattr(self.text, "bold_font"):
+                    self.text.bold_font = tkfont.Font(font=self.text.cget("font"))
+                    self.text.bold_font.configure(weight="bold")
+                options["font"] = self.text.bold_font
+            if underline:
+                options["underline"] = True
+            self.text.tag_configure(tag, **{key: value for key, value in options.items() if value})
+            # Below the highlight rules and the search marks
+            self.text.tag_lower(tag)
+            self.ansi_tags[style] = tag
+        return tag
+
+    def apply_styles(self, styles, first_line):
+        # One tag_add call per style for the whole batch
+        ranges = {}
+        for index, start, end, style in styles:
+            line = first_line + index
+            ranges.setdefault(self.ansi_tag(style), []).extend((f"{line}.{start}", f"{line}.{end}"))
+        for tag, indices in ranges.items():
+            self.text.tag_add(tag, *indices)
+
+    def append(self, chunks, marks=(), styles=None):
+        """
+        :param chunks: Text to insert, whole lines.
+        :param marks: See add_marks, where the text starts or stops continuing the log.
+        :param styles: Style runs, see AnsiParser.parse.
+        """
+        # Only follow the output if the user has not scrolled up
+        at_bottom = self.text.yview()[1] >= 1.0
+        insert_index = self.text.index("end-1c")
+        # Remember where the log text starts so eviction can page it back in
+        self.add_marks(insert_index, marks)
+        text = "".join(chunks)
+        self.text.insert(tk.END, text)
+        if styles:
+            self.apply_styles(styles, int(insert_index.split(".")[0]))
+        if highlighter:
+            highlighter.apply(self.text, text, int(insert_index.split(".")[0]))
+        self.evict(at_bottom)
+        if at_bottom:
+            self.text.see(tk.END)
+
+    def evict(self, at_bottom):
+        # Drop old lines from the head of the widget in bulk once the limit is exceeded
+        limit = get_scrollback_limit()
+        if limit == 0:
+            return
+        line_count = int(self.text.index("end-1c").split(".")[0])
+        slack = max(100, limit // 10)
+        # Keep paged-in history while the user is reading it, within reason
+        if line_count <= limit + slack or (not at_bottom and line_count <= limit * 2):
+            return
+
+        # Cut on the newest log mark that keeps at least `limit` lines, its log offset is
+        # exactly where paging back in has to resume
+        target_line = self.base_line + line_count - limit
+        mark = None
+        for abs_line, offset in self.marks:
+            if abs_line > target_line:
+                break
+            if offset is not None:
+                mark = (abs_line, offset)
+        if mark is None:
+            return
+        first_line = mark[0] - self.base_line
+        if first_line <= 1:
+            return
+        while self.marks[0][0] < mark[0]:
+            self.marks.popleft()
+        self.text.delete("1.0", f"{first_line}.0")
+        self.base_line = mark[0] - 1
+        self.history_offset = mark[1]
+
+    def page_in_history(self):
+        # Insert older lines from the session log above the retained window
+        self.history_pending = False
+        if not self.history_reader or self.history_offset <= 0:
+            return
+        try:
+            start, text = read_history_page(
+                self.history_reader, self.history_offset, HISTORY_PAGE_LINES
+            )
+        except OSError as e:
+            print(f"OSError: {e}")
+            return
+        if not text:
+            return
+
+        styles = None
+        if self.history_ansi:
+            # The style in effect before the page is not known, it starts from the default
+            plain, styles = AnsiParser().parse(text.split("\n")[:-1])
+            text = join_lines(plain)
+        line_count = text.count("\n")
+        self.text.insert("1.0", text)
+        if styles:
+            self.apply_styles(styles, 1)
+        if highlighter:
+            highlighter.apply(self.text, text, 1)
+        self.base_line -= line_count
+        self.marks.appendleft((self.base_line + 1, start))
+        self.history_offset = start
+        # Keep the line the user was looking at in place
+        self.text.yview(f"{line_count + 1}.0")
+
+    def on_yscroll(self, first, last):
+        self.y_scroll.set(first, last)
+        if self.search and not self.highlight_pending:
+            self.highlight_pending = True
+            root.after_idle(self.highlight_visible)
+        if float(first) <= 0.0 and self.history_offset > 0 and not self.history_pending:
+            self.history_pending = True
+            root.after_idle(self.page_in_history)
+
+    def reset_scrollback(self, log_writer=None):
+        self.base_line = 0
+        self.marks.clear()
+        if self.history_reader:
+            self.history_reader.close()
+        self.history_reader = log_writer.open_reader() if log_writer else None
+        self.history_offset = 0
+
+    def clear(self):
+        self.text.delete("1.0", "end")
+        self.reset_scrollback(self.log_writer)
+
+    def widget_line(self, log_line):
+        """
+        Map a line of the session log to a line of the widget.
+
+        :param log_line: Line number in the log, counted from the session start.
+        :return: The widget line number, None if the line is not in the widget.
+        """
+        line_index = self.log_writer.line_index
+        reader = self.history_reader
+        start = line_index.line_offset(log_line, reader) if reader else None
+        if start is None:
+            return None
+        # The log continues from a mark up to the next one, the last mark before the
+        # line anchors the mapping
+        last_line = int(self.text.index("end-1c").split(".")[0])
+        end = self.base_line + last_line + 1  # Absolute line after the text of a mark
+        for i in range(len(self.marks) - 1, -1, -1):
+            abs_line, offset = self.marks[i]
+            if offset is None:
+                end = abs_line
+                continue
+            if offset < self.log_writer.start_offset:
+                return None  # Written by an earlier session
+            if offset <= start:
+                mark_line = line_index.line_at(offset, reader)
+                if mark_line is None:
+                    return None
+                line = abs_line + (log_line - mark_line)
+                if not abs_line <= line < end:
+                    return None  # Not displayed, e.g. in dropped chunks
+                line -= self.base_line
+                return line if 1 <= line <= last_line else None
+            end = abs_line
+        return None
+
+    def highlight_visible(self):
+        # Only the lines on screen are tagged, the cost does not grow with the session
+        self.highlight_pending = False
+        self.text.tag_remove("search_match", "1.0", tk.END)
+        if not self.search:
+            return
+        first = int(self.text.index("@0,0").split(".")[0])
+        last = int(self.text.index(f"@0,{self.text.winfo_height()}").split(".")[0])
+        for line in range(first, last + 1):
+            for match in self.search.regex.finditer(self.text.get(f"{line}.0", f"{line}.end")):
+                self.text.tag_add(
+                    "search_match", f"{line}.{match.start()}", f"{line}.{match.end()}"
+                )
+
+    def start_search(self, pattern, use_regex, ignore_case):
+        self.stop_search()
+        if pattern and self.log_writer and self.log_writer.line_index is not None:
+            self.search = LogSearch(
+                self.log_writer, pattern, use_regex, ignore_case, get_scrollback_limit()
+            )
+        self.highlight_visible()
+        if self.filter_text:
+            self.filter_text.delete("1.0", tk.END)
+
+    def stop_search(self):
+        if self.search:
+            self.search.cancel()
+        self.search = None
+        self.search_line = -1
+        self.filter_count = 0
+        self.text.tag_remove("search_current", "1.0", tk.END)
+
+    def jump_to_match(self, backwards=False):
+        """
+        Show the next or previous match after the last one jumped to.
+
+        :return: The log line number of the match, None if there is none.
+        """
+        if not self.search:
+            return None
+        with self.search.lock:
+            matches = self.search.matches
+            if backwards:
+                pos = bisect.bisect_left(matches, self.search_line) - 1
+            else:
+                pos = bisect.bisect_right(matches, self.search_line)
+            if not 0 <= pos < len(matches):
+                return None
+            log_line = matches[pos]
+        self.search_line = log_line
+
+        self.text.tag_remove("search_current", "1.0", tk.END)
+        line = self.widget_line(log_line)
+        if line is not None:
+            self.text.tag_add("search_current", f"{line}.0", f"{line}.end")
+            self.text.see(f"{line}.0")
+        return log_line
+
+    def set_filter(self, enabled):
+        # The filtered lines replace the full output in the same place
+        if enabled:
+            if self.filter_text is None:
+                self.filter_text = tk.Text(self.frame, height=15, width=50, wrap="none")
+                self.filter_text.grid(row=0, column=0, sticky="nsew")
+                self.filter_text.configure(yscrollcommand=self.y_scroll.set)
+            self.filter_text.delete("1.0", tk.END)
+            self.filter_count = 0
+            self.text.grid_remove()
+            self.filter_text.grid()
+            self.y_scroll.config(command=self.filter_text.yview)
+            self.update_filter()
+        elif self.filter_text is not None:
+            self.filter_text.grid_remove()
+            self.text.grid()
+            self.y_scroll.config(command=self.text.yview)
+
+    def set_hex(self, enabled, markers=False):
+        # The hex view covers the text and its scrollbars, which keep their state
+        if enabled:
+            if self.hex_view is None:
+                self.hex_view = HexView(self.frame)
+            self.hex_view.frame.grid(row=0, column=0, rowspan=2, columnspan=2, sticky="nsew")
+            self.hex_view.set_ring(self.byte_ring, markers)
+        elif self.hex_view is not None:
+            self.hex_view.frame.grid_remove()
+
+    def set_plot(self, enabled, window):
+        if enabled:
+            if self.plot_view is None:
+                self.plot_view = PlotView(self.frame)
+            self.plot_view.plot_data = self.plot_data
+            self.plot_view.window = window
+            self.plot_view.canvas.grid(row=0, column=2, rowspan=2, sticky="ns")
+        elif self.plot_view is not None:
+            self.plot_view.canvas.grid_remove()
+
+    def is_plot_shown(self):
+        return self.plot_view is not None and self.plot_view.canvas.winfo_ismapped()
+
+    def is_hex_shown(self):
+        return self.hex_view is not None and self.hex_view.frame.winfo_ismapped()
+
+    def update_filter(self):
+        # Append the matches found since the last frame, bounded like the scrollback
+        if not self.search or not self.filter_text or not self.filter_text.winfo_ismapped():
+            return
+        total, new_matches = self.search.take_recent(self.filter_count)
+        self.filter_count = total
+        if not new_matches:
+            return
+        at_bottom = self.filter_text.yview()[1] >= 1.0
+        text = "".join(f"{text}\n" for line, text in new_matches)
+        self.filter_text.insert(tk.END, strip_ansi(text) if self.history_ansi else text)
+        limit = get_scrollback_limit()
+        if limit:
+            line_count = int(self.filter_text.index("end-1c").split(".")[0])
+            if line_count > limit:
+                self.filter_text.delete("1.0", f"{line_count - limit}.0")
+        if at_bottom:
+            self.filter_text.see(tk.END)
+
+
+def get_output_view(port):
+    view = output_views.get(port)
+    if view is None:
+        # The initial tab is taken by the first port opened
+        view = output_views.pop(None, None)
+        if view is None:
+            view = OutputView(output_notebook, port)
+        else:
+            view.rename(port)
+        output_views[port] = view
+    return view
+
+
+def current_output_view():
+    selected = output_notebook.select()
+    for view in output_views.values():
+        if str(view.frame) == selected:
+            return view
+    return None
+
+
+def clear_screen():
+    view = current_output_view()
+    if view:
+        view.clear()
+
+
+def on_search(event=None):
+    # Enter runs a new search when the query changed, otherwise it moves to the next match
+    view = current_output_view()
+    if view is None:
+        return
+    query = (search_var.get(), search_regex_var.get(), not search_case_var.get())
+    if view.search is None or view.search_query != query:
+        view.search_query = query
+        try:
+            view.start_search(*query)
+        except re.error as e:
+            search_status_var.set(f"Invalid pattern: {e}")
+            return
+        if view.search is None and query[0]:
+            search_status_var.set("No log to search")
+        view.set_filter(search_filter_var.get() and view.search is not None)
+    else:
+        find_next()
 
-# Global variables
-ser = None
-read_thread = None
 
-gConfig = configparser.ConfigParser()
-gConfig["Settings"] = {
-    "last_com_port": DEFAULT_LAST_COM_PORT_NUM,
-    "last_baud_rate": str(DEFAULT_BUAD_RATE),
-    "visible_baud_rates_list": ",".join(map(str, DEFAULT_COMMON_BAUD_RATES_LIST)),
-    "log_path": DEFAULT_LOG_PATH,
-    "show_timestamp": str(DEFAULT_SHOW_TIMESTAMP),
-}
+def find_next(backwards=False):
+    view = current_output_view()
+    if view is None or view.search is None:
+        return
+    log_line = view.jump_to_match(backwards)
+    if log_line is not None and view.widget_line(log_line) is None:
+        search_status_var.set(f"Log line {log_line + 1} is outside the scrollback")
 
 
-# Get available COM ports
-def get_com_ports():
-    from serial.tools import list_ports
+def clear_search(event=None):
+    search_var.set("")
+    view = current_output_view()
+    if view:
+        view.search_query = None
+        view.start_search("", False, True)
+        view.set_filter(False)
+    search_status_var.set("")
 
-    return [port.device for port in list_ports.comports()]
 
+def toggle_filter():
+    view = current_output_view()
+    if view:
+        view.set_filter(search_filter_var.get() and view.search is not None)
 
-def parse_save_path(path_template, com_port):
-    current_time = datetime.now()
-    formatted_time = current_time.strftime("%Y%m%d_%H%M%S")
-    path = path_template.replace("{COM}", com_port).replace("{TIME}", formatted_time)
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    return path
 
+def toggle_hex():
+    view = current_output_view()
+    if view:
+        view.set_hex(hex_view_var.get() and view.byte_ring is not None, hex_markers_var.get())
+        hex_view_var.set(view.is_hex_shown())
 
-def decode_data(data):
+
+def get_plot_window():
     try:
-        decoded_data = data.decode("utf-8")
-    except UnicodeDecodeError:
-        try:
-            decoded_data = data.decode(
-                "latin-1", "ignore"
-            )  # Use `latin-1` to decode and ignore errors
-        except UnicodeDecodeError:
-            # For characters that cannot be decoded, display their hexadecimal representation
-            decoded_data = "".join(f"\\x{b:02x}" for b in data)
-    return decoded_data
-
-
-def add_timestamp_to_lines(text):
-    # Get current time and format it as a timestamp
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-    # Split text into lines
-    lines = text.splitlines()
-    # Add timestamp to each line
-    lines_with_timestamp = [f"{timestamp} - {line}" for line in lines]
-    # Combine lines back into a single string
-    return "\n".join(lines_with_timestamp)
-
-
-def format_lines(text):
-    # Split text into lines
-    lines = text.splitlines()
-    # Combine lines back into a single string
-    return "\n".join(lines)
-
-
-def read_from_port(ser, text_widget, log_path, read_delay):
-    save_path = parse_save_path(log_path, ser.port)
-    root.title(f"{get_resource_path(save_path)} - {APP_NAME}")
-    with open(save_path, "a", encoding="utf-8") as file:  # Use 'a' mode and utf-8 encoding
-        while ser.is_open:
-            try:
-                if ser.in_waiting > 0:
-                    data = ser.read(ser.in_waiting)
-                    decoded_data = decode_data(data)
-                    if show_time_stamp_var.get():
-                        decoded_data_with_time = add_timestamp_to_lines(decoded_data)
-                        text_widget.insert(tk.END, f"{decoded_data_with_time}\n")
-                    else:
-                        decoded_data_format = format_lines(decoded_data)
-                        # text_widget.insert(tk.END, f"Received: {decoded_data}\n")
-                        text_widget.insert(tk.END, f"{decoded_data}\n")
-                    text_widget.see(tk.END)
+        return max(1.0, float(plot_window_var.get()))
+    except ValueError:
+        return DEFAULT_PLOT_WINDOW_S
 
-                    if show_time_stamp_var.get():
-                        file.write(f"{decoded_data_with_time}")  # Write decoded data
-                    else:
-                        file.write(decoded_data_format)
 
-                    file.flush()
-                time.sleep(read_delay)  # Custom delay time
-            except serial.SerialException as e:
-                print(f"SerialException: {e}")
-                break
+def toggle_plot():
+    view = current_output_view()
+    if view:
+        view.set_plot(plot_view_var.get(), get_plot_window())
+        plot_view_var.set(view.is_plot_shown())
 
 
-def write_to_port(ser, msg, text_widget):
-    try:
-        ser.write(msg.encode())
-        text_widget.insert(tk.END, f"Sent: {msg}\n")
-        text_widget.see(tk.END)
-    except serial.SerialException as e:
-        print(f"SerialException: {e}")
+def update_hex_view():
+    # Called once per frame, only the selected tab is redrawn
+    view = current_output_view()
+    if view and view.is_hex_shown():
+        view.hex_view.refresh()
+    if view and view.is_plot_shown():
+        view.plot_view.refresh()
+
+
+def update_search_status():
+    # Called once per frame, only the selected tab is kept up to date
+    view = current_output_view()
+    if view is None or view.search is None:
+        return
+    view.update_filter()
+    search = view.search
+    searching = "" if search.is_done() else ", searching..."
+    search_status_var.set(f"{len(search.matches)} matches{searching}")
+
+
+def update_session_controls():
+    # Start opens another port, Stop closes the port of the selected tab
+    view = current_output_view()
+    running = view is not None and view.title in sessions
+    start_button.config(state=tk.NORMAL)
+    stop_button.config(state=tk.NORMAL if running else tk.DISABLED)
+    menu_bar.entryconfig("Settings", state=tk.DISABLED if sessions else tk.NORMAL)
+
+
+def on_tab_changed(event):
+    view = current_output_view()
+    search_status_var.set("")
+    if view:
+        search_filter_var.set(bool(view.filter_text and view.filter_text.winfo_ismapped()))
+        hex_view_var.set(view.is_hex_shown())
+        plot_view_var.set(view.is_plot_shown())
+    if view and view.log_path:
+        root.title(f"{get_resource_path(view.log_path)} - {APP_NAME}")
+    else:
+        root.title(f"{APP_NAME}")
+    update_session_controls()
+
 
+def update_metrics():
+    global metrics_dump_time
+    root.after(METRICS_STATUS_INTERVAL_MS, update_metrics)
+    view = current_output_view()
+    session = sessions.get(view.title) if view else None
+    samples = status_metrics.collect([session] if session else [])
+    status_var.set(format_status(samples[0]) if samples else f"{len(sessions)} ports open")
 
-def start_communication(port, baudrate, text_widget, log_path, read_delay):
-    global ser, read_thread
+    path = metrics_path_var.get()
+    if not path or not sessions:
+        return
+    try:
+        interval = max(1.0, float(metrics_interval_var.get()))
+    except ValueError:
+        interval = DEFAULT_METRICS_INTERVAL_S
+    now = time.monotonic()
+    if now - metrics_dump_time < interval:
+        return
+    metrics_dump_time = now
     try:
-        ser = serial.Serial(port, baudrate, timeout=1)
-        text_widget.insert(tk.END, f"Opened {port} at {baudrate} baud rate.\n")
+        write_metrics(path, file_metrics.collect(sessions.values()), metrics_format_var.get())
+    except OSError as e:
+        status_var.set(f"Metrics file: {e}")
 
-        read_thread = threading.Thread(
-            target=read_from_port, args=(ser, text_widget, log_path, read_delay)
+
+def get_gui_refresh_ms():
+    try:
+        refresh_hz = int(gui_refresh_var.get())
+    except ValueError:
+        refresh_hz = DEFAULT_GUI_REFRESH_HZ
+    return max(1, 1000 // max(1, refresh_hz))
+
+
+def drain_gui_queue():
+    global com_port_scan_generation
+    flush_gui_queue()
+    update_search_status()
+    update_hex_view()
+    # Trigger actions that need Tk
+    while not gui_calls.empty():
+        gui_calls.get_nowait()()
+    # Devices came or went, refresh the port list unless a scan is still running
+    if port_watcher and com_port_scan_generation not in (port_watcher.generation, -1):
+        com_port_scan_generation = -1
+        scan_com_ports()
+    root.after(get_gui_refresh_ms(), drain_gui_queue)
+
+
+def get_tx_pacing():
+    """(line ending, line delay s, pace bytes, pace delay s) from the settings."""
+    try:
+        return (
+            TX_LINE_ENDINGS_DICT.get(tx_line_ending_var.get(), "\n"),
+            max(0, float(tx_line_delay_var.get())) / 1000,
+            max(0, int(tx_pace_bytes_var.get())),
+            max(0, float(tx_pace_delay_var.get())) / 1000,
         )
-        read_thread.daemon = True
-        read_thread.start()
-    except serial.SerialException as e:
-        messagebox.showerror("Error", f"Failed to open serial port: {str(e)}")
-        start_button.config(state=tk.NORMAL)
-        menu_bar.entryconfig("Settings", state=tk.NORMAL)
-    except Exception as e:
-        messagebox.showerror("Error", f"An unexpected error occurred: {str(e)}")
-        start_button.config(state=tk.NORMAL)
-        menu_bar.entryconfig("Settings", state=tk.NORMAL)
+    except ValueError:
+        return "\n", 0, 0, 0
 
 
-def stop_communication():
-    global ser, read_thread
-    if ser:
-        ser.close()
-    if read_thread:
-        read_thread.join()
-    text_widget.insert(tk.END, "Serial communication stopped.\n")
-    start_button.config(state=tk.NORMAL)
-    menu_bar.entryconfig("Settings", state=tk.NORMAL)
-    stop_button.config(state=tk.DISABLED)
+def current_transmitter():
+    view = current_output_view()
+    session = sessions.get(view.title) if view else None
+    if session is None or session.transmitter is None:
+        messagebox.showerror("Error", "Start the port of this tab first.")
+        return None
+    return session.transmitter
 
 
-def truncate_decimal(value, digits):
-    """
-    Truncate the number to a specified number of decimal places.
+def send_file():
+    from tkinter import filedialog
+
+    transmitter = current_transmitter()
+    if transmitter is None:
+        return
+    path = filedialog.askopenfilename(title="Send File")
+    if path:
+        line_ending, line_delay, pace_bytes, pace_delay = get_tx_pacing()
+        transmitter.send_file(path, pace_bytes, pace_delay)
 
-    :param value: The number to truncate.
-    :param digits: The number of decimal places to keep.
-    :return: The truncated number.
-    """
-    factor = 10**digits
-    return math.floor(value * factor) / factor
 
+def cancel_send():
+    view = current_output_view()
+    session = sessions.get(view.title) if view else None
+    if session and session.transmitter:
+        session.transmitter.cancel()
 
-def auto_approximate(value):
+
+def load_macros(config):
     """
-    Automatically truncate the value to an appropriate precision based on the magnitude.
+    Read the command macros from the settings.
+
+    Every [Macro:<name>] section is one macro with the keys text (one command per
+    line, continuation lines indented), file (a file to send instead) and
+    line_delay_ms (overrides the setting).
 
-    :param value: The number to approximate.
-    :return: The approximated number.
+    :param config: A ConfigParser, see load_configs.
+    :return: Dict of name -> section.
     """
-    if value == 0:
-        return 0
+    return {
+        section[len(MACRO_SECTION_PREFIX) :]: config[section]
+        for section in config.sections()
+        if section.startswith(MACRO_SECTION_PREFIX)
+    }
+
+
+def run_macro(macro):
+    transmitter = current_transmitter()
+    if transmitter is None:
+        return
+    line_ending, line_delay, pace_bytes, pace_delay = get_tx_pacing()
+    try:
+        line_delay = macro.getfloat("line_delay_ms", fallback=line_delay * 1000) / 1000
+    except ValueError:
+        pass
+    if macro.get("file"):
+        transmitter.send_file(macro.get("file"), pace_bytes, pace_delay)
+    if macro.get("text"):
+        transmitter.send_text(macro.get("text"), line_ending, line_delay, encoding_var.get())
 
-    # Determine the number of decimal places based on the magnitude of the number
-    magnitude = math.floor(math.log10(abs(value)))
-    if magnitude >= 0:
-        precision = 0
-    else:
-        # Adjust to keep a sensible number of decimal places
-        # precision = -magnitude + 1  # keep two digits
-        precision = -magnitude  # Keep one digits
 
-    return truncate_decimal(value, precision)
+def start_communication(port, baudrate, log_path, read_params):
+    opened = []  # Close functions of what is open so far, run if a later step fails
+    try:
+        min_chunk = read_params[0]
+        # Parse the settings before anything is opened
+        replay_speed = parse_replay_speed(replay_speed_var.get())
+        replay_start = parse_replay_start(replay_start_var.get())
+        hex_buffer_bytes = int(float(hex_buffer_var.get()) * 1024 * 1024)
+        plot_points = int(plot_points_var.get())
+        share_port = int(share_port_var.get())
+        share_buffer_bytes = int(float(share_buffer_var.get()) * 1024)
+
+        ser = open_port(
+            port, baudrate, read_params, replay_speed, flow_control_var.get(), replay_start
+        )
+        opened.append(ser.close)
+        replay = isinstance(ser, ReplayPort)
+        encoding = "utf-8" if replay and ser.text_log else encoding_var.get()
+        decoder = create_stream_decoder(encoding, decode_errors_var.get())
+        view = get_output_view(port)
+        output_notebook.select(view.frame)
+
+        save_path = parse_save_path(log_path, ser.port)
+        log_writer_pool.flush_interval = get_log_flush_ms() / 1000
+        log_writer = LogWriter(
+            save_path,
+            fsync_on_stop=log_fsync_var.get(),
+            index_lines=True,
+            path_template=log_path,
+            port=ser.port,
+            **get_log_rotation(),
+        )
+        opened.append(log_writer.close)
+        byte_ring = ByteRing(hex_buffer_bytes) if hex_buffer_bytes > 0 else None
+        plot_data = None
+        if plot_rules:
+            plot_data = PlotData(
+                plot_rules,
+                plot_points,
+                os.path.splitext(save_path)[0] + PLOT_CSV_EXTENSION if plot_csv_var.get() else None,
+            )
+            opened.append(plot_data.close)
+        raw_capture = None
+        if raw_capture_var.get():
+            raw_capture = RawCapture(
+                os.path.splitext(save_path)[0] + CAPTURE_EXTENSION,
+                ser.port,
+                fsync_on_stop=log_fsync_var.get(),
+            )
+            opened.append(raw_capture.close)
+
+        session = PortSession(
+            ser,
+            log_writer,
+            min_chunk,
+            show_time_stamp_var.get(),
+            raw_capture=raw_capture,
+            decoder=decoder,
+            view=view,
+            reconnect=auto_reconnect_var.get() and not replay,
+            ansi_view=ansi_view_var.get(),
+            ansi_log=ansi_log_var.get(),
+            byte_ring=byte_ring,
+            triggers=trigger_rules,
+            plot_data=plot_data,
+            stages=stage_rules,
+        )
+        if session.pipeline:
+            opened.append(session.pipeline.close)
+        messages = [f"Opened {port} at {baudrate} baud rate.\n"]
+        if share_port > 0:
+            # Capturing goes on without it, e.g. when the address is not available
+            try:
+                session.share = ShareServer(
+                    session,
+                    share_port,
+                    share_bind_var.get(),
+                    share_mode_var.get(),
+                    share_write_var.get(),
+                    share_buffer_bytes,
+                    share_slow_client_var.get(),
+                    parse_share_origins(
+                        gConfig.get("Settings", "share_origins", fallback=DEFAULT_SHARE_ORIGINS)
+                    ),
+                )
+                host, share_port = session.share.address
+                messages.append(f"Sharing {port} on {host}:{share_port}.\n")
+            except OSError as e:
+                messages.append(f"Failed to share {port}: {e}\n")
+        session.start()
+        opened = []  # The session closes them when it stops
+        sessions[port] = session
+
+        # Only a started session replaces the log, history and search of the tab, its
+        # reader posts to the GUI queue, which this thread drains after returning
+        for message in messages:
+            view.insert_message(message)
+        view.log_path = log_writer.path
+        view.stop_search()
+        view.log_writer = log_writer
+        root.title(f"{get_resource_path(log_writer.path)} - {APP_NAME}")
+        # Lines evicted from now on are paged back in from this session's log
+        view.reset_scrollback(log_writer)
+        view.history_ansi = ansi_view_var.get() != "off" and ansi_log_var.get() == "raw"
+        view.byte_ring = byte_ring
+        if view.is_hex_shown():
+            view.set_hex(byte_ring is not None, hex_markers_var.get())
+        view.plot_data = plot_data
+        if view.is_plot_shown():
+            view.set_plot(True, get_plot_window())
+    except serial.SerialException as e:
+        messagebox.showerror("Error", f"Failed to open serial port: {str(e)}")
+    except LookupError as e:
+        messagebox.showerror("Error", f"Unknown encoding: {str(e)}")
+    except ValueError as e:
+        messagebox.showerror("Error", f"Invalid setting: {str(e)}")
+    except Exception as e:
+        messagebox.showerror("Error", f"An unexpected error occurred: {str(e)}")
+    # A failed start must not keep the port busy or the log open
+    for close in reversed(opened):
+        close()
+    update_session_controls()
+
+
+def stop_communication(view=None):
+    view = view or current_output_view()
+    session = sessions.pop(view.title, None) if view else None
+    if session is None:
+        return
+    session.stop()
+    # Show whatever the reader queued before it stopped
+    flush_gui_queue()
+    view.insert_message("Serial communication stopped.\n")
+    stats = session.log_writer.stats()
+    view.insert_message(
+        f"Log: {stats['written_bytes']} bytes written, {stats['dropped_bytes']} dropped, "
+        f"max write {stats['max_write_latency'] * 1000:.1f} ms.\n"
+    )
+    update_session_controls()
 
 
 def on_start():
@@ -265,38 +5260,57 @@ def on_start():
         port = com_port_var.get()
         baudrate = int(baud_rate_var.get())
         log_path = save_path_var.get()
-        # auto calc the interval value
-        read_delay = auto_approximate(float(DEFAULT_UART_BUFFER_SIZE / baudrate))
-        if port == "":
+        # Blocking read parameters derived from the baud rate
+        read_params = calc_read_params(
+            baudrate, int(read_min_chunk_var.get()), int(read_max_wait_var.get())
+        )
+        if port == "" or str(com_port_combobox.cget("state")) == "disabled":
             messagebox.showerror("Error", "No COM port selected.")
             return
+        if port == REPLAY_PORT_NAME:
+            from tkinter import filedialog
+
+            path = filedialog.askopenfilename(
+                title="Replay Log",
+                filetypes=[
+                    ("Logs and captures", "*.txt *.log *.cap *.gz *.zst *.xz"),
+                    ("All files", "*.*"),
+                ],
+            )
+            if not path:
+                return
+            port = REPLAY_PREFIX + path
         if log_path == "":
             messagebox.showerror("Error", "No save path specified.")
             return
+        if port in sessions:
+            messagebox.showerror("Error", f"{port} is already open.")
+            return
 
         # Disable Start and Settings buttons to prevent duplicate clicks
         start_button.config(state=tk.DISABLED)
         menu_bar.entryconfig("Settings", state=tk.DISABLED)
-        stop_button.config(state=tk.NORMAL)
 
         # Save latest baud rate selection, save path, and read delay
         update_configs()
 
-        start_communication(port, baudrate, text_widget, log_path, read_delay)
+        start_communication(port, baudrate, log_path, read_params)
     except ValueError:
         messagebox.showerror("Error", "Invalid baud rate or read delay.")
-        start_button.config(state=tk.NORMAL)
-        menu_bar.entryconfig("Settings", state=tk.NORMAL)
+        update_session_controls()
     except Exception as e:
         messagebox.showerror("Error", f"An unexpected error occurred: {str(e)}")
-        start_button.config(state=tk.NORMAL)
-        menu_bar.entryconfig("Settings", state=tk.NORMAL)
+        update_session_controls()
 
 
-def send_message():
+def send_message(event=None):
     msg = input_field.get()
-    if msg:
-        write_to_port(ser, msg, text_widget)
+    if not msg:
+        return
+    transmitter = current_transmitter()
+    if transmitter:
+        line_ending, line_delay, pace_bytes, pace_delay = get_tx_pacing()
+        transmitter.send_text(msg, line_ending, line_delay, encoding_var.get())
         input_field.delete(0, tk.END)
 
 
@@ -384,6 +5398,285 @@ def open_settings():
     )
     show_timestamp_cb.grid(row=3, column=1, padx=5, pady=5, sticky="w")
 
+    # Blocking read tuning, 0 min chunk means derive it from the baud rate
+    ttk.Label(advanced_frame, text="Min Read Chunk (bytes):").grid(
+        row=4, column=0, padx=5, pady=0, sticky="w"
+    )
+    read_min_chunk_entry = ttk.Entry(advanced_frame, textvariable=read_min_chunk_var, width=30)
+    read_min_chunk_entry.grid(row=5, column=0, padx=5, pady=0, sticky="w")
+
+    ttk.Label(advanced_frame, text="Max Read Wait (ms):").grid(
+        row=4, column=1, padx=5, pady=0, sticky="w"
+    )
+    read_max_wait_entry = ttk.Entry(advanced_frame, textvariable=read_max_wait_var, width=12)
+    read_max_wait_entry.grid(row=5, column=1, padx=5, pady=0, sticky="w")
+
+    # Output refresh rate, all received data is inserted once per frame
+    ttk.Label(advanced_frame, text="Refresh Rate (Hz):").grid(
+        row=6, column=0, padx=5, pady=0, sticky="w"
+    )
+    gui_refresh_combobox = ttk.Combobox(
+        advanced_frame,
+        textvariable=gui_refresh_var,
+        values=GUI_REFRESH_RATES_LIST,
+        state="readonly",
+        width=27,
+    )
+    gui_refresh_combobox.grid(row=7, column=0, padx=5, pady=0, sticky="w")
+
+    # Lines kept in the output view, older lines are paged in from the log file
+    ttk.Label(advanced_frame, text="Scrollback (lines, 0 = unlimited):").grid(
+        row=6, column=1, padx=5, pady=0, sticky="w"
+    )
+    scrollback_entry = ttk.Entry(advanced_frame, textvariable=scrollback_var, width=12)
+    scrollback_entry.grid(row=7, column=1, padx=5, pady=0, sticky="w")
+
+    # Log writer, received data is written in batches from its own thread
+    ttk.Label(advanced_frame, text="Log Flush Interval (ms):").grid(
+        row=8, column=0, padx=5, pady=0, sticky="w"
+    )
+    log_flush_entry = ttk.Entry(advanced_frame, textvariable=log_flush_var, width=30)
+    log_flush_entry.grid(row=9, column=0, padx=5, pady=0, sticky="w")
+
+    log_fsync_cb = ttk.Checkbutton(advanced_frame, text="Fsync Log on Stop", variable=log_fsync_var)
+    log_fsync_cb.grid(row=9, column=1, padx=5, pady=5, sticky="w")
+
+    # Raw capture, received bytes are also recorded verbatim next to the text log
+    raw_capture_cb = ttk.Checkbutton(
+        advanced_frame, text="Raw Capture (.cap)", variable=raw_capture_var
+    )
+    raw_capture_cb.grid(row=10, column=0, padx=5, pady=5, sticky="w")
+
+    # Hot-plug, a port whose device went away is reopened as soon as it is back
+    auto_reconnect_cb = ttk.Checkbutton(
+        advanced_frame, text="Auto Reconnect", variable=auto_reconnect_var
+    )
+    auto_reconnect_cb.grid(row=10, column=1, padx=5, pady=5, sticky="w")
+
+    # Metrics file, written every interval while ports are open
+    ttk.Label(advanced_frame, text="Metrics File (empty = off):").grid(
+        row=13, column=0, padx=5, pady=0, sticky="w"
+    )
+    metrics_path_entry = ttk.Entry(advanced_frame, textvariable=metrics_path_var, width=30)
+    metrics_path_entry.grid(row=14, column=0, padx=5, pady=0, sticky="w")
+
+    ttk.Label(advanced_frame, text="Metrics Format / Interval (s):").grid(
+        row=13, column=1, padx=5, pady=0, sticky="w"
+    )
+    metrics_options_frame = ttk.Frame(advanced_frame)
+    metrics_options_frame.grid(row=14, column=1, padx=5, pady=0, sticky="w")
+    metrics_format_combobox = ttk.Combobox(
+        metrics_options_frame,
+        textvariable=metrics_format_var,
+        values=METRICS_FORMATS_LIST,
+        state="readonly",
+        width=10,
+    )
+    metrics_format_combobox.pack(side=tk.LEFT)
+    metrics_interval_entry = ttk.Entry(
+        metrics_options_frame, textvariable=metrics_interval_var, width=5
+    )
+    metrics_interval_entry.pack(side=tk.LEFT, padx=5)
+
+    # Log rotation, {SEQ} in the save path numbers the files of a session
+    ttk.Label(advanced_frame, text="Rotate Log After (MB / minutes):").grid(
+        row=15, column=0, padx=5, pady=0, sticky="w"
+    )
+    log_rotate_frame = ttk.Frame(advanced_frame)
+    log_rotate_frame.grid(row=16, column=0, padx=5, pady=0, sticky="w")
+    log_rotate_mb_entry = ttk.Entry(log_rotate_frame, textvariable=log_rotate_mb_var, width=8)
+    log_rotate_mb_entry.pack(side=tk.LEFT)
+    log_rotate_minutes_entry = ttk.Entry(
+        log_rotate_frame, textvariable=log_rotate_minutes_var, width=8
+    )
+    log_rotate_minutes_entry.pack(side=tk.LEFT, padx=5)
+
+    ttk.Label(advanced_frame, text="Log Compression:").grid(
+        row=15, column=1, padx=5, pady=0, sticky="w"
+    )
+    log_compression_combobox = ttk.Combobox(
+        advanced_frame,
+        textvariable=log_compression_var,
+        values=list(LOG_COMPRESSION_DICT),
+        state="readonly",
+        width=9,
+    )
+    log_compression_combobox.grid(row=16, column=1, padx=5, pady=0, sticky="w")
+
+    # Retention, the oldest logs of the port are deleted, 0 = no limit
+    ttk.Label(advanced_frame, text="Keep Logs (files / MB):").grid(
+        row=17, column=0, padx=5, pady=0, sticky="w"
+    )
+    log_keep_frame = ttk.Frame(advanced_frame)
+    log_keep_frame.grid(row=18, column=0, padx=5, pady=0, sticky="w")
+    log_keep_files_entry = ttk.Entry(log_keep_frame, textvariable=log_keep_files_var, width=8)
+    log_keep_files_entry.pack(side=tk.LEFT)
+    log_keep_mb_entry = ttk.Entry(log_keep_frame, textvariable=log_keep_mb_var, width=8)
+    log_keep_mb_entry.pack(side=tk.LEFT, padx=5)
+
+    # Replay of recorded logs, chosen as a pseudo COM port
+    ttk.Label(advanced_frame, text="Replay Speed / From:").grid(
+        row=17, column=1, padx=5, pady=0, sticky="w"
+    )
+    replay_frame = ttk.Frame(advanced_frame)
+    replay_frame.grid(row=18, column=1, padx=5, pady=0, sticky="w")
+    replay_speed_combobox = ttk.Combobox(
+        replay_frame, textvariable=replay_speed_var, values=list(REPLAY_SPEEDS_DICT), width=9
+    )
+    replay_speed_combobox.pack(side=tk.LEFT)
+    replay_start_entry = ttk.Entry(replay_frame, textvariable=replay_start_var, width=8)
+    replay_start_entry.pack(side=tk.LEFT, padx=5)
+
+    # Transmit, lines are paced with a pause after each, files every few bytes
+    ttk.Label(advanced_frame, text="Send Line Ending / Delay (ms):").grid(
+        row=19, column=0, padx=5, pady=0, sticky="w"
+    )
+    tx_line_frame = ttk.Frame(advanced_frame)
+    tx_line_frame.grid(row=20, column=0, padx=5, pady=0, sticky="w")
+    tx_line_ending_combobox = ttk.Combobox(
+        tx_line_frame,
+        textvariable=tx_line_ending_var,
+        values=list(TX_LINE_ENDINGS_DICT),
+        state="readonly",
+        width=6,
+    )
+    tx_line_ending_combobox.pack(side=tk.LEFT)
+    tx_line_delay_entry = ttk.Entry(tx_line_frame, textvariable=tx_line_delay_var, width=8)
+    tx_line_delay_entry.pack(side=tk.LEFT, padx=5)
+
+    ttk.Label(advanced_frame, text="File Pacing (bytes / ms, 0 = off):").grid(
+        row=19, column=1, padx=5, pady=0, sticky="w"
+    )
+    tx_pace_frame = ttk.Frame(advanced_frame)
+    tx_pace_frame.grid(row=20, column=1, padx=5, pady=0, sticky="w")
+    tx_pace_bytes_entry = ttk.Entry(tx_pace_frame, textvariable=tx_pace_bytes_var, width=8)
+    tx_pace_bytes_entry.pack(side=tk.LEFT)
+    tx_pace_delay_entry = ttk.Entry(tx_pace_frame, textvariable=tx_pace_delay_var, width=8)
+    tx_pace_delay_entry.pack(side=tk.LEFT, padx=5)
+
+    ttk.Label(advanced_frame, text="Flow Control:").grid(
+        row=21, column=0, padx=5, pady=0, sticky="w"
+    )
+    flow_control_combobox = ttk.Combobox(
+        advanced_frame,
+        textvariable=flow_control_var,
+        values=list(FLOW_CONTROL_DICT),
+        state="readonly",
+        width=27,
+    )
+    flow_control_combobox.grid(row=22, column=0, padx=5, pady=0, sticky="w")
+
+    # ANSI escape sequences, shown as colours, removed or left as they are
+    ttk.Label(advanced_frame, text="ANSI Colours in Output:").grid(
+        row=21, column=1, padx=5, pady=0, sticky="w"
+    )
+    ansi_view_combobox = ttk.Combobox(
+        advanced_frame,
+        textvariable=ansi_view_var,
+        values=ANSI_VIEW_MODES_LIST,
+        state="readonly",
+        width=27,
+    )
+    ansi_view_combobox.grid(row=22, column=1, padx=5, pady=0, sticky="w")
+
+    ttk.Label(advanced_frame, text="ANSI Codes in Log:").grid(
+        row=23, column=0, padx=5, pady=0, sticky="w"
+    )
+    ansi_log_combobox = ttk.Combobox(
+        advanced_frame,
+        textvariable=ansi_log_var,
+        values=ANSI_LOG_MODES_LIST,
+        state="readonly",
+        width=27,
+    )
+    ansi_log_combobox.grid(row=24, column=0, padx=5, pady=0, sticky="w")
+
+    # Raw bytes kept in memory per port for the hex view
+    ttk.Label(advanced_frame, text="Hex View Buffer (MB, 0 = off):").grid(
+        row=23, column=1, padx=5, pady=0, sticky="w"
+    )
+    hex_buffer_entry = ttk.Entry(advanced_frame, textvariable=hex_buffer_var, width=30)
+    hex_buffer_entry.grid(row=24, column=1, padx=5, pady=0, sticky="w")
+
+    # Live plot of the [Plot:...] rules in settings.ini
+    ttk.Label(advanced_frame, text="Plot Window (s) / Points per Series:").grid(
+        row=25, column=0, padx=5, pady=0, sticky="w"
+    )
+    plot_frame = ttk.Frame(advanced_frame)
+    plot_frame.grid(row=26, column=0, padx=5, pady=0, sticky="w")
+    plot_window_entry = ttk.Entry(plot_frame, textvariable=plot_window_var, width=8)
+    plot_window_entry.pack(side=tk.LEFT)
+    plot_points_entry = ttk.Entry(plot_frame, textvariable=plot_points_var, width=10)
+    plot_points_entry.pack(side=tk.LEFT, padx=5)
+    plot_csv_checkbox = ttk.Checkbutton(
+        advanced_frame, text="Write Plot Values to CSV", variable=plot_csv_var
+    )
+    plot_csv_checkbox.grid(row=26, column=1, padx=5, pady=0, sticky="w")
+
+    # TCP / WebSocket server that lets other programs use the open ports, see ShareServer
+    ttk.Label(advanced_frame, text="Share Port (TCP/WebSocket, 0 = off):").grid(
+        row=27, column=0, padx=5, pady=0, sticky="w"
+    )
+    share_port_entry = ttk.Entry(advanced_frame, textvariable=share_port_var, width=30)
+    share_port_entry.grid(row=28, column=0, padx=5, pady=0, sticky="w")
+
+    ttk.Label(advanced_frame, text="Share Address:").grid(
+        row=27, column=1, padx=5, pady=0, sticky="w"
+    )
+    share_bind_entry = ttk.Entry(advanced_frame, textvariable=share_bind_var, width=30)
+    share_bind_entry.grid(row=28, column=1, padx=5, pady=0, sticky="w")
+
+    ttk.Label(advanced_frame, text="Share Data / Client Buffer (KB):").grid(
+        row=29, column=0, padx=5, pady=0, sticky="w"
+    )
+    share_frame = ttk.Frame(advanced_frame)
+    share_frame.grid(row=30, column=0, padx=5, pady=0, sticky="w")
+    share_mode_combobox = ttk.Combobox(
+        share_frame,
+        textvariable=share_mode_var,
+        values=SHARE_MODES_LIST,
+        state="readonly",
+        width=6,
+    )
+    share_mode_combobox.pack(side=tk.LEFT)
+    share_buffer_entry = ttk.Entry(share_frame, textvariable=share_buffer_var, width=8)
+    share_buffer_entry.pack(side=tk.LEFT, padx=5)
+
+    ttk.Label(advanced_frame, text="Slow Share Clients:").grid(
+        row=29, column=1, padx=5, pady=0, sticky="w"
+    )
+    share_slow_client_combobox = ttk.Combobox(
+        advanced_frame,
+        textvariable=share_slow_client_var,
+        values=SHARE_SLOW_CLIENT_LIST,
+        state="readonly",
+        width=27,
+    )
+    share_slow_client_combobox.grid(row=30, column=1, padx=5, pady=0, sticky="w")
+    share_write_checkbox = ttk.Checkbutton(
+        advanced_frame, text="Share Clients May Write to the Port", variable=share_write_var
+    )
+    share_write_checkbox.grid(row=31, column=0, padx=5, pady=0, sticky="w")
+
+    # Decoding of received bytes
+    ttk.Label(advanced_frame, text="Encoding:").grid(row=11, column=0, padx=5, pady=0, sticky="w")
+    encoding_combobox = ttk.Combobox(
+        advanced_frame, textvariable=encoding_var, values=ENCODINGS_LIST, width=27
+    )
+    encoding_combobox.grid(row=12, column=0, padx=5, pady=0, sticky="w")
+
+    ttk.Label(advanced_frame, text="Undecodable Bytes:").grid(
+        row=11, column=1, padx=5, pady=0, sticky="w"
+    )
+    decode_errors_combobox = ttk.Combobox(
+        advanced_frame,
+        textvariable=decode_errors_var,
+        values=list(DECODE_ERRORS_DICT),
+        state="readonly",
+        width=9,
+    )
+    decode_errors_combobox.grid(row=12, column=1, padx=5, pady=0, sticky="w")
+
     # Save and Close button
     save_button = ttk.Button(frame, text="Save & Close", command=save_and_close)
     save_button.grid(row=6, column=0, padx=5, pady=10, sticky="ew")
@@ -413,9 +5706,10 @@ def about_app():
     frame = ttk.Frame(about_window, padding="10")
     frame.grid(row=0, column=0, sticky="nsew")
 
-    # Load and resize image
-    original_image = Image.open(get_resource_path("app_icon.ico"))
-    resized_image = original_image.resize((80, 80))  # Resize image to 80x80 pixels
+    # Resize the cached image
+    from PIL import ImageTk
+
+    resized_image = get_app_icon_image().resize((80, 80))  # Resize image to 80x80 pixels
     icon = ImageTk.PhotoImage(resized_image)
 
     # Create a ttk.Label widget to display the image
@@ -492,6 +5786,44 @@ def update_configs():
     # gConfig['Settings']['visible_baud_rates_list']    # manual update by user
     gConfig["Settings"]["log_path"] = save_path_var.get()
     gConfig["Settings"]["show_timestamp"] = str(show_time_stamp_var.get())
+    gConfig["Settings"]["read_min_chunk"] = str(read_min_chunk_var.get())
+    gConfig["Settings"]["read_max_wait_ms"] = str(read_max_wait_var.get())
+    gConfig["Settings"]["gui_refresh_hz"] = str(gui_refresh_var.get())
+    gConfig["Settings"]["scrollback_lines"] = str(scrollback_var.get())
+    gConfig["Settings"]["log_flush_ms"] = str(log_flush_var.get())
+    gConfig["Settings"]["log_fsync_on_stop"] = str(log_fsync_var.get())
+    gConfig["Settings"]["raw_capture"] = str(raw_capture_var.get())
+    gConfig["Settings"]["encoding"] = encoding_var.get()
+    gConfig["Settings"]["decode_errors"] = decode_errors_var.get()
+    gConfig["Settings"]["ansi_view"] = ansi_view_var.get()
+    gConfig["Settings"]["ansi_log"] = ansi_log_var.get()
+    gConfig["Settings"]["hex_buffer_mb"] = str(hex_buffer_var.get())
+    gConfig["Settings"]["hex_time_markers"] = str(hex_markers_var.get())
+    gConfig["Settings"]["plot_window_s"] = str(plot_window_var.get())
+    gConfig["Settings"]["plot_points"] = str(plot_points_var.get())
+    gConfig["Settings"]["plot_csv"] = str(plot_csv_var.get())
+    gConfig["Settings"]["share_port"] = str(share_port_var.get())
+    gConfig["Settings"]["share_bind"] = str(share_bind_var.get())
+    gConfig["Settings"]["share_mode"] = str(share_mode_var.get())
+    gConfig["Settings"]["share_write"] = str(share_write_var.get())
+    gConfig["Settings"]["share_buffer_kb"] = str(share_buffer_var.get())
+    gConfig["Settings"]["share_slow_client"] = str(share_slow_client_var.get())
+    gConfig["Settings"]["auto_reconnect"] = str(auto_reconnect_var.get())
+    gConfig["Settings"]["metrics_path"] = metrics_path_var.get()
+    gConfig["Settings"]["metrics_format"] = metrics_format_var.get()
+    gConfig["Settings"]["metrics_interval_s"] = str(metrics_interval_var.get())
+    gConfig["Settings"]["log_rotate_mb"] = str(log_rotate_mb_var.get())
+    gConfig["Settings"]["log_rotate_minutes"] = str(log_rotate_minutes_var.get())
+    gConfig["Settings"]["log_compression"] = log_compression_var.get()
+    gConfig["Settings"]["log_keep_files"] = str(log_keep_files_var.get())
+    gConfig["Settings"]["log_keep_mb"] = str(log_keep_mb_var.get())
+    gConfig["Settings"]["replay_speed"] = replay_speed_var.get()
+    gConfig["Settings"]["replay_start"] = replay_start_var.get()
+    gConfig["Settings"]["tx_line_ending"] = tx_line_ending_var.get()
+    gConfig["Settings"]["tx_line_delay_ms"] = str(tx_line_delay_var.get())
+    gConfig["Settings"]["tx_pace_bytes"] = str(tx_pace_bytes_var.get())
+    gConfig["Settings"]["tx_pace_delay_ms"] = str(tx_pace_delay_var.get())
+    gConfig["Settings"]["flow_control"] = flow_control_var.get()
 
     with open(CONFIG_FILE, "w") as configfile:
         gConfig.write(configfile)
@@ -528,121 +5860,727 @@ def on_popup_focus(event):
         popup.deiconify()
 
 
-# Create the main window
-root = tk.Tk()
-root.title(f"{APP_NAME}")
-# Use PhotoImage to load a PNG file
-# icon = tk.PhotoImage(file=get_resource_path("app_icon.png"))
-# root.iconphoto(True, icon)  # Set window icon
+def import_gui_modules():
+    # tkinter is only loaded for the GUI, the headless capture runs without it
+    global tk, ttk, messagebox
+    import tkinter as tk
+    from tkinter import messagebox, ttk
 
-img = Image.open(get_resource_path("app_icon.ico"))
-icon = ImageTk.PhotoImage(img)
-root.tk.call("wm", "iconphoto", root._w, icon)
 
-center_x = int(root.winfo_screenwidth() / 2 - APP_WIDTH / 2)
-center_y = int(root.winfo_screenheight() / 2 - APP_HEIGHT / 2)
-root.geometry(f"{APP_WIDTH}x{APP_HEIGHT}+{center_x}+{center_y}")  # Set default window size
+def get_app_icon_image():
+    # PIL is only needed for the icon, load it and decode the file once
+    global app_icon_image
+    if app_icon_image is None:
+        from PIL import Image
 
-# Initialize the configuration file
-# create_default_config()
+        app_icon_image = Image.open(get_resource_path("app_icon.ico"))
+        app_icon_image.load()
+    return app_icon_image
 
-# Global variables
-baud_rate_var = tk.StringVar()
-save_path_var = tk.StringVar()
-show_time_stamp_var = tk.BooleanVar()
-
-config = load_configs()
-baud_rate_var.set(config.get("Settings", "last_baud_rate", fallback=str(DEFAULT_BUAD_RATE)))
-save_path_var.set(config.get("Settings", "log_path", fallback=DEFAULT_LOG_PATH))
-show_time_stamp_var.set(
-    config.get("Settings", "show_timestamp", fallback=str(DEFAULT_SHOW_TIMESTAMP))
-)
-baud_rate_list_var = list(
-    map(
-        int,
-        config.get(
-            "Settings",
-            "visible_baud_rates_list",
-            fallback=DEFAULT_COMMON_BAUD_RATES_LIST,
-        ).split(","),
-    )
-)
 
+def set_window_icon():
+    from PIL import ImageTk
 
-# Menu bar
-menu_bar = tk.Menu(root)
-root.config(menu=menu_bar)
+    icon = ImageTk.PhotoImage(get_app_icon_image())
+    root.tk.call("wm", "iconphoto", root._w, icon)
+    # Keep a reference to the image to prevent garbage collection
+    root.icon = icon
 
-menu_bar.add_command(label="Settings", command=open_settings)
-menu_bar.add_command(label="?", command=about_app)
 
-# COM port selection
-ttk.Label(root, text="COM Port:").grid(row=0, column=0, padx=5, pady=5)
-com_port_var = tk.StringVar()
-com_ports = get_com_ports()
-last_com_port = config.get("Settings", "last_com_port", fallback="")
+def scan_com_ports():
+    global com_port_scan_generation
+    # Port enumeration can take seconds with many virtual ports, keep it off the GUI thread
+    com_port_scan_generation = -1
+    result = []
+    thread = threading.Thread(target=lambda: result.append(get_com_ports()), daemon=True)
+    thread.start()
+    root.after(COM_PORT_SCAN_POLL_MS, poll_com_port_scan, thread, result)
 
-if com_ports:
-    com_port_combobox = ttk.Combobox(
-        root, textvariable=com_port_var, values=com_ports, state="readonly"
-    )
-    com_port_combobox.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+
+def poll_com_port_scan(thread, result):
+    global com_port_scan_generation
+    if thread.is_alive():
+        root.after(COM_PORT_SCAN_POLL_MS, poll_com_port_scan, thread, result)
+    else:
+        com_port_scan_generation = port_watcher.generation if port_watcher else 0
+        set_com_ports(result[0] if result else [])
+
+
+def set_com_ports(com_ports):
+    # A recorded session can be replayed with or without any port attached
+    com_port_combobox.config(values=com_ports + [REPLAY_PORT_NAME], state="readonly")
     if last_com_port in com_ports:
         com_port_combobox.set(last_com_port)
-    else:
+    elif com_port_var.get() not in com_ports + [REPLAY_PORT_NAME]:
         com_port_combobox.current(0)
-else:
+
+
+def on_first_map(event, budget_ms):
+    # The window is mapped, measure once the first paint has been processed
+    if event.widget is root:
+        root.unbind("<Map>")
+        root.bind("<Map>", on_window_restore)
+        root.after_idle(report_startup_time, budget_ms)
+
+
+def report_startup_time(budget_ms):
+    global startup_exit_code
+    elapsed_ms = (time.perf_counter() - STARTUP_TIME) * 1000
+    print(f"Time to first paint: {elapsed_ms:.0f} ms (budget {budget_ms} ms)", file=sys.stderr)
+    if elapsed_ms > budget_ms:
+        startup_exit_code = 1
+    root.destroy()
+
+
+def run_headless(args):
+    """
+    Capture one or more ports without any GUI until SIGINT/SIGTERM.
+
+    :param args: Parsed command line, see parse_args.
+    :return: Process exit code.
+    """
+    global trigger_rules, plot_rules, stage_rules
+    try:
+        read_params = calc_read_params(args.baud, args.min_chunk, args.max_wait_ms)
+        log_writer_pool.flush_interval = max(1, args.flush_ms) / 1000
+        trigger_rules = load_triggers(load_configs())
+        plot_rules = load_plot_rules(load_configs())
+        stage_rules = load_stages(load_configs())
+        for port in args.port:
+            ser = open_port(
+                port,
+                args.baud,
+                read_params,
+                parse_replay_speed(args.replay_speed),
+                args.flow_control,
+                parse_replay_start(args.replay_start),
+            )
+            replay = isinstance(ser, ReplayPort)
+            save_path = parse_save_path(args.log, ser.port)
+            raw_capture = None
+            if args.raw:
+                raw_capture = RawCapture(os.path.splitext(save_path)[0] + CAPTURE_EXTENSION, port)
+            log_writer = LogWriter(
+                save_path,
+                path_template=args.log,
+                port=ser.port,
+                rotate_bytes=int(args.rotate_mb * 1024 * 1024),
+                rotate_interval_s=int(args.rotate_minutes * 60),
+                compression=args.compress,
+                keep_files=args.keep_files,
+                keep_bytes=int(args.keep_mb * 1024 * 1024),
+            )
+            save_path = log_writer.path
+            plot_data = None
+            if args.plot_csv and plot_rules:
+                plot_data = PlotData(
+                    plot_rules, csv_path=os.path.splitext(save_path)[0] + PLOT_CSV_EXTENSION
+                )
+            session = PortSession(
+                ser,
+                log_writer,
+                read_params[0],
+                args.timestamp,
+                raw_capture=raw_capture,
+                decoder=create_stream_decoder(
+                    "utf-8" if replay and ser.text_log else args.encoding, args.errors
+                ),
+                reconnect=args.reconnect and not replay,
+                ansi_log=args.ansi_log,
+                triggers=trigger_rules,
+                plot_data=plot_data,
+                stages=stage_rules,
+            )
+            if args.share_port:
+                session.share = ShareServer(
+                    session,
+                    args.share_port,
+                    args.share_bind,
+                    args.share_mode,
+                    args.share_write,
+                    int(args.share_buffer_kb * 1024),
+                    args.share_slow_client,
+                    parse_share_origins(args.share_origins),
+                )
+            sessions[port] = session
+            session.start()
+            print(
+                f"Opened {port} at {args.baud} baud rate, logging to {save_path}", file=sys.stderr
+            )
+            if session.share:
+                host, share_port = session.share.address
+                print(f"Sharing {port} on {host}:{share_port}", file=sys.stderr)
+            for path in args.send or []:
+                session.transmitter.send_file(path, args.pace_bytes, args.pace_delay_ms / 1000)
+    except (serial.SerialException, LookupError, OSError, ImportError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        for session in sessions.values():
+            session.stop()
+        return 1
+
+    stop_event = threading.Event()
+
+    def on_signal(signum, frame):
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+
+    # Console stats and the metrics file sample at their own intervals
+    stats_metrics = MetricsCollector()
+    file_metrics = MetricsCollector()
+    file_metrics.collect(sessions.values())
+    intervals = [i for i in (args.stats_interval, args.metrics_interval) if i > 0]
+    tick = min(intervals + [1.0])
+    next_stats = next_dump = time.monotonic()
+    while not stop_event.wait(tick):
+        now = time.monotonic()
+        if args.stats_interval > 0 and now >= next_stats + args.stats_interval:
+            next_stats = now
+            for sample in stats_metrics.collect(sessions.values()):
+                print(format_status(sample), file=sys.stderr)
+        if args.metrics_file and now >= next_dump + args.metrics_interval:
+            next_dump = now
+            try:
+                write_metrics(
+                    args.metrics_file, file_metrics.collect(sessions.values()), args.metrics_format
+                )
+            except OSError as e:
+                print(f"Metrics file: {e}", file=sys.stderr)
+        # Nothing left to capture once every reader has stopped on a port error
+        if not any(session.thread.is_alive() for session in sessions.values()):
+            break
+
+    # Final flush, every log is written and fsynced before exiting
+    for port, session in sessions.items():
+        session.stop()
+        print(
+            f"{port}: {session.bytes_read} bytes, {session.lines_read} lines, "
+            f"{session.reconnects} reconnects",
+            file=sys.stderr,
+        )
+    return 0
+
+
+def make_arg_parser():
+    """:return: The argparse parser of the command line, see parse_args."""
+    config = load_configs()
+    parser = argparse.ArgumentParser(
+        prog=APP_NAME, description="Capture serial port output to log files."
+    )
+    parser.add_argument(
+        "--port",
+        action="append",
+        help="Capture this port without the GUI, repeat to capture several ports, "
+        f"{REPLAY_PREFIX}<log or capture file> replays a recording",
+    )
+    parser.add_argument(
+        "--send",
+        action="append",
+        metavar="FILE",
+        help="Stream this file to every port once it is open, repeat to send several",
+    )
+    parser.add_argument("--pace-bytes", type=int, default=0, help="Send files this many bytes")
+    parser.add_argument(
+        "--pace-delay-ms", type=float, default=0, help="at a time with this pause in between"
+    )
+    parser.add_argument(
+        "--flow-control",
+        choices=list(FLOW_CONTROL_DICT),
+        default=config.get("Settings", "flow_control", fallback=DEFAULT_FLOW_CONTROL),
+    )
+    parser.add_argument(
+        "--share-port",
+        type=int,
+        default=config.getint("Settings", "share_port", fallback=DEFAULT_SHARE_PORT),
+        help="Serve the stream to TCP and WebSocket clients on this port, further ports "
+        "on the next free ones, 0 = off",
+    )
+    parser.add_argument(
+        "--share-bind",
+        default=config.get("Settings", "share_bind", fallback=DEFAULT_SHARE_BIND),
+        help="Address to listen on, 0.0.0.0 for all interfaces",
+    )
+    parser.add_argument(
+        "--share-mode",
+        choices=SHARE_MODES_LIST,
+        default=config.get("Settings", "share_mode", fallback=DEFAULT_SHARE_MODE),
+        help="Share the bytes as read or the lines as logged",
+    )
+    parser.add_argument(
+        "--share-write",
+        action="store_true",
+        default=config.getboolean("Settings", "share_write", fallback=DEFAULT_SHARE_WRITE),
+        help="Write data sent by share clients to the port, by default it is ignored",
+    )
+    parser.add_argument(
+        "--share-origins",
+        default=config.get("Settings", "share_origins", fallback=DEFAULT_SHARE_ORIGINS),
+        help="Comma separated web page origins allowed to connect besides loopback",
+    )
+    parser.add_argument(
+        "--share-buffer-kb",
+        type=float,
+        default=config.getfloat("Settings", "share_buffer_kb", fallback=DEFAULT_SHARE_BUFFER_KB),
+        help="Unsent data per client before it counts as too slow",
+    )
+    parser.add_argument(
+        "--share-slow-client",
+        choices=SHARE_SLOW_CLIENT_LIST,
+        default=config.get("Settings", "share_slow_client", fallback=DEFAULT_SHARE_SLOW_CLIENT),
+        help="Skip data for a slow client until it caught up, or disconnect it",
+    )
+    parser.add_argument(
+        "--replay-speed",
+        default=config.get("Settings", "replay_speed", fallback=DEFAULT_REPLAY_SPEED),
+        help="Replay timing: original, 10x, 100x, max or any multiple",
+    )
+    parser.add_argument(
+        "--replay-start",
+        default=config.get("Settings", "replay_start", fallback=DEFAULT_REPLAY_START),
+        help="Start replay this far into the recording, seconds or [hh:]mm:ss",
+    )
+    parser.add_argument(
+        "--baud",
+        type=int,
+        default=int(config.get("Settings", "last_baud_rate", fallback=DEFAULT_BUAD_RATE)),
+    )
+    parser.add_argument(
+        "--log",
+        default=config.get("Settings", "log_path", fallback=DEFAULT_LOG_PATH),
+        help="Log path template, {COM} and {TIME} are replaced",
+    )
+    parser.add_argument(
+        "--rotate-mb",
+        type=float,
+        default=config.getfloat("Settings", "log_rotate_mb", fallback=DEFAULT_LOG_ROTATE_MB),
+        help="Start a new log file after this many MB, {SEQ} in --log numbers the files",
+    )
+    parser.add_argument(
+        "--rotate-minutes",
+        type=float,
+        default=config.getfloat(
+            "Settings", "log_rotate_minutes", fallback=DEFAULT_LOG_ROTATE_MINUTES
+        ),
+        help="Also start a new log file on wall clock boundaries of this many minutes",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=list(LOG_COMPRESSION_DICT),
+        default=config.get("Settings", "log_compression", fallback=DEFAULT_LOG_COMPRESSION),
+    )
+    parser.add_argument(
+        "--keep-files",
+        type=int,
+        default=config.getint("Settings", "log_keep_files", fallback=DEFAULT_LOG_KEEP_FILES),
+        help="Delete the oldest logs of the port beyond this many files, 0 = keep all",
+    )
+    parser.add_argument(
+        "--keep-mb",
+        type=float,
+        default=config.getfloat("Settings", "log_keep_mb", fallback=DEFAULT_LOG_KEEP_MB),
+        help="Delete the oldest logs of the port beyond this total size, 0 = unlimited",
+    )
+    parser.add_argument("--timestamp", action="store_true", help="Prefix every line with its time")
+    parser.add_argument("--raw", action="store_true", help=f"Also write a raw {CAPTURE_EXTENSION}")
+    parser.add_argument(
+        "--plot-csv",
+        action="store_true",
+        help=f"Also write the values of the [Plot:...] rules to a {PLOT_CSV_EXTENSION}",
+    )
+    parser.add_argument(
+        "--encoding", default=config.get("Settings", "encoding", fallback=DEFAULT_ENCODING)
+    )
+    parser.add_argument(
+        "--errors",
+        default=config.get("Settings", "decode_errors", fallback=DEFAULT_DECODE_ERRORS),
+        help="Undecodable bytes: " + ", ".join(DECODE_ERRORS_DICT),
+    )
+    parser.add_argument(
+        "--ansi-log",
+        choices=ANSI_LOG_MODES_LIST,
+        default=config.get("Settings", "ansi_log", fallback=DEFAULT_ANSI_LOG),
+        help="Keep ANSI escape sequences in the log or strip them",
+    )
+    parser.add_argument(
+        "--no-reconnect",
+        dest="reconnect",
+        action="store_false",
+        default=config.getboolean("Settings", "auto_reconnect", fallback=DEFAULT_AUTO_RECONNECT),
+        help="Stop instead of waiting for a port whose device went away",
+    )
+    parser.add_argument("--min-chunk", type=int, default=DEFAULT_READ_MIN_CHUNK)
+    parser.add_argument("--max-wait-ms", type=int, default=DEFAULT_READ_MAX_WAIT_MS)
+    parser.add_argument("--flush-ms", type=int, default=DEFAULT_LOG_FLUSH_MS)
+    parser.add_argument(
+        "--startup-budget-ms",
+        type=int,
+        help="Open the GUI, print the time to first paint and exit with 1 if it took longer "
+        "(combine with python -X importtime for the import breakdown)",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=config.get("Settings", "metrics_path", fallback=DEFAULT_METRICS_PATH),
+        help="Write pipeline metrics to this file every --metrics-interval seconds",
+    )
+    parser.add_argument(
+        "--metrics-format",
+        choices=METRICS_FORMATS_LIST,
+        default=config.get("Settings", "metrics_format", fallback=DEFAULT_METRICS_FORMAT),
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=config.getfloat(
+            "Settings", "metrics_interval_s", fallback=DEFAULT_METRICS_INTERVAL_S
+        ),
+    )
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        default=5.0,
+        help="Seconds between throughput lines on stderr, 0 to disable",
+    )
+    return parser
+
+
+def parse_args(argv=None):
+    return make_arg_parser().parse_args(argv)
+
+
+def run_gui(startup_budget_ms=None):
+    global root, popup, menu_bar, output_notebook, right_click_menu
+    global com_port_var, com_port_combobox, last_com_port, start_button, stop_button
+    global baud_rate_var, baud_rate_list_var, save_path_var, show_time_stamp_var
+    global read_min_chunk_var, read_max_wait_var, gui_refresh_var, scrollback_var
+    global log_flush_var, log_fsync_var, raw_capture_var, encoding_var, decode_errors_var
+    global auto_reconnect_var, metrics_path_var, metrics_format_var, metrics_interval_var
+    global status_var, status_metrics, file_metrics, metrics_dump_time
+    global log_rotate_mb_var, log_rotate_minutes_var, log_compression_var
+    global log_keep_files_var, log_keep_mb_var, highlighter, replay_speed_var, trigger_rules
+    global replay_start_var
+    global plot_rules, plot_view_var, plot_window_var, plot_points_var, plot_csv_var
+    global stage_rules
+    global tx_line_ending_var, tx_line_delay_var, tx_pace_bytes_var, tx_pace_delay_var
+    global flow_control_var, input_field, ansi_view_var, ansi_log_var
+    global hex_buffer_var, hex_view_var, hex_markers_var
+    global share_port_var, share_bind_var, share_mode_var, share_write_var
+    global share_buffer_var, share_slow_client_var
+    global search_var, search_regex_var, search_case_var, search_filter_var, search_status_var
+
+    import_gui_modules()
+
+    # Create the main window
+    root = tk.Tk()
+    root.title(f"{APP_NAME}")
+    # Use PhotoImage to load a PNG file
+    # icon = tk.PhotoImage(file=get_resource_path("app_icon.png"))
+    # root.iconphoto(True, icon)  # Set window icon
+
+    # Decoding the icon is not needed for the first paint
+    root.after_idle(set_window_icon)
+
+    center_x = int(root.winfo_screenwidth() / 2 - APP_WIDTH / 2)
+    center_y = int(root.winfo_screenheight() / 2 - APP_HEIGHT / 2)
+    root.geometry(f"{APP_WIDTH}x{APP_HEIGHT}+{center_x}+{center_y}")  # Set default window size
+
+    # Initialize the configuration file
+    # create_default_config()
+
+    # Global variables
+    baud_rate_var = tk.StringVar()
+    save_path_var = tk.StringVar()
+    show_time_stamp_var = tk.BooleanVar()
+    read_min_chunk_var = tk.StringVar()
+    read_max_wait_var = tk.StringVar()
+    gui_refresh_var = tk.StringVar()
+    scrollback_var = tk.StringVar()
+    log_flush_var = tk.StringVar()
+    log_fsync_var = tk.BooleanVar()
+    raw_capture_var = tk.BooleanVar()
+    encoding_var = tk.StringVar()
+    decode_errors_var = tk.StringVar()
+    auto_reconnect_var = tk.BooleanVar()
+    metrics_path_var = tk.StringVar()
+    metrics_format_var = tk.StringVar()
+    metrics_interval_var = tk.StringVar()
+    log_rotate_mb_var = tk.StringVar()
+    log_rotate_minutes_var = tk.StringVar()
+    log_compression_var = tk.StringVar()
+    log_keep_files_var = tk.StringVar()
+    log_keep_mb_var = tk.StringVar()
+    replay_speed_var = tk.StringVar()
+    replay_start_var = tk.StringVar()
+    tx_line_ending_var = tk.StringVar()
+    tx_line_delay_var = tk.StringVar()
+    tx_pace_bytes_var = tk.StringVar()
+    tx_pace_delay_var = tk.StringVar()
+    flow_control_var = tk.StringVar()
+    ansi_view_var = tk.StringVar()
+    ansi_log_var = tk.StringVar()
+    hex_buffer_var = tk.StringVar()
+    hex_markers_var = tk.BooleanVar()
+    plot_window_var = tk.StringVar()
+    plot_points_var = tk.StringVar()
+    plot_csv_var = tk.BooleanVar()
+    share_port_var = tk.StringVar()
+    share_bind_var = tk.StringVar()
+    share_mode_var = tk.StringVar()
+    share_write_var = tk.BooleanVar()
+    share_buffer_var = tk.StringVar()
+    share_slow_client_var = tk.StringVar()
+
+    config = load_configs()
+    baud_rate_var.set(config.get("Settings", "last_baud_rate", fallback=str(DEFAULT_BUAD_RATE)))
+    save_path_var.set(config.get("Settings", "log_path", fallback=DEFAULT_LOG_PATH))
+    show_time_stamp_var.set(
+        config.get("Settings", "show_timestamp", fallback=str(DEFAULT_SHOW_TIMESTAMP))
+    )
+    read_min_chunk_var.set(
+        config.get("Settings", "read_min_chunk", fallback=str(DEFAULT_READ_MIN_CHUNK))
+    )
+    read_max_wait_var.set(
+        config.get("Settings", "read_max_wait_ms", fallback=str(DEFAULT_READ_MAX_WAIT_MS))
+    )
+    gui_refresh_var.set(
+        config.get("Settings", "gui_refresh_hz", fallback=str(DEFAULT_GUI_REFRESH_HZ))
+    )
+    scrollback_var.set(
+        config.get("Settings", "scrollback_lines", fallback=str(DEFAULT_SCROLLBACK_LINES))
+    )
+    log_flush_var.set(config.get("Settings", "log_flush_ms", fallback=str(DEFAULT_LOG_FLUSH_MS)))
+    log_fsync_var.set(
+        config.get("Settings", "log_fsync_on_stop", fallback=str(DEFAULT_LOG_FSYNC_ON_STOP))
+    )
+    raw_capture_var.set(config.get("Settings", "raw_capture", fallback=str(DEFAULT_RAW_CAPTURE)))
+    encoding_var.set(config.get("Settings", "encoding", fallback=DEFAULT_ENCODING))
+    decode_errors_var.set(config.get("Settings", "decode_errors", fallback=DEFAULT_DECODE_ERRORS))
+    auto_reconnect_var.set(
+        config.get("Settings", "auto_reconnect", fallback=str(DEFAULT_AUTO_RECONNECT))
+    )
+    metrics_path_var.set(config.get("Settings", "metrics_path", fallback=DEFAULT_METRICS_PATH))
+    metrics_format_var.set(
+        config.get("Settings", "metrics_format", fallback=DEFAULT_METRICS_FORMAT)
+    )
+    metrics_interval_var.set(
+        config.get("Settings", "metrics_interval_s", fallback=str(DEFAULT_METRICS_INTERVAL_S))
+    )
+    log_rotate_mb_var.set(
+        config.get("Settings", "log_rotate_mb", fallback=str(DEFAULT_LOG_ROTATE_MB))
+    )
+    log_rotate_minutes_var.set(
+        config.get("Settings", "log_rotate_minutes", fallback=str(DEFAULT_LOG_ROTATE_MINUTES))
+    )
+    log_compression_var.set(
+        config.get("Settings", "log_compression", fallback=DEFAULT_LOG_COMPRESSION)
+    )
+    log_keep_files_var.set(
+        config.get("Settings", "log_keep_files", fallback=str(DEFAULT_LOG_KEEP_FILES))
+    )
+    log_keep_mb_var.set(config.get("Settings", "log_keep_mb", fallback=str(DEFAULT_LOG_KEEP_MB)))
+    replay_speed_var.set(config.get("Settings", "replay_speed", fallback=DEFAULT_REPLAY_SPEED))
+    replay_start_var.set(config.get("Settings", "replay_start", fallback=DEFAULT_REPLAY_START))
+    tx_line_ending_var.set(
+        config.get("Settings", "tx_line_ending", fallback=DEFAULT_TX_LINE_ENDING)
+    )
+    tx_line_delay_var.set(
+        config.get("Settings", "tx_line_delay_ms", fallback=str(DEFAULT_TX_LINE_DELAY_MS))
+    )
+    tx_pace_bytes_var.set(
+        config.get("Settings", "tx_pace_bytes", fallback=str(DEFAULT_TX_PACE_BYTES))
+    )
+    tx_pace_delay_var.set(
+        config.get("Settings", "tx_pace_delay_ms", fallback=str(DEFAULT_TX_PACE_DELAY_MS))
+    )
+    flow_control_var.set(config.get("Settings", "flow_control", fallback=DEFAULT_FLOW_CONTROL))
+    ansi_view_var.set(config.get("Settings", "ansi_view", fallback=DEFAULT_ANSI_VIEW))
+    ansi_log_var.set(config.get("Settings", "ansi_log", fallback=DEFAULT_ANSI_LOG))
+    hex_buffer_var.set(config.get("Settings", "hex_buffer_mb", fallback=str(DEFAULT_HEX_BUFFER_MB)))
+    hex_markers_var.set(
+        config.getboolean("Settings", "hex_time_markers", fallback=DEFAULT_HEX_TIME_MARKERS)
+    )
+    plot_window_var.set(
+        config.get("Settings", "plot_window_s", fallback=str(DEFAULT_PLOT_WINDOW_S))
+    )
+    plot_points_var.set(config.get("Settings", "plot_points", fallback=str(DEFAULT_PLOT_POINTS)))
+    plot_csv_var.set(config.getboolean("Settings", "plot_csv", fallback=DEFAULT_PLOT_CSV))
+    share_port_var.set(config.get("Settings", "share_port", fallback=str(DEFAULT_SHARE_PORT)))
+    share_bind_var.set(config.get("Settings", "share_bind", fallback=DEFAULT_SHARE_BIND))
+    share_mode_var.set(config.get("Settings", "share_mode", fallback=DEFAULT_SHARE_MODE))
+    share_write_var.set(config.getboolean("Settings", "share_write", fallback=DEFAULT_SHARE_WRITE))
+    share_buffer_var.set(
+        config.get("Settings", "share_buffer_kb", fallback=str(DEFAULT_SHARE_BUFFER_KB))
+    )
+    share_slow_client_var.set(
+        config.get("Settings", "share_slow_client", fallback=DEFAULT_SHARE_SLOW_CLIENT)
+    )
+    baud_rate_list_var = list(
+        map(
+            int,
+            config.get(
+                "Settings",
+                "visible_baud_rates_list",
+                fallback=DEFAULT_COMMON_BAUD_RATES_LIST,
+            ).split(","),
+        )
+    )
+
+    # Compiled once, applied to every line as it is inserted
+    highlighter = Highlighter(load_highlight_rules(config))
+    trigger_rules = load_triggers(config)
+    plot_rules = load_plot_rules(config)
+    stage_rules = load_stages(config)
+
+    # Menu bar
+    menu_bar = tk.Menu(root)
+    root.config(menu=menu_bar)
+
+    file_menu = tk.Menu(menu_bar, tearoff=0)
+    file_menu.add_command(label="Open Log...", command=open_log)
+    menu_bar.add_cascade(label="File", menu=file_menu)
+    menu_bar.add_command(label="Settings", command=open_settings)
+
+    # Command macros from settings.ini, sent to the port of the selected tab
+    macros = load_macros(config)
+    if macros:
+        macro_menu = tk.Menu(menu_bar, tearoff=0)
+        for name, macro in macros.items():
+            macro_menu.add_command(label=name, command=lambda macro=macro: run_macro(macro))
+        menu_bar.add_cascade(label="Macros", menu=macro_menu)
+    menu_bar.add_command(label="?", command=about_app)
+
+    # COM port selection, filled in when the background scan finishes
+    ttk.Label(root, text="COM Port:").grid(row=0, column=0, padx=5, pady=5)
+    com_port_var = tk.StringVar()
+    last_com_port = config.get("Settings", "last_com_port", fallback="")
+
     com_port_combobox = ttk.Combobox(
         root,
         textvariable=com_port_var,
-        values=["No COM Ports Available"],
+        values=["Scanning COM Ports..."],
         state="readonly",
     )
     com_port_combobox.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
     com_port_combobox.current(0)
     com_port_combobox.config(state="disabled")
+    scan_com_ports()
+    # Keep the list current as devices are plugged in and out
+    root.after_idle(get_port_watcher)
+
+    # Button area
+    start_button = ttk.Button(root, text="Start", command=on_start)
+    start_button.grid(row=0, column=2, padx=5, pady=5)
+
+    stop_button = ttk.Button(root, text="Stop", command=stop_communication)
+    stop_button.grid(row=0, column=3, padx=5, pady=5)
+    stop_button.config(state=tk.DISABLED)  # Disabled by default, enabled after start
+
+    # Right Click Menu
+    right_click_menu = tk.Menu(root, tearoff=0)
+    right_click_menu.add_command(label="Clear Screen", command=clear_screen)
+
+    # Message output area, one tab per opened port
+    output_notebook = ttk.Notebook(root)
+    output_notebook.grid(row=1, column=0, columnspan=5, padx=5, pady=5, sticky="nsew")
+    output_notebook.bind("<<NotebookTabChanged>>", on_tab_changed)
+    output_views[None] = OutputView(output_notebook, "Output")
+
+    # Search bar, works on the log of the selected tab
+    search_var = tk.StringVar()
+    search_regex_var = tk.BooleanVar(value=False)
+    search_case_var = tk.BooleanVar(value=False)
+    search_filter_var = tk.BooleanVar(value=False)
+    search_status_var = tk.StringVar()
+    hex_view_var = tk.BooleanVar(value=False)
+    plot_view_var = tk.BooleanVar(value=False)
+
+    search_frame = ttk.Frame(root)
+    search_frame.grid(row=2, column=0, columnspan=5, padx=5, pady=0, sticky="ew")
+    ttk.Label(search_frame, text="Find:").pack(side=tk.LEFT)
+    search_entry = ttk.Entry(search_frame, textvariable=search_var, width=30)
+    search_entry.pack(side=tk.LEFT, padx=5)
+    search_entry.bind("<Return>", on_search)
+    search_entry.bind("<Shift-Return>", lambda e: find_next(backwards=True))
+    search_entry.bind("<Escape>", clear_search)
+    ttk.Checkbutton(search_frame, text="Regex", variable=search_regex_var).pack(side=tk.LEFT)
+    ttk.Checkbutton(search_frame, text="Match Case", variable=search_case_var).pack(side=tk.LEFT)
+    ttk.Button(search_frame, text="Prev", command=lambda: find_next(backwards=True)).pack(
+        side=tk.LEFT, padx=2
+    )
+    ttk.Button(search_frame, text="Next", command=on_search).pack(side=tk.LEFT, padx=2)
+    ttk.Checkbutton(
+        search_frame, text="Filter", variable=search_filter_var, command=toggle_filter
+    ).pack(side=tk.LEFT, padx=5)
+    ttk.Label(search_frame, textvariable=search_status_var).pack(side=tk.LEFT, padx=5)
+    # The raw bytes of the selected tab, optionally split by read with its time
+    ttk.Checkbutton(
+        search_frame, text="Read Times", variable=hex_markers_var, command=toggle_hex
+    ).pack(side=tk.RIGHT, padx=5)
+    ttk.Checkbutton(search_frame, text="Hex", variable=hex_view_var, command=toggle_hex).pack(
+        side=tk.RIGHT, padx=5
+    )
+    ttk.Checkbutton(search_frame, text="Plot", variable=plot_view_var, command=toggle_plot).pack(
+        side=tk.RIGHT, padx=5
+    )
+    root.bind("<Control-f>", lambda e: search_entry.focus_set())
+
+    # Input field, Enter sends the line to the port of the selected tab
+    input_field = ttk.Entry(root)
+    input_field.grid(row=3, column=0, columnspan=2, padx=5, pady=5, sticky="ew")
+    input_field.bind("<Return>", send_message)
+
+    # Send button
+    send_button = ttk.Button(root, text="Send", command=send_message)
+    send_button.grid(row=3, column=2, padx=5, pady=5, sticky="ew")
+
+    # Files are streamed by the transmit thread, progress is shown in the status bar
+    send_file_button = ttk.Button(root, text="Send File...", command=send_file)
+    send_file_button.grid(row=3, column=3, padx=5, pady=5, sticky="ew")
+
+    cancel_send_button = ttk.Button(root, text="Cancel", command=cancel_send)
+    cancel_send_button.grid(row=3, column=4, padx=5, pady=5, sticky="ew")
+
+    # Status bar, health of the capture on the selected tab
+    status_var = tk.StringVar()
+    status_bar = ttk.Label(root, textvariable=status_var, anchor="w", relief=tk.SUNKEN)
+    status_bar.grid(row=4, column=0, columnspan=5, padx=0, pady=0, sticky="ew")
+    status_metrics = MetricsCollector()
+    file_metrics = MetricsCollector()
+    metrics_dump_time = 0.0
+    root.after(METRICS_STATUS_INTERVAL_MS, update_metrics)
 
-# Button area
-start_button = ttk.Button(root, text="Start", command=on_start)
-start_button.grid(row=0, column=2, padx=5, pady=5)
+    # Make the window auto-adjust
+    root.grid_rowconfigure(1, weight=1)
+    root.grid_columnconfigure(1, weight=1)
 
-stop_button = ttk.Button(root, text="Stop", command=stop_communication)
-stop_button.grid(row=0, column=3, padx=5, pady=5)
-stop_button.config(state=tk.DISABLED)  # Disabled by default, enabled after start
+    popup = None
 
-# Message output area
-text_widget = tk.Text(root, height=15, width=50, wrap="none")
-text_widget.grid(row=1, column=0, columnspan=4, padx=5, pady=5, sticky="nsew")
+    # Binding events
+    root.bind("<FocusIn>", on_popup_focus)  # Focus event
+    root.bind("<Unmap>", on_window_minimize)  # Minimize event
+    root.bind("<Map>", on_window_restore)  # Restore event
 
-# Right Click Menu
-right_click_menu = tk.Menu(root, tearoff=0)
-right_click_menu.add_command(label="Clear Screen", command=lambda: text_widget.delete("1.0", "end"))
-text_widget.bind("<Button-3>", show_right_click_menu)
+    # Start the output refresh loop
+    drain_gui_queue()
 
-# Set scrollbars
-x_scroll = tk.Scrollbar(root, orient=tk.HORIZONTAL, command=text_widget.xview)
-y_scroll = tk.Scrollbar(root, orient=tk.VERTICAL, command=text_widget.yview)
-text_widget.configure(xscrollcommand=x_scroll.set, yscrollcommand=y_scroll.set)
-x_scroll.grid(row=2, column=0, columnspan=4, padx=5, pady=5, sticky="ew")
-y_scroll.grid(row=1, column=4, padx=5, pady=5, sticky="ns")
+    if startup_budget_ms is not None:
+        root.bind("<Map>", lambda event: on_first_map(event, startup_budget_ms), add="+")
 
-# Input field
-# input_field = ttk.Entry(root)
-# input_field.grid(row=3, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
+    root.mainloop()
+    return startup_exit_code
 
-# Send button
-# send_button = ttk.Button(root, text="Send", command=send_message)
-# send_button.grid(row=3, column=3, padx=5, pady=5, sticky="ew")
 
-# Make the window auto-adjust
-root.grid_rowconfigure(1, weight=1)
-root.grid_columnconfigure(1, weight=1)
+def main(argv=None):
+    args = parse_args(argv)
+    if args.port:
+        return run_headless(args)
+    return run_gui(args.startup_budget_ms)
 
-popup = None
 
-# Binding events
-root.bind("<FocusIn>", on_popup_focus)  # Focus event
-root.bind("<Unmap>", on_window_minimize)  # Minimize event
-root.bind("<Map>", on_window_restore)  # Restore event
+if __name__ == "__main__":
+    if getattr(sys, "frozen", False):
+        # Worker processes of the process stages start this executable again
+        import multiprocessing
 
-root.mainloop()
+        multiprocessing.freeze_support()
+    sys.exit(main())
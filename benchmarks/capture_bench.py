@@ -0,0 +1,1020 @@
+"""
+Benchmarks of the capture pipeline, run from the repository root with
+
+    python -m benchmarks.capture_bench [options]
+
+Synthetic traffic is written to a pty (or loop://) and read back by the app's own
+reader, see run_bench. The decoding, timestamp, log and read options of the app apply,
+the results are printed or written as JSON.
+"""
+
+import collections
+import json
+import math
+import mmap
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime
+
+import serial
+
+import TerminalOutGui as app
+
+BENCH_PROFILES_LIST = ["lines", "boot", "binary", "utf8", "long"]  # See TrafficGenerator
+DEFAULT_BENCH_RATES = "9600,115200,921600,3000000,4000000,max"
+DEFAULT_BENCH_SECONDS = 3.0  # Per profile and rate
+BENCH_PROBE_RE = re.compile(r"<@(\d+)@>")  # Latency probes in the generated stream
+BENCH_PROBE_INTERVAL_MS = 10
+BENCH_SOAK_PROBE_INTERVAL_MS = 100  # Fewer for --soak, latencies are kept for the whole run
+BENCH_WRITE_MS = 2  # Pacing step of the generator
+BENCH_MAX_WRITE = 4096  # Generator write size at the max rate, probes are stamped per write
+BENCH_BOOT_BURST_S = 0.3  # The boot profile sends for this long every second
+BENCH_DRAIN_TIMEOUT = 2.0  # Give up on bytes that did not arrive after this long
+BENCH_SOAK_SAMPLE_S = 10
+BENCH_SOAK_MAX_GROWTH_MB_PER_HOUR = 10  # A soak growing faster than this fails
+BENCH_COMPONENT_LINES = 200_000
+BENCH_RULE_COUNTS = (0, 10, 100)  # Highlight rules
+BENCH_TRIGGER_COUNTS = (1, 100, 1000)  # Literal trigger patterns
+BENCH_FLUSH_MS = (10, app.DEFAULT_LOG_FLUSH_MS, 1000)
+BENCH_VIEWER_MB = 256  # Size of the log opened by the log viewer benchmark
+BENCH_GUI_FRAMES = 300
+BENCH_GUI_FRAME_LINES = 100
+
+
+class TrafficGenerator:
+    """
+    Synthetic UART traffic for the benchmarks, written to a port at a baud rate.
+
+    Profiles, see BENCH_PROFILES_LIST:
+      lines   a steady stream of log lines
+      boot    kernel style boot messages in bursts at the full rate with idle gaps
+      binary  random bytes, mostly not valid utf-8
+      utf8    multi-byte text, writes split characters all the time
+      long    lines of several KB
+
+    Writes are sized to keep the offered rate (baudrate / 10 bytes per second for
+    8N1), baudrate 0 writes as fast as the port takes it. A probe tag "<@n@>" starts a
+    line every probe_interval_ms, the time of its write is kept in probes so the
+    reader side can work out the end-to-end latency.
+    """
+
+    def __init__(
+        self, write, profile, baudrate, seconds, seed=0, probe_interval_ms=BENCH_PROBE_INTERVAL_MS
+    ):
+        import random
+
+        self.write = write
+        self.profile = profile
+        self.bytes_per_s = baudrate / 10
+        self.seconds = seconds
+        self.random = random.Random(seed)
+        self.sent = 0
+        self.probes = {}  # Probe number -> time.perf_counter_ns() when it was written
+        self.probe_count = 0
+        self.probe_interval_ms = probe_interval_ms
+        self.cpu_ns = 0  # CPU time of the generator thread, not part of the capture
+        self.units = 0
+        self._blob = self.random.randbytes(1 << 20)  # Source of the binary profile
+        self._thread = threading.Thread(target=self._run, name="Bench generator", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def join(self):
+        self._thread.join()
+
+    def is_alive(self):
+        return self._thread.is_alive()
+
+    def _unit(self, probe):
+        # One line of the profile, a probe tag at its start
+        n = self.units
+        self.units += 1
+        tag = b"" if probe is None else b"<@%d@>" % probe
+        if self.profile == "boot":
+            return tag + (
+                b"[%5d.%06d] usb 1-%d: new high-speed USB device number %d using xhci_hcd\n"
+                % (n // 1000, n % 1000 * 997, n % 8, n % 128)
+            )
+        if self.profile == "binary":
+            start = self.random.randrange(len(self._blob) - 256)
+            return tag + self._blob[start : start + 256]
+        if self.profile == "utf8":
+            return tag + (
+                f"{n:08d} 溫度 température 🌡 {n % 50}.{n % 10} °C – значение ✓\n".encode()
+            )
+        if self.profile == "long":
+            return tag + b"%08d " % n + b"0123456789abcdef" * 256 + b"\n"
+        return tag + (
+            b"%08d INFO sensor temp=%d.%d rpm=%d the quick brown fox jumps over\n"
+            % (n, 20 + n % 15, n % 10, 1000 + n % 500)
+        )
+
+    def _run(self):
+        cpu = time.thread_time_ns()
+        pending = bytearray()
+        probe_ends = collections.deque()  # (stream offset after the probe tag, probe)
+        start = time.perf_counter_ns()
+        deadline = start + int(self.seconds * 1e9)
+        next_probe = start
+        interval = self.probe_interval_ms * 1_000_000
+        while True:
+            now = time.perf_counter_ns()
+            if now >= deadline:
+                break
+            elapsed = (now - start) / 1e9
+            if self.profile == "boot":
+                # Busy for BENCH_BOOT_BURST_S out of every second
+                elapsed = int(elapsed) * BENCH_BOOT_BURST_S + min(elapsed % 1, BENCH_BOOT_BURST_S)
+                if not self.bytes_per_s and elapsed % 1 >= BENCH_BOOT_BURST_S:
+                    time.sleep(BENCH_WRITE_MS / 1000)
+                    continue
+            if self.bytes_per_s:
+                due = int(elapsed * self.bytes_per_s) - self.sent
+                if due <= 0:
+                    time.sleep(BENCH_WRITE_MS / 1000)
+                    continue
+            else:
+                due = BENCH_MAX_WRITE
+            while len(pending) < due:
+                probe = None
+                if now >= next_probe:
+                    probe = self.probe_count
+                    self.probe_count += 1
+                    probe_ends.append((self.sent + len(pending) + len(b"<@%d@>" % probe), probe))
+                    next_probe += interval
+                pending += self._unit(probe)
+            data = bytes(pending[:due])
+            del pending[:due]
+            # Stamped before the write, the reader may see the probe before it returns
+            written = time.perf_counter_ns()
+            self.write(data)
+            self.sent += len(data)
+            while probe_ends and probe_ends[0][0] <= self.sent:
+                self.probes[probe_ends.popleft()[1]] = written
+        self.cpu_ns = time.thread_time_ns() - cpu
+
+
+class BenchView:
+    """Stands in for an OutputView in the benchmarks and notes when probes arrive."""
+
+    def __init__(self, view=None):
+        self.view = view  # OutputView that gets the text as well when the GUI is measured
+        self.seen = {}  # Probe number -> time.perf_counter_ns() when it was displayed
+        self.dropped_chunks = 0  # Only written by the reader thread
+        self.dropped_shown = 0
+
+    def append(self, chunks, marks=(), styles=None):
+        if self.view:
+            self.view.append(chunks, marks, styles)
+        now = time.perf_counter_ns()
+        for chunk in chunks:
+            for match in BENCH_PROBE_RE.finditer(chunk):
+                self.seen.setdefault(int(match.group(1)), now)
+
+
+def get_rss_bytes():
+    # Resident memory now, None where it cannot be read
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Only the peak is available here, in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def summarize_times(values_ns):
+    """:return: Percentiles of a list of durations in ms, None values if it is empty."""
+    values = sorted(values_ns)
+    result = {}
+    for name, point in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0)):
+        index = min(len(values) - 1, int(point * len(values)))
+        result[f"{name}_ms"] = round(values[index] / 1e6, 3) if values else None
+    return result
+
+
+def open_bench_port(args, baudrate):
+    """
+    Open the port the generator writes to and the capture reads from.
+
+    A pty pair where the platform has one, loop:// otherwise.
+
+    :return: (pyserial port, function that writes to the other end, function that
+             closes what is left once the port is closed).
+    """
+    read_params = app.calc_read_params(baudrate, args.min_chunk, args.max_wait_ms)
+    if args.bench_port == "pty" and hasattr(os, "openpty"):
+        master, slave = os.openpty()
+        ser = app.open_port(os.ttyname(slave), baudrate, read_params)
+
+        def write(data):
+            view = memoryview(data)
+            while view:
+                view = view[os.write(master, view) :]
+
+        def close():
+            os.close(slave)
+            os.close(master)
+
+        return ser, write, close
+    ser = app.open_port("loop://", baudrate, read_params)
+    return ser, ser.write, lambda: None
+
+
+def bench_pipeline(args, profile, baudrate, seconds, workdir, gui_view=None, samples=None):
+    """
+    Run the generator into the real capture pipeline for one profile and rate.
+
+    Bytes go through a pty (or loop://) into read_from_port, the log writer and the
+    GUI queue, which is flushed like the GUI does. The capture takes the decoding,
+    timestamp, log and read options of the command line.
+
+    :param baudrate: Offered rate, 0 for as fast as the pipeline takes it.
+    :param gui_view: OutputView to display the text in, None to only drain the queue.
+    :param samples: List that gets a memory sample every BENCH_SOAK_SAMPLE_S, for --soak.
+    :return: Dict of results.
+    """
+    ser, write, close = open_bench_port(args, baudrate or 3000000)
+    app.log_writer_pool.flush_interval = max(1, args.flush_ms) / 1000
+    log_path = os.path.join(workdir, f"{profile}_{baudrate}.txt")
+    view = BenchView(gui_view)
+    session = app.PortSession(
+        ser,
+        app.LogWriter(log_path, index_lines=True),
+        app.calc_read_params(baudrate or 3000000, args.min_chunk, args.max_wait_ms)[0],
+        args.timestamp,
+        raw_capture=(
+            app.RawCapture(os.path.splitext(log_path)[0] + app.CAPTURE_EXTENSION, ser.port)
+            if args.raw
+            else None
+        ),
+        decoder=app.create_stream_decoder(args.encoding, args.errors),
+        view=view,
+        ansi_view=app.DEFAULT_ANSI_VIEW if gui_view else "off",
+        ansi_log=args.ansi_log,
+    )
+    app.output_views["bench"] = view
+    # When the reader hands the probes on, what bench_polling_reader can compare with
+    read_seen = {}
+    emit = session.emit
+
+    def emit_noting_probes(lines, formatter=None):
+        now = time.perf_counter_ns()
+        for _, line in lines:
+            for match in BENCH_PROBE_RE.finditer(line):
+                read_seen.setdefault(int(match.group(1)), now)
+        emit(lines, formatter)
+
+    session.emit = emit_noting_probes
+    generator = TrafficGenerator(
+        write,
+        profile,
+        baudrate,
+        seconds,
+        probe_interval_ms=BENCH_PROBE_INTERVAL_MS
+        if samples is None
+        else BENCH_SOAK_PROBE_INTERVAL_MS,
+    )
+    latencies = array("q")
+    read_latencies = array("q")
+
+    def collect_probes():
+        # Probes become latencies as they arrive, a soak must not grow with them
+        probes = generator.probes
+        for probe, read in list(read_seen.items()):
+            if probe in probes:
+                read_latencies.append(read - probes[probe])
+                del read_seen[probe]
+        for probe, shown in list(view.seen.items()):
+            if probe in probes and probe not in read_seen:
+                latencies.append(shown - probes.pop(probe))
+                del view.seen[probe]
+
+    refresh = 1 / app.DEFAULT_GUI_REFRESH_HZ
+    rss_start = rss_peak = get_rss_bytes()
+    next_sample = 0
+    cpu_start = os.times()
+    drain_cpu = time.thread_time_ns()
+    start = time.perf_counter()
+    session.start()
+    generator.start()
+    # Until the generator is done and the reader caught up, or stopped making progress
+    read_at = progress_at = time.perf_counter()
+    last_read = 0
+    while True:
+        time.sleep(refresh)
+        app.flush_gui_queue()
+        collect_probes()
+        if gui_view:
+            app.root.update()
+        now = time.perf_counter()
+        rss = get_rss_bytes()
+        if rss is not None:
+            rss_peak = max(rss_peak, rss)
+        if session.bytes_read != last_read:
+            last_read = session.bytes_read
+            read_at = progress_at = now
+        if samples is not None and now - start >= next_sample:
+            next_sample += BENCH_SOAK_SAMPLE_S
+            sample = {
+                "time_s": round(now - start, 1),
+                "rss_bytes": rss,
+                "bytes_read": session.bytes_read,
+                "log_queued_bytes": session.log_writer.stats()["queued_bytes"],
+            }
+            if gui_view:
+                sample["text_lines"] = int(gui_view.text.index("end-1c").split(".")[0])
+            samples.append(sample)
+            print(f"soak {sample}", file=sys.stderr)
+        if generator.is_alive():
+            continue
+        if session.bytes_read >= generator.sent or now - progress_at > BENCH_DRAIN_TIMEOUT:
+            break
+    session.stop()
+    close()
+    app.flush_gui_queue()
+    collect_probes()
+    elapsed = max(read_at - start, 1e-9)
+    cpu = os.times()
+    cpu_ns = (cpu.user + cpu.system - cpu_start.user - cpu_start.system) * 1e9
+    # Only the capture counts, the generator and the queue draining above are ours
+    cpu_ns -= generator.cpu_ns + time.thread_time_ns() - drain_cpu
+    app.output_views.pop("bench", None)
+    stats = session.log_writer.stats()
+    return {
+        "profile": profile,
+        "baudrate": baudrate,
+        "offered_bytes_per_s": baudrate / 10 if baudrate else None,
+        "bytes_sent": generator.sent,
+        "bytes_read": session.bytes_read,
+        "bytes_lost": generator.sent - session.bytes_read,
+        "throughput_bytes_per_s": round(session.bytes_read / elapsed),
+        "lines": session.lines_read,
+        "log_written_bytes": stats["written_bytes"],
+        "log_dropped_bytes": stats["dropped_bytes"],
+        "log_max_write_ms": round(stats["max_write_latency"] * 1000, 3),
+        "gui_dropped_chunks": view.dropped_chunks,
+        "probes": generator.probe_count,
+        "probes_lost": generator.probe_count - len(latencies),
+        "latency": summarize_times(latencies),
+        "read_latency": summarize_times(read_latencies),
+        "cpu_percent": round(max(0, cpu_ns) / 1e9 / elapsed * 100, 1),
+        "rss_start_bytes": rss_start,
+        "rss_peak_bytes": rss_peak,
+    }
+
+
+def legacy_decode(data):
+    # How the reader of version 1.0 decoded every read, the baseline of the benchmarks
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("latin-1", "ignore")
+
+
+def bench_polling_reader(args, profile, baudrate, seconds, workdir):
+    """
+    Run the generator into the reader of version 1.0, to compare bench_pipeline with.
+
+    That reader polled in_waiting and slept DEFAULT_UART_BUFFER_SIZE / baud rate, cut
+    to one digit, between polls. It decoded every read on its own and wrote and
+    flushed it to the log, then put it in the text widget from the same thread, so
+    latency and read_latency are the same here.
+
+    :param baudrate: Offered rate, 0 for as fast as the reader takes it.
+    :return: Dict of results, the keys of bench_pipeline that apply.
+    """
+    ser, write, close = open_bench_port(args, baudrate or 3000000)
+    delay = app.DEFAULT_UART_BUFFER_SIZE / (baudrate or 3000000)
+    factor = 10 ** -math.floor(math.log10(delay))
+    delay = math.floor(delay * factor) / factor
+    seen = {}  # Probe number -> time.perf_counter_ns() when it was read
+    read = [0, 0]  # Bytes, reads
+    stopping = threading.Event()
+
+    def poll():
+        path = os.path.join(workdir, f"polling_{profile}_{baudrate}.txt")
+        with open(path, "a", encoding="utf-8") as file:
+            while not stopping.is_set():
+                if ser.in_waiting > 0:
+                    data = ser.read(ser.in_waiting)
+                    text = legacy_decode(data)
+                    if args.timestamp:
+                        stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+                        file.write("\n".join(f"{stamp} - {line}" for line in text.splitlines()))
+                    else:
+                        file.write("\n".join(text.splitlines()))
+                    file.flush()
+                    now = time.perf_counter_ns()
+                    for match in BENCH_PROBE_RE.finditer(text):
+                        seen.setdefault(int(match.group(1)), now)
+                    read[0] += len(data)
+                    read[1] += 1
+                time.sleep(delay)
+
+    reader = threading.Thread(target=poll, name="Polling reader", daemon=True)
+    generator = TrafficGenerator(write, profile, baudrate, seconds)
+    cpu_start = os.times()
+    start = time.perf_counter()
+    reader.start()
+    generator.start()
+    generator.join()
+    read_at = progress_at = time.perf_counter()
+    last_read = read[0]
+    while read[0] < generator.sent and time.perf_counter() - progress_at <= BENCH_DRAIN_TIMEOUT:
+        time.sleep(0.01)
+        if read[0] != last_read:
+            last_read = read[0]
+            read_at = progress_at = time.perf_counter()
+    stopping.set()
+    reader.join()
+    ser.close()
+    close()
+    elapsed = max(read_at - start, 1e-9)
+    cpu = os.times()
+    cpu_ns = (cpu.user + cpu.system - cpu_start.user - cpu_start.system) * 1e9 - generator.cpu_ns
+    latencies = [seen[p] - t for p, t in generator.probes.items() if p in seen]
+    return {
+        "profile": profile,
+        "baudrate": baudrate,
+        "poll_delay_s": delay,
+        "bytes_sent": generator.sent,
+        "bytes_read": read[0],
+        "bytes_lost": generator.sent - read[0],
+        "throughput_bytes_per_s": round(read[0] / elapsed),
+        "reads": read[1],
+        "probes": generator.probe_count,
+        "probes_lost": generator.probe_count - len(latencies),
+        "latency": summarize_times(latencies),
+        "read_latency": summarize_times(latencies),
+        "cpu_percent": round(max(0, cpu_ns) / 1e9 / elapsed * 100, 1),
+    }
+
+
+def bench_rate(function, *args, repeat=3):
+    # Best of a few runs, the least disturbed by the rest of the machine
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return max(best, 1e-9)
+
+
+def bench_components(workdir):
+    """
+    Time the stages of the pipeline on their own, in memory, no port involved.
+
+    :return: Dict of stage -> results.
+    """
+    results = {}
+    lines = [
+        f"{n:08d} INFO sensor temp={20 + n % 15}.{n % 10} rpm={1000 + n % 500} word{n % 100} "
+        "the quick brown fox jumps over the lazy dog"
+        for n in range(BENCH_COMPONENT_LINES)
+    ]
+    text = "".join(line + "\n" for line in lines)
+    data = text.encode()
+    chunks = [data[i : i + 4096] for i in range(0, len(data), 4096)]
+
+    def decode_and_frame(errors):
+        decoder = app.create_stream_decoder(app.DEFAULT_ENCODING, errors)
+        framer = app.LineFramer()
+        for chunk in chunks:
+            framer.feed(decoder.decode(chunk), 0)
+
+    for errors in ("replace", "hex"):
+        elapsed = bench_rate(decode_and_frame, errors)
+        results[f"decode_frame_{errors}"] = {"mb_per_s": round(len(data) / elapsed / 1e6, 1)}
+
+    # Mixed traffic, every tenth line binary, decoded per read by the 1.0 decoder and the
+    # stream decoder. A read with one bad byte fell back to latin-1 as a whole in 1.0.
+    import random
+
+    blob = random.Random(0).randbytes(64 * 1024)
+    mixed = b"".join(
+        blob[n % 1000 * 64 : n % 1000 * 64 + 64] if n % 10 == 0 else line.encode() + b"\n"
+        for n, line in enumerate(lines)
+    )
+    mixed_chunks = [mixed[i : i + 4096] for i in range(0, len(mixed), 4096)]
+    elapsed = bench_rate(lambda: [legacy_decode(chunk) for chunk in mixed_chunks])
+    results["decode_mixed_legacy"] = {"mb_per_s": round(len(mixed) / elapsed / 1e6, 1)}
+
+    def stream_decode():
+        decoder = app.create_stream_decoder(app.DEFAULT_ENCODING, app.DEFAULT_DECODE_ERRORS)
+        for chunk in mixed_chunks:
+            decoder.decode(chunk)
+
+    elapsed = bench_rate(stream_decode)
+    results["decode_mixed_stream"] = {"mb_per_s": round(len(mixed) / elapsed / 1e6, 1)}
+
+    formatter = app.TimestampFormatter()
+    arrivals = [time.monotonic_ns() + n * 1000 for n in range(len(lines))]
+    elapsed = bench_rate(lambda: [formatter.format(arrival) for arrival in arrivals])
+    results["timestamp"] = {"lines_per_s": round(len(lines) / elapsed)}
+
+    # ANSI parsing of coloured lines, in batches as the reader hands them over
+    colored = [f"\x1b[3{n % 8}m{line}\x1b[0m" for n, line in enumerate(lines)]
+    batches = [colored[i : i + 100] for i in range(0, len(colored), 100)]
+    elapsed = bench_rate(lambda: [app.AnsiParser().parse(batch) for batch in batches])
+    results["ansi_parse"] = {"lines_per_s": round(len(lines) / elapsed)}
+    colored_text = "\n".join(colored)
+    elapsed = bench_rate(app.strip_ansi, colored_text)
+    results["ansi_strip"] = {"mb_per_s": round(len(colored_text) / elapsed / 1e6, 1)}
+
+    # Highlight matching, no rules costs nothing here, see bench_gui for the insert itself
+    for count in BENCH_RULE_COUNTS[1:]:
+        rules = [(f"rule{i}", rf"word{i}\b", False, "red", "", False) for i in range(count)]
+        rule_highlighter = app.Highlighter(rules)
+        elapsed = bench_rate(rule_highlighter.match_lines, text)
+        results[f"highlight_{count}_rules"] = {"lines_per_s": round(len(lines) / elapsed)}
+
+    # Literal triggers on 4 KB reads, the per read time is what a trigger adds to the latency
+    str_chunks = [text[i : i + 4096] for i in range(0, len(text), 4096)]
+    for count in BENCH_TRIGGER_COUNTS:
+        triggers = [
+            (f"t{i}", f"panic-{i:04d}!", False, False, ["mark"], "", "", 0, "\n")
+            for i in range(count)
+        ]
+        engine = app.TriggerEngine(triggers, None)
+        times = []
+        start = time.perf_counter()
+        for chunk in str_chunks:
+            t = time.perf_counter_ns()
+            engine.feed(chunk, [], 0)
+            times.append(time.perf_counter_ns() - t)
+        elapsed = time.perf_counter() - start
+        results[f"triggers_{count}_literal"] = {
+            "ns_per_byte": round(elapsed * 1e9 / len(text), 2),
+            "read_4k": summarize_times(times),
+        }
+    regex_triggers = [
+        (f"r{i}", rf"fault {i}\b", True, False, ["mark"], "", "", 0, "\n")
+        for i in range(BENCH_TRIGGER_COUNTS[1])
+    ]
+    engine = app.TriggerEngine(regex_triggers, None)
+    framed = [(0, line) for line in lines]
+    elapsed = bench_rate(engine.feed, "", framed, 0)
+    results[f"triggers_{len(regex_triggers)}_regex"] = {"lines_per_s": round(len(lines) / elapsed)}
+
+    # Plot extraction and one redraw worth of decimation
+    for name, pattern in (
+        ("plot_1_series", r"temp=(?P<temp>[-.\d]+)"),
+        ("plot_2_series", r"temp=(?P<temp>[-.\d]+) rpm=(?P<rpm>\d+)"),
+    ):
+        plot_data = app.PlotData([("bench", re.compile(pattern))], app.DEFAULT_PLOT_POINTS)
+        batches = [framed[i : i + 100] for i in range(0, len(framed), 100)]
+        elapsed = bench_rate(
+            lambda plot_data=plot_data, batches=batches: [
+                plot_data.feed(batch) for batch in batches
+            ],
+            repeat=1,
+        )
+        ring = plot_data.series[0][0][1]
+        end = ring.times[(ring.total - 1) % ring.capacity]
+        times = []
+        for _ in range(20):
+            t = time.perf_counter_ns()
+            ring.decimate(end - app.DEFAULT_PLOT_WINDOW_S, end, app.PLOT_WIDTH)
+            times.append(time.perf_counter_ns() - t)
+        results[name] = {
+            "lines_per_s": round(len(lines) / elapsed),
+            "decimate": summarize_times(times),
+        }
+
+    # Raw bytes into the hex view ring and one screen of rows out of it
+    ring = app.ByteRing(app.DEFAULT_HEX_BUFFER_MB * 1024 * 1024)
+    elapsed = bench_rate(lambda: [ring.write(chunk, 0) for chunk in chunks * 4], repeat=1)
+    first, last = ring.row_range(True)
+    times = []
+    for n in range(50):
+        row = first + (last - first) * n // 50
+        t = time.perf_counter_ns()
+        ring.get_rows(row, 60, True)
+        times.append(time.perf_counter_ns() - t)
+    results["hex_ring"] = {
+        "write_mb_per_s": round(len(data) * 4 / elapsed / 1e6, 1),
+        "rows_60": summarize_times(times),
+    }
+
+    # The log writer at different flush intervals, queueing and the drain to disk, and
+    # the write and flush per chunk it replaced on the reader thread
+    flush_interval = app.log_writer_pool.flush_interval
+    small_chunks = [data[i : i + 256] for i in range(0, len(data), 256)]
+    with open(os.path.join(workdir, "writer_per_chunk.txt"), "ab") as file:
+        times = []
+        start = time.perf_counter()
+        for chunk in small_chunks:
+            t = time.perf_counter_ns()
+            file.write(chunk)
+            file.flush()
+            times.append(time.perf_counter_ns() - t)
+        elapsed = time.perf_counter() - start
+    results["log_writer_per_chunk"] = {
+        "disk_mb_per_s": round(len(data) / elapsed / 1e6, 1),
+        "write_256": summarize_times(times),
+    }
+    for flush_ms in BENCH_FLUSH_MS:
+        app.log_writer_pool.flush_interval = flush_ms / 1000
+        writer = app.LogWriter(os.path.join(workdir, f"writer_{flush_ms}.txt"), index_lines=True)
+        start = time.perf_counter()
+        for chunk in small_chunks:
+            writer.write(chunk)
+        queued = time.perf_counter() - start
+        writer.close()
+        elapsed = time.perf_counter() - start
+        results[f"log_writer_{flush_ms}ms"] = {
+            "queue_mb_per_s": round(len(data) / queued / 1e6, 1),
+            "disk_mb_per_s": round(len(data) / elapsed / 1e6, 1),
+            "max_write_ms": round(writer.stats()["max_write_latency"] * 1000, 3),
+        }
+    app.log_writer_pool.flush_interval = flush_interval
+
+    for compression in app.LOG_COMPRESSION_DICT:
+        results[f"log_{compression}"] = bench_log_compression(workdir, compression, chunks)
+
+    results["log_viewer"] = bench_log_viewer(workdir)
+    return results
+
+
+def bench_log_compression(workdir, compression, chunks):
+    """
+    Write a log with this compression and read it back while it is open and once closed.
+
+    :return: Results, round_trip is False if the text did not come back as written.
+    """
+    path = os.path.join(workdir, f"compressed_{compression}.txt")
+    try:
+        writer = app.LogWriter(path, compression=compression)
+    except ImportError as e:
+        return {"skipped": str(e)}
+    data = b"".join(chunks)
+    start = time.perf_counter()
+    for chunk in chunks:
+        writer.write(chunk)
+    while writer.written_offset < len(data):
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    reader = writer.open_reader()
+    while_open = reader.read(0, len(data)) == data
+    reader.close()
+    writer.close()
+    reader = writer.open_reader()
+    closed = reader.read(0, len(data)) == data
+    reader.close()
+    return {
+        "round_trip": while_open and closed,
+        "mb_per_s": round(len(data) / elapsed / 1e6, 1),
+        "ratio": round(len(data) / max(os.path.getsize(writer.path), 1), 1),
+    }
+
+
+def write_bench_log(path, size):
+    # Timestamped lines one second apart, as a log with the timestamp option looks
+    start = datetime(2026, 1, 1).timestamp()
+    with open(path, "wb") as file:
+        n = 0
+        while file.tell() < size:
+            block = "".join(
+                f"{datetime.fromtimestamp(start + i):%Y-%m-%d %H:%M:%S}.000000 - line {i} "
+                "INFO sensor temp=23.5 the quick brown fox jumps over the lazy dog\n"
+                for i in range(n, n + 10000)
+            )
+            file.write(block.encode())
+            n += 10000
+        return n
+
+
+def bench_log_viewer(workdir):
+    """Open a big log like File > Open Log does, see MappedLog."""
+    path = os.path.join(workdir, "viewer.txt")
+    lines = write_bench_log(path, BENCH_VIEWER_MB * 1024 * 1024)
+    start = time.perf_counter()
+    log = app.MappedLog(path)
+    log.read_lines(0, 60)
+    first_page = time.perf_counter() - start
+    while log.line_count is None:
+        time.sleep(0.001)
+    indexed = time.perf_counter() - start
+    t = time.perf_counter()
+    log.read_lines(log.line_offset(lines * 2 // 3), 60)
+    jump_line = time.perf_counter() - t
+    t = time.perf_counter()
+    log.find_time(
+        datetime.fromtimestamp(datetime(2026, 1, 1).timestamp() + lines // 3)
+        .strftime("%Y-%m-%d %H:%M:%S")
+        .encode()
+    )
+    jump_time = time.perf_counter() - t
+    t = time.perf_counter()
+    log.find(re.compile(rb"line %d " % (lines - 1)), 0)
+    searched = time.perf_counter() - t
+    log.close()
+    os.remove(path)
+    return {
+        "file_mb": BENCH_VIEWER_MB,
+        "lines": lines,
+        "first_page_ms": round(first_page * 1000, 3),
+        "index_s": round(indexed, 3),
+        "jump_line_ms": round(jump_line * 1000, 3),
+        "jump_time_ms": round(jump_time * 1000, 3),
+        "search_mb_per_s": round(BENCH_VIEWER_MB * 1.048576 / searched, 1),
+    }
+
+
+def open_bench_window():
+    """
+    Set up the Tk side the output views need, for --bench-gui.
+
+    :return: None, or why there is no window, e.g. no display.
+    """
+    try:
+        app.import_gui_modules()
+    except ImportError as e:
+        return str(e)
+    try:
+        app.root = app.tk.Tk()
+    except app.tk.TclError as e:
+        return str(e)
+    app.root.title(f"Benchmark - {app.APP_NAME}")
+    app.root.geometry(f"{app.APP_WIDTH}x{app.APP_HEIGHT}")
+    app.scrollback_var = app.tk.StringVar(value=str(app.DEFAULT_SCROLLBACK_LINES))
+    app.output_notebook = app.ttk.Notebook(app.root)
+    app.output_notebook.pack(fill=app.tk.BOTH, expand=True)
+    app.root.update()
+    return None
+
+
+def bench_gui(workdir):
+    """
+    Time the Tk side, see open_bench_window: inserting frames into an output view with
+    0, 10 and 100 highlight rules, the first paint of the log viewer and of the app.
+
+    :return: Dict of results.
+    """
+    results = {}
+    frame_lines = [
+        f"{n:08d} INFO sensor temp={20 + n % 15}.{n % 10} word{n % 100} the quick brown fox\n"
+        for n in range(BENCH_GUI_FRAME_LINES)
+    ]
+    frame = "".join(frame_lines)
+    for count in BENCH_RULE_COUNTS:
+        rules = [(f"rule{i}", rf"word{i}\b", False, "red", "", False) for i in range(count)]
+        app.highlighter = app.Highlighter(rules) if rules else None
+        view = app.OutputView(app.output_notebook, f"Bench {count} rules")
+        app.output_notebook.select(view.frame)
+        app.root.update()
+        times = []
+        start = time.perf_counter()
+        for n in range(BENCH_GUI_FRAMES):
+            t = time.perf_counter_ns()
+            # Log marks let the view evict beyond the scrollback limit as it does live
+            view.append([frame], [(0, n * len(frame))])
+            app.root.update()
+            times.append(time.perf_counter_ns() - t)
+        elapsed = time.perf_counter() - start
+        results[f"output_view_{count}_rules"] = {
+            "lines_per_s": round(BENCH_GUI_FRAMES * BENCH_GUI_FRAME_LINES / elapsed),
+            "frame": summarize_times(times),
+        }
+        app.output_notebook.forget(view.frame)
+        view.frame.destroy()
+    app.highlighter = None
+
+    path = os.path.join(workdir, "viewer.txt")
+    write_bench_log(path, BENCH_VIEWER_MB * 1024 * 1024)
+    start = time.perf_counter()
+    viewer = app.LogViewer(path)
+    app.root.update()
+    results["log_viewer_first_paint_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    viewer.close()
+    os.remove(path)
+
+    # The app itself, in a new process as a user starts it
+    command = [sys.executable] if getattr(sys, "frozen", False) else [sys.executable, app.__file__]
+    start = time.perf_counter()
+    result = subprocess.run(
+        command + ["--startup-budget-ms", "60000"], capture_output=True, text=True
+    )
+    match = re.search(r"Time to first paint: (\d+) ms", result.stderr)
+    results["app_first_paint_ms"] = int(match.group(1)) if match else None
+    results["app_process_first_paint_ms"] = round((time.perf_counter() - start) * 1000)
+    return results
+
+
+def get_git_commit():
+    # Identifies the build in the results, None outside a git checkout
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(app.__file__)),
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def run_bench(args):
+    """
+    Benchmark the capture end to end and stage by stage, or soak test it.
+
+    Every profile runs at every rate through a real port, see bench_pipeline, the first
+    profile through the old polling reader as well, see bench_polling_reader, then the
+    stages are timed on their own, see bench_components and bench_gui. --soak runs the
+    first profile at the first rate for that many minutes instead and reports how fast
+    memory grows, faster than --soak-max-growth fails the run. The results are one JSON
+    document, written to --bench-output or stdout, so runs of different commits can be
+    diffed or plotted.
+
+    :param args: Parsed command line, see parse_args.
+    :return: Process exit code.
+    """
+    import shutil
+    import tempfile
+
+    try:
+        profiles = [p.strip() for p in args.bench_profiles.split(",") if p.strip()]
+        unknown = [p for p in profiles if p not in BENCH_PROFILES_LIST]
+        if unknown:
+            raise ValueError(f"unknown profiles {', '.join(unknown)}")
+        rates = [0 if r.strip() == "max" else int(r) for r in args.bench_rates.split(",")]
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    results = {
+        "app_version": app.APP_VERSION,
+        "commit": get_git_commit(),
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "cpu_count": os.cpu_count(),
+        "port": args.bench_port if hasattr(os, "openpty") else "loop://",
+        "failures": [],  # Checks that failed, the exit code is 1 if there are any
+        "options": {
+            "encoding": args.encoding,
+            "errors": args.errors,
+            "timestamp": args.timestamp,
+            "raw": args.raw,
+            "flush_ms": args.flush_ms,
+            "min_chunk": args.min_chunk,
+            "max_wait_ms": args.max_wait_ms,
+        },
+    }
+    gui_view = None
+    if args.bench_gui:
+        error = open_bench_window()
+        if error:
+            print(f"No GUI benchmark: {error}", file=sys.stderr)
+            results["gui"] = {"skipped": error}
+        else:
+            gui_view = app.OutputView(app.output_notebook, "Capture")
+    workdir = tempfile.mkdtemp(prefix="terminaloutgui-bench-")
+    try:
+        if args.soak:
+            samples = []
+            case = bench_pipeline(
+                args, profiles[0], rates[0], args.soak * 60, workdir, gui_view, samples
+            )
+            # Growth over the second half, after buffers and caches have filled up
+            points = [(s["time_s"], s["rss_bytes"]) for s in samples[len(samples) // 2 :]]
+            slope = None
+            if len(points) >= 2 and None not in (rss for t, rss in points):
+                mean_t = sum(t for t, rss in points) / len(points)
+                mean_rss = sum(rss for t, rss in points) / len(points)
+                slope = sum((t - mean_t) * (rss - mean_rss) for t, rss in points) / max(
+                    sum((t - mean_t) ** 2 for t, rss in points), 1e-9
+                )
+            case["samples"] = samples
+            case["rss_growth_mb_per_hour"] = (
+                round(slope * 3600 / 1024 / 1024, 2) if slope is not None else None
+            )
+            results["soak"] = case
+            print(
+                f"soak {profiles[0]} @ {rates[0]}: {case['bytes_lost']} B lost, "
+                f"RSS growth {case['rss_growth_mb_per_hour']} MB/h",
+                file=sys.stderr,
+            )
+            growth = case["rss_growth_mb_per_hour"]
+            if growth is not None and growth > args.soak_max_growth:
+                results["failures"].append(
+                    f"soak: RSS grows {growth} MB/h, more than {args.soak_max_growth} MB/h"
+                )
+        else:
+            results["pipeline"] = []
+            for profile in profiles:
+                for rate in rates:
+                    case = bench_pipeline(
+                        args, profile, rate, args.bench_seconds, workdir, gui_view
+                    )
+                    results["pipeline"].append(case)
+                    print(
+                        f"{profile:>6} @ {rate or 'max':>7}: "
+                        f"{case['throughput_bytes_per_s'] / 1024:8.1f} KiB/s, "
+                        f"lost {case['bytes_lost']} B, latency p50/p99 "
+                        f"{case['latency']['p50_ms']}/{case['latency']['p99_ms']} ms, "
+                        f"read p99 {case['read_latency']['p99_ms']} ms, "
+                        f"CPU {case['cpu_percent']}%, RSS {(case['rss_peak_bytes'] or 0) >> 20} MB",
+                        file=sys.stderr,
+                    )
+            # The same traffic through the polling reader of 1.0, the first profile only
+            results["polling_baseline"] = []
+            for rate in rates:
+                case = bench_polling_reader(args, profiles[0], rate, args.bench_seconds, workdir)
+                results["polling_baseline"].append(case)
+                print(
+                    f"polling {profiles[0]} @ {rate or 'max':>7}: "
+                    f"{case['throughput_bytes_per_s'] / 1024:8.1f} KiB/s, "
+                    f"lost {case['bytes_lost']} B, read latency p50/p99 "
+                    f"{case['read_latency']['p50_ms']}/{case['read_latency']['p99_ms']} ms, "
+                    f"CPU {case['cpu_percent']}%",
+                    file=sys.stderr,
+                )
+            results["components"] = bench_components(workdir)
+            for name, value in results["components"].items():
+                print(f"{name}: {value}", file=sys.stderr)
+                if value.get("round_trip") is False:
+                    results["failures"].append(f"{name}: the log did not read back as written")
+            if gui_view:
+                results["gui"] = bench_gui(workdir)
+                print(f"gui: {results['gui']}", file=sys.stderr)
+    except (serial.SerialException, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        if gui_view:
+            app.root.destroy()
+
+    text = json.dumps(results, indent=2)
+    if args.bench_output:
+        with open(args.bench_output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    for failure in results["failures"]:
+        print(f"Failed: {failure}", file=sys.stderr)
+    return 1 if results["failures"] else 0
+
+
+def parse_args(argv=None):
+    parser = app.make_arg_parser()
+    parser.prog = "capture_bench"
+    parser.description = (
+        "Run the capture benchmarks through a pty (or loop://) and print JSON results."
+    )
+    parser.add_argument(
+        "--bench-profiles",
+        default=",".join(BENCH_PROFILES_LIST),
+        help="Generated traffic, comma separated: " + ", ".join(BENCH_PROFILES_LIST),
+    )
+    parser.add_argument(
+        "--bench-rates",
+        default=DEFAULT_BENCH_RATES,
+        help="Baud rates to offer the traffic at, comma separated, max = unpaced",
+    )
+    parser.add_argument("--bench-seconds", type=float, default=DEFAULT_BENCH_SECONDS)
+    parser.add_argument("--bench-port", choices=["pty", "loop://"], default="pty")
+    parser.add_argument(
+        "--bench-gui",
+        action="store_true",
+        help="Also show the captured text and time the output view, needs a display",
+    )
+    parser.add_argument("--bench-output", metavar="FILE", help="Write the JSON here")
+    parser.add_argument(
+        "--soak",
+        type=float,
+        metavar="MINUTES",
+        help="Capture the first profile at the first rate this long and report memory growth",
+    )
+    parser.add_argument(
+        "--soak-max-growth",
+        type=float,
+        default=BENCH_SOAK_MAX_GROWTH_MB_PER_HOUR,
+        metavar="MB_PER_HOUR",
+        help="Fail the soak if memory grows faster than this",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    return run_bench(parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
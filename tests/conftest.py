@@ -0,0 +1,56 @@
+import os
+import time
+
+import pytest
+
+import TerminalOutGui as app
+
+
+@pytest.fixture
+def pool():
+    """A LogWriterPool of its own, flushing quickly so the tests need not wait."""
+    return app.LogWriterPool(flush_interval=0.001)
+
+
+def read_log(writer):
+    reader = writer.open_reader()
+    data = reader.read(writer.start_offset, writer.written_offset - writer.start_offset)
+    reader.close()
+    return data.replace(os.linesep.encode(), b"\n")
+
+
+@pytest.fixture
+def open_session(tmp_path, pool):
+    sessions = []
+
+    def open_session(start=True, **kwargs):
+        # Without start, e.g. to share the port first, the test starts the session
+        baudrate = 115200
+        read_params = app.calc_read_params(baudrate, 0, 20)
+        ser = app.open_port("loop://", baudrate, read_params)
+        writer = app.LogWriter(str(tmp_path / "session.txt"), pool=pool, index_lines=True)
+        session = app.PortSession(ser, writer, read_params[0], False, **kwargs)
+        sessions.append(session)
+        if start:
+            session.start()
+        return session
+
+    yield open_session
+    for session in sessions:
+        if not session.stopping.is_set():
+            session.stop()
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting")
+        time.sleep(0.005)
+
+
+def write_batch(writer, data):
+    # One write per batch, so rotation happens between the writes
+    offset = writer.write(data)
+    wait_until(lambda: writer.written_offset >= offset + len(data))
+    return offset
@@ -0,0 +1,128 @@
+import os
+
+from conftest import write_batch
+
+import TerminalOutGui as app
+
+SECOND_NS = 1_000_000_000
+
+
+def record(capture, chunks, seconds_apart=0):
+    for chunk in chunks:
+        # Move the capture clock instead of sleeping
+        capture._epoch_ns += seconds_apart * SECOND_NS
+        capture.record(chunk)
+
+
+def test_raw_capture_round_trip(tmp_path, pool):
+    path = str(tmp_path / "session.cap")
+    chunks = [bytes([i]) * (i * 37 % 500) for i in range(1, 200)] + [b"\x00\xff\r\n"]
+    capture = app.RawCapture(path, "COM1", pool=pool)
+    record(capture, chunks)
+    capture.new_session("COM2")
+    record(capture, [b"after reconnect"])
+    capture.close()
+
+    records = list(app.iter_capture(path))
+    assert [data for _, _, data in records] == chunks + [b"after reconnect"]
+    assert {port for _, port, _ in records[:-1]} == {"COM1"}
+    assert records[-1][1] == "COM2"
+    timestamps = [timestamp for timestamp, _, _ in records]
+    assert timestamps == sorted(timestamps)
+    assert capture.stream_offset == sum(len(chunk) for chunk in chunks) + len(b"after reconnect")
+
+
+def test_raw_capture_appends_sessions_to_an_existing_capture(tmp_path, pool):
+    path = str(tmp_path / "session.cap")
+    for port in ("COM1", "COM2"):
+        capture = app.RawCapture(path, port, pool=pool)
+        record(capture, [port.encode()])
+        capture.close()
+    assert [(port, data) for _, port, data in app.iter_capture(path)] == [
+        ("COM1", b"COM1"),
+        ("COM2", b"COM2"),
+    ]
+    with open(path, "rb") as file:
+        assert file.read().count(app.CAPTURE_MAGIC) == 1
+
+
+def test_iter_capture_from_a_start_time(tmp_path, pool, monkeypatch):
+    # An index entry about every record, so the start is found by seeking
+    monkeypatch.setattr(app, "CAPTURE_INDEX_INTERVAL", 64)
+    path = str(tmp_path / "session.cap")
+    capture = app.RawCapture(path, "COM1", pool=pool)
+    record(capture, [f"chunk {i}\n".encode() * 10 for i in range(20)], seconds_apart=1)
+    capture.close()
+    index = app.load_capture_index(path)
+    assert len(index) > 10
+
+    records = list(app.iter_capture(path))
+    for first in (0, 1, 7, 19):
+        start_time = records[first][0]
+        assert list(app.iter_capture(path, start_time)) == records[first:]
+        assert list(app.iter_capture(path, start_time - 1)) == records[first:]
+    assert list(app.iter_capture(path, records[-1][0] + 1)) == []
+
+
+def test_raw_capture_index_counts_only_recorded_bytes(tmp_path, pool, monkeypatch):
+    monkeypatch.setattr(app, "CAPTURE_INDEX_INTERVAL", 1)
+    path = str(tmp_path / "session.cap")
+    capture = app.RawCapture(path, "COM1", pool=pool, max_queued_bytes=200)
+    write_batch(capture.data, b"")  # The magic and the session record are on disk
+    with pool._cond:
+        # Nothing is written while we hold the pool, the queue overflows
+        record(capture, [bytes([i]) * 50 for i in range(10)])
+    capture.close()
+    assert capture.data.dropped_bytes > 0
+
+    records = list(app.iter_capture(path))
+    assert 0 < len(records) < 10
+    recorded = b"".join(data for _, _, data in records)
+    assert capture.stream_offset == len(recorded)
+
+    # The stream offset of an entry is the payload recorded before its record
+    with open(path, "rb") as file:
+        content = file.read()
+    expected = {}
+    offset = len(app.CAPTURE_MAGIC)
+    stream_offset = 0
+    while offset < len(content):
+        _, length, _, kind = app.CAPTURE_RECORD.unpack_from(content, offset)
+        expected[offset] = stream_offset
+        if kind == app.CAPTURE_KIND_DATA:
+            stream_offset += length
+        offset += app.CAPTURE_RECORD.size + length
+    index = app.load_capture_index(path)
+    assert len(index) == len(expected)
+    assert {entry[1]: entry[2] for entry in index} == expected
+
+
+def replay(port):
+    chunks = []
+    while port.is_open:
+        chunks.append(port.read(1))
+    return b"".join(chunks)
+
+
+def test_replay_port_reads_a_capture(tmp_path, pool):
+    path = str(tmp_path / "session.cap")
+    capture = app.RawCapture(path, "COM1", pool=pool)
+    chunks = [f"line {i}\n".encode() for i in range(10)]
+    record(capture, chunks, seconds_apart=1)
+    capture.close()
+
+    port = app.open_port(app.REPLAY_PREFIX + path, 115200, (1, 0.05, 0.01), replay_speed=0)
+    assert port.port == app.REPLAY_PREFIX + path
+    assert replay(port) == b"".join(chunks)
+    # Seconds into the recording, counted from its first record
+    port = app.ReplayPort(path, speed=0, timeout=0.05, start=3)
+    assert replay(port) == b"".join(chunks[3:])
+
+
+def test_replay_port_reads_a_compressed_log(tmp_path, pool):
+    text = b"".join(f"line {i}\n".encode() for i in range(100))
+    writer = app.LogWriter(str(tmp_path / "session.txt"), pool=pool, compression="gzip")
+    writer.write(text)
+    writer.close()
+    assert os.path.basename(writer.path) == "session.txt.gz"
+    assert replay(app.ReplayPort(writer.path, speed=0, timeout=0.05)) == text
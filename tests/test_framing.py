@@ -0,0 +1,73 @@
+import pytest
+
+import TerminalOutGui as app
+
+
+def frame(chunks):
+    framer = app.LineFramer()
+    lines = []
+    for arrival, chunk in enumerate(chunks):
+        lines += framer.feed(chunk, arrival)
+    return lines, framer
+
+
+def test_line_framer_splits_lines():
+    lines, framer = frame(["one\ntwo\r\nthr", "ee\n"])
+    assert lines == [(0, "one"), (0, "two"), (0, "three")]
+    assert framer.flush() == []
+
+
+def test_line_framer_keeps_the_time_of_the_first_character():
+    lines, _ = frame(["a", "b", "c\nd\n"])
+    assert lines == [(0, "abc"), (2, "d")]
+
+
+def test_line_framer_crlf_split_across_reads():
+    lines, _ = frame(["one\r", "\ntwo\r", "\n"])
+    assert lines == [(0, "one"), (1, "two")]
+
+
+def test_line_framer_flush_waits_for_the_timeout():
+    framer = app.LineFramer()
+    assert framer.feed("prompt> ", 100) == []
+    assert framer.flush(150, 100) == []
+    assert framer.flush(200, 100) == [(100, "prompt> ")]
+    assert framer.flush(300, 100) == []
+
+
+@pytest.mark.parametrize("terminator", [["\n"], ["\r\n"], ["\r", "\n"]])
+def test_line_framer_swallows_the_terminator_of_a_flushed_line(terminator):
+    framer = app.LineFramer()
+    framer.feed("prompt", 0)
+    assert framer.flush() == [(0, "prompt")]
+    lines = []
+    for arrival, chunk in enumerate(terminator + ["next\n"], 1):
+        lines += framer.feed(chunk, arrival)
+    assert lines == [(len(terminator) + 1, "next")]
+
+
+def test_line_framer_flushed_line_followed_by_text():
+    framer = app.LineFramer()
+    framer.feed("abc", 0)
+    framer.flush()
+    # Without a terminator the next text starts a line of its own
+    assert framer.feed("def\n", 1) == [(1, "def")]
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-16-le", "gb18030"])
+def test_stream_decoder_multibyte_split_at_every_byte(encoding):
+    text = "temp 23°C 温度 ✓\n"
+    data = text.encode(encoding)
+    for split in range(len(data) + 1):
+        decoder = app.create_stream_decoder(encoding)
+        decoded = decoder.decode(data[:split]) + decoder.decode(data[split:])
+        decoded += decoder.decode(b"", final=True)
+        assert decoded == text
+
+
+def test_stream_decoder_error_handler():
+    decoder = app.create_stream_decoder("utf-8", "replace")
+    counter = app.DecodeErrorCounter(decoder.errors)
+    decoder.errors = counter.name
+    assert decoder.decode(b"a\xffb\xe2\x82", final=True) == "a�b�"
+    assert counter.count == 3
@@ -0,0 +1,183 @@
+import importlib.util
+import os
+import random
+
+import pytest
+from conftest import wait_until, write_batch
+
+import TerminalOutGui as app
+
+
+def has_zstd():
+    # compression.zstd is in the standard library from Python 3.14
+    if importlib.util.find_spec("zstandard"):
+        return True
+    return bool(importlib.util.find_spec("compression")) and bool(
+        importlib.util.find_spec("compression.zstd")
+    )
+
+
+COMPRESSIONS = [
+    "none",
+    "gzip",
+    "lzma",
+    pytest.param(
+        "zstd",
+        marks=pytest.mark.skipif(not has_zstd(), reason="No zstd module installed"),
+    ),
+]
+
+
+def make_lines(count, seed=0):
+    rng = random.Random(seed)
+    return [f"{i:06d} {'x' * rng.randrange(80)}\n".encode() for i in range(count)]
+
+
+def rotating_writer(tmp_path, pool, **kwargs):
+    template = str(tmp_path / "log_{COM}_{SEQ}.txt")
+    return app.LogWriter(
+        app.parse_save_path(template, "COM1"),
+        pool=pool,
+        path_template=template,
+        port="COM1",
+        **kwargs,
+    )
+
+
+def test_log_writer_appends_to_an_existing_log(tmp_path, pool):
+    path = str(tmp_path / "log.txt")
+    with open(path, "wb") as file:
+        file.write(b"old\n")
+    writer = app.LogWriter(path, pool=pool)
+    assert writer.write(b"new\n") == 4
+    writer.close()
+    with open(path, "rb") as file:
+        assert file.read() == b"old\nnew\n"
+    assert writer.stats()["written_bytes"] == 4
+
+
+def test_log_writer_drops_what_does_not_fit_the_queue(tmp_path, pool):
+    writer = app.LogWriter(str(tmp_path / "log.txt"), pool=pool, max_queued_bytes=10)
+    with pool._cond:
+        # The pool cannot take the batch while we hold its condition
+        assert writer.write(b"12345678") == 0
+        assert writer.write(b"abc") is None
+        assert writer.write(b"90") == 8
+    writer.close()
+    assert writer.dropped_bytes == 3
+    with open(writer.path, "rb") as file:
+        assert file.read() == b"1234567890"
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_log_reader_across_rotation_and_compression(tmp_path, pool, compression):
+    writer = rotating_writer(tmp_path, pool, rotate_bytes=1000, compression=compression)
+    reader = writer.open_reader()
+    data = b""
+    for batch in range(20):
+        chunk = b"".join(make_lines(10, batch))
+        assert write_batch(writer, chunk) == len(data)
+        data += chunk
+        # Read while the log is written, the last file is still open
+        assert reader.read(0, len(data)) == data
+    writer.close()
+
+    assert len(writer.segments) > 3
+    paths = [segment[1] for segment in writer.segments]
+    assert all(path.endswith(".txt" + app.LOG_COMPRESSION_DICT[compression]) for path in paths)
+    assert len(set(paths)) == len(paths)
+
+    # Backwards and forwards, across file boundaries
+    rng = random.Random(1)
+    for _ in range(50):
+        offset = rng.randrange(len(data))
+        size = rng.randrange(1, 3000)
+        assert reader.read(offset, size) == data[offset : offset + size]
+    assert reader.read(len(data), 10) == b""
+    reader.close()
+
+    # Every file decompresses on its own
+    stored = b""
+    for path in paths:
+        with app.open_log_file(path, "rb", compression) as file:
+            stored += file.read()
+    assert stored == data
+
+
+def test_log_reader_skips_files_deleted_by_retention(tmp_path, pool):
+    writer = rotating_writer(tmp_path, pool, rotate_bytes=100, keep_files=2)
+    data = b""
+    for batch in range(10):
+        chunk = b"".join(make_lines(3, batch))
+        write_batch(writer, chunk)
+        data += chunk
+    writer.close()
+    assert len(os.listdir(tmp_path)) == 2
+    assert len(writer.segments) == 2
+    reader = writer.open_reader()
+    oldest = writer.segments[0][0]
+    assert reader.read(0, 10) == b""
+    assert reader.read(oldest, len(data)) == data[oldest:]
+    reader.close()
+
+
+def test_line_index_matches_the_log(tmp_path, pool):
+    writer = rotating_writer(tmp_path, pool, index_lines=True, rotate_bytes=50_000)
+    lines = make_lines(5000)
+    for first in range(0, len(lines), 700):
+        write_batch(writer, b"".join(lines[first : first + 700]))
+    writer.close()
+    data = b"".join(lines)
+    index = writer.line_index
+    assert index.line_count == len(lines)
+    assert len(index.offsets) > 2  # Checkpoints by interval and at every file
+
+    reader = writer.open_reader()
+    starts = [0]
+    for line in lines:
+        starts.append(starts[-1] + len(line))
+    rng = random.Random(2)
+    for offset in [0, len(data)] + [rng.randrange(len(data)) for _ in range(200)]:
+        assert index.line_at(offset, reader) == data.count(b"\n", 0, offset)
+    edges = [0, 1, app.LOG_INDEX_INTERVAL_LINES, app.LOG_INDEX_INTERVAL_LINES + 1, len(lines)]
+    for line in edges + [rng.randrange(len(lines)) for _ in range(200)]:
+        assert index.line_offset(line, reader) == starts[line]
+    reader.close()
+
+
+def search(writer, pattern, **kwargs):
+    log_search = app.LogSearch(writer, pattern, keep_lines=1000, **kwargs)
+    wait_until(log_search.is_done)
+    log_search.cancel()
+    return log_search.take_recent(0)
+
+
+def test_log_search_finds_every_matching_line(tmp_path, pool):
+    writer = app.LogWriter(str(tmp_path / "log.txt"), pool=pool)
+    writer.write(b"boot\r\nERROR one\nok\nerror two, error again\nok\nlast error")
+    writer.close()
+    assert search(writer, "error") == (
+        3,
+        [(1, "ERROR one"), (3, "error two, error again"), (5, "last error")],
+    )
+    assert search(writer, "error", ignore_case=False) == (
+        2,
+        [(3, "error two, error again"), (5, "last error")],
+    )
+    assert search(writer, r"^o.$", use_regex=True) == (0, [])
+    assert search(writer, r"(?m)^ok$", use_regex=True) == (2, [(2, "ok"), (4, "ok")])
+
+
+def test_log_search_follows_the_log(tmp_path, pool):
+    writer = app.LogWriter(str(tmp_path / "log.txt"), pool=pool)
+    log_search = app.LogSearch(writer, "hit", keep_lines=10)
+    write_batch(writer, b"hit 0\nmiss\n")
+    wait_until(lambda: log_search.take_recent(0)[0] == 1)
+    # An unterminated line is only searched once it is complete
+    write_batch(writer, b"miss\nhit ")
+    write_batch(writer, b"1\n")
+    wait_until(lambda: log_search.take_recent(0)[0] == 2)
+    assert log_search.take_recent(1) == (2, [(3, "hit 1")])
+    writer.close()
+    wait_until(log_search.is_done)
+    log_search.cancel()
@@ -0,0 +1,133 @@
+import configparser
+import random
+import re
+
+import pytest
+
+import TerminalOutGui as app
+
+
+def find_all(patterns, text):
+    return sorted(
+        (pos + len(pattern), index)
+        for index, pattern in enumerate(patterns)
+        for pos in range(len(text))
+        if text.startswith(pattern, pos)
+    )
+
+
+def test_aho_corasick_matches_overlapping_patterns():
+    patterns = ["he", "she", "his", "hers", "e"]
+    _, matches = app.AhoCorasick(patterns).feed("ushers and his")
+    assert sorted(matches) == find_all(patterns, "ushers and his")
+
+
+def test_aho_corasick_without_patterns():
+    assert app.AhoCorasick([]).feed("anything") == (0, [])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_aho_corasick_across_chunks(seed):
+    rng = random.Random(seed)
+    patterns = ["".join(rng.choice("abc") for _ in range(rng.randint(1, 5))) for _ in range(20)]
+    text = "".join(rng.choice("abcd") for _ in range(2000))
+    automaton = app.AhoCorasick(patterns)
+    state = 0
+    matches = []
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(1, 7)
+        state, found = automaton.feed(text[pos : pos + size], state)
+        matches += [(pos + end, index) for end, index in found]
+        pos += size
+    assert sorted(matches) == find_all(patterns, text)
+
+
+def test_join_rule_patterns_leaves_out_group_references():
+    regexes = [
+        re.compile(r"(?:err)"),
+        re.compile(r"(?:(a)\1)"),
+        re.compile(r"(?:(?P<value>\d+))"),
+        re.compile(r"(?:(?P<value>x))"),
+        re.compile(r"(?:c:\\\\1)"),
+    ]
+    joined, indexes = app.join_rule_patterns(regexes)
+    assert indexes == [0, 2, 4]
+    assert joined.pattern == r"(?:err)|(?:(?P<value>\d+))|(?:c:\\\\1)"
+    assert app.join_rule_patterns([regexes[1]]) == (None, [])
+
+
+def load_triggers(text):
+    config = configparser.ConfigParser(interpolation=None)
+    config.read_string(text)
+    return app.load_triggers(config)
+
+
+TRIGGERS = """
+[Trigger:panic]
+pattern = PANIC
+
+[Trigger:warn]
+pattern = warn
+ignore_case = true
+
+[Trigger:temp]
+pattern = temp=(\\d+)
+regex = true
+
+[Trigger:reset]
+pattern = reset
+regex = true
+cooldown_ms = 1000
+
+[Trigger:off]
+pattern = off
+enabled = false
+"""
+
+
+def feed(engine, chunks):
+    framer = app.LineFramer()
+    for arrival, chunk in chunks:
+        engine.feed(chunk, framer.feed(chunk, arrival), arrival)
+    return engine.take_marks()
+
+
+def test_trigger_engine_literal_triggers_fire_on_the_chunk():
+    engine = app.TriggerEngine(load_triggers(TRIGGERS), None)
+    marks = feed(engine, [(1, "kernel PA"), (2, "NIC at "), (3, "WARNing\n")])
+    # A literal trigger fires with the read that completes it, before its line ends
+    assert marks == [(2, "--- trigger panic: PANIC ---"), (3, "--- trigger warn: warn ---")]
+    assert engine.fires == 2
+
+
+def test_trigger_engine_regex_triggers_fire_on_lines():
+    engine = app.TriggerEngine(load_triggers(TRIGGERS), None)
+    marks = feed(
+        engine,
+        [(1, "temp="), (2, "42 then reset\n"), (3, "reset\n"), (2_000_000_000, "reset\n")],
+    )
+    assert marks == [
+        (1, "--- trigger temp: temp=42 ---"),
+        (1, "--- trigger reset: reset ---"),
+        # Within the cooldown of the first one
+        (2_000_000_000, "--- trigger reset: reset ---"),
+    ]
+
+
+def test_highlighter_first_match_in_a_line_wins():
+    highlighter = app.Highlighter(
+        [
+            ("error", "error", True, "red", "", True),
+            ("warn", "warn", False, "orange", "", False),
+            ("repeat", r"(\w)\1", False, "blue", "", False),
+            ("broken", "(", False, "", "", False),
+        ]
+    )
+    assert len(highlighter.rules) == 3
+    text = "ok\nwarn then ERROR\nerror then warn\nnoon\nwarn\n"
+    assert highlighter.match_lines(text, 10) == {
+        "highlight_1": [11, 14],
+        "highlight_0": [12],
+        "highlight_2": [13],
+    }
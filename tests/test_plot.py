@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+import TerminalOutGui as app
+
+
+def brute_force(samples, start_time, end_time, width, size=1, oldest=0):
+    """Min and max per pixel column, blocks of size samples go to the column of their first."""
+    minimums = [None] * width
+    maximums = [None] * width
+    scale = width / (end_time - start_time)
+    blocks = {}
+    for index, (t, value) in enumerate(samples):
+        if index >= oldest and t >= start_time:
+            blocks.setdefault(index // size, []).append((t, value))
+    for block in blocks.values():
+        x = int((block[0][0] - start_time) * scale)
+        if not 0 <= x < width:
+            continue
+        low = min(value for _, value in block)
+        high = max(value for _, value in block)
+        minimums[x] = low if minimums[x] is None else min(minimums[x], low)
+        maximums[x] = high if maximums[x] is None else max(maximums[x], high)
+    return minimums, maximums
+
+
+def test_series_ring_capacity_is_whole_blocks():
+    block = app.PLOT_DECIMATION_LEVELS[-1]
+    assert app.SeriesRing(1).capacity == block
+    assert app.SeriesRing(block + 1).capacity == 2 * block
+
+
+def test_series_ring_last():
+    ring = app.SeriesRing(10)
+    assert ring.last is None
+    ring.append(0.0, 3.0)
+    ring.append(1.0, -1.5)
+    assert ring.last == -1.5
+
+
+@pytest.mark.parametrize(("count", "size"), [(10, 1), (1000, 16), (10_000, 256), (100_000, 4096)])
+def test_series_ring_decimate_matches_the_samples(count, size):
+    rng = random.Random(count)
+    ring = app.SeriesRing(count)
+    samples = [(i * 0.01, rng.uniform(-100, 100)) for i in range(count)]
+    for t, value in samples:
+        ring.append(t, value)
+    width = 50
+    end_time = count * 0.01
+    minimums, maximums = ring.decimate(0.0, end_time, width)
+    # The level is picked by the number of samples, blocks keep the extremes of their samples
+    assert (minimums, maximums) == brute_force(samples, 0.0, end_time, width, size)
+    assert min(value for value in minimums if value is not None) == min(v for _, v in samples)
+    assert max(value for value in maximums if value is not None) == max(v for _, v in samples)
+
+
+def test_series_ring_decimate_after_wrapping():
+    ring = app.SeriesRing(1)
+    capacity = ring.capacity
+    samples = [(float(i), float(i % 97)) for i in range(3 * capacity + 5)]
+    for t, value in samples:
+        ring.append(t, value)
+    oldest = len(samples) - capacity
+    start_time = samples[oldest][0]
+    end_time = samples[-1][0] + 1
+    # A window that reaches back past the overwritten samples only sees the kept ones
+    assert ring.decimate(0.0, end_time, 64) == brute_force(samples, 0.0, end_time, 64, 256, oldest)
+    assert ring.decimate(start_time, end_time, 64) == brute_force(
+        samples, start_time, end_time, 64, 256, oldest
+    )
+
+
+def test_series_ring_decimate_empty_window():
+    ring = app.SeriesRing(10)
+    ring.append(1.0, 1.0)
+    assert ring.decimate(5.0, 6.0, 4) == ([None] * 4, [None] * 4)
+    assert ring.decimate(1.0, 1.0, 4) == ([None] * 4, [None] * 4)
@@ -0,0 +1,49 @@
+import configparser
+
+from conftest import read_log, wait_until
+
+import TerminalOutGui as app
+
+
+def test_port_session_logs_what_the_port_echoes(open_session):
+    session = open_session()
+    session.transmitter.send_text("hello\nwörld", line_ending="\r\n")
+    wait_until(lambda: session.lines_read == 2)
+    session.stop()
+    assert read_log(session.log_writer) == "hello\nwörld\n".encode()
+    assert session.bytes_read == len("hello\r\nwörld\r\n".encode())
+    assert session.transmitter.bytes_sent == session.bytes_read
+    assert session.log_writer.line_index.line_count == 2
+
+
+def test_port_session_flushes_an_unterminated_line(open_session):
+    session = open_session()
+    session.transmitter.send_bytes(b"login: ")
+    wait_until(lambda: session.lines_read == 1, timeout=app.LINE_FLUSH_TIMEOUT_NS / 1e9 + 5)
+    session.transmitter.send_bytes(b"\nroot\n")
+    wait_until(lambda: session.lines_read == 2)
+    session.stop()
+    assert read_log(session.log_writer) == b"login: \nroot\n"
+
+
+def test_port_session_records_a_raw_capture(open_session, tmp_path, pool):
+    path = str(tmp_path / "session.cap")
+    session = open_session(raw_capture=app.RawCapture(path, "loop://", pool=pool))
+    data = bytes(range(256)) + b"\n"
+    session.transmitter.send_bytes(data)
+    wait_until(lambda: session.bytes_read == len(data))
+    session.stop()
+    assert b"".join(chunk for _, _, chunk in app.iter_capture(path)) == data
+    assert {port for _, port, _ in app.iter_capture(path)} == {"loop://"}
+
+
+def test_port_session_trigger_sends_a_reply(open_session):
+    config = configparser.ConfigParser(interpolation=None)
+    config.read_string("[Trigger:ping]\npattern = ping\nactions = mark, send\nsend = pong\n")
+    session = open_session(triggers=app.load_triggers(config))
+    session.transmitter.send_text("ping")
+    # The reply comes back through the loop, pong does not match again
+    wait_until(lambda: session.lines_read == 3)
+    session.stop()
+    assert read_log(session.log_writer) == b"ping\n--- trigger ping: ping ---\npong\n"
+    assert session.triggers.fires == 1
@@ -0,0 +1,145 @@
+import base64
+import hashlib
+import os
+import socket
+
+import pytest
+from conftest import read_log, wait_until
+
+import TerminalOutGui as app
+
+
+@pytest.fixture
+def shared_session(open_session):
+    def shared_session(**kwargs):
+        # The reader picks up the share when it starts
+        session = open_session(start=False)
+        session.share = app.ShareServer(session, port=0, bind="127.0.0.1", **kwargs)
+        session.start()
+        return session
+
+    return shared_session
+
+
+def connect(share):
+    return socket.create_connection(share.address, timeout=5)
+
+
+def receive(client, size):
+    data = b""
+    while len(data) < size:
+        chunk = client.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def handshake(client, origin=None):
+    key = base64.b64encode(os.urandom(16))
+    request = b"GET / HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\n"
+    request += b"Connection: Upgrade\r\nSec-WebSocket-Key: " + key + b"\r\n"
+    if origin:
+        request += f"Origin: {origin}\r\n".encode()
+    client.sendall(request + b"\r\n")
+    response = b""
+    while b"\r\n\r\n" not in response:
+        chunk = client.recv(1024)
+        if not chunk:
+            break
+        response += chunk
+    status, *lines = response.split(b"\r\n\r\n")[0].decode().split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines)
+    if status.startswith("HTTP/1.1 101"):
+        accept = base64.b64encode(hashlib.sha1(key + app.WEBSOCKET_GUID).digest()).decode()
+        assert headers["Sec-WebSocket-Accept"] == accept
+    return status
+
+
+def send_frame(client, payload, opcode=0x2):
+    # Clients mask their frames
+    mask = os.urandom(4)
+    masked = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+    client.sendall(bytes([0x80 | opcode, 0x80 | len(payload)]) + mask + masked)
+
+
+def receive_frame(client):
+    first, size = receive(client, 2)
+    assert size < 126
+    return first & 0x0F, receive(client, size)
+
+
+def test_share_tcp_client_writes_to_the_port(shared_session):
+    session = shared_session(mode="raw", write=True)
+    share = session.share
+    with connect(share) as client:
+        client.sendall(b"hello\n")
+        # Written to the port, echoed by loop:// and shared back
+        assert receive(client, 6) == b"hello\n"
+        wait_until(lambda: session.lines_read == 1)
+    session.stop()
+    assert read_log(session.log_writer) == b"hello\n"
+    assert share.bytes_received == 6
+    assert share.clients_total == 1
+
+
+def test_share_write_is_off_by_default(shared_session):
+    session = shared_session()
+    share = session.share
+    assert not share.write_enabled
+    with connect(share) as client:
+        client.sendall(b"ignored\n")
+        wait_until(lambda: share.bytes_received == 8)
+    session.stop()
+    assert session.transmitter.bytes_sent == 0
+    assert session.bytes_read == 0
+
+
+def test_share_lines_mode_sends_the_logged_lines(shared_session):
+    session = shared_session(mode="lines")
+    share = session.share
+    with connect(share) as client:
+        # A silent client is taken for plain TCP after SHARE_DETECT_TIMEOUT
+        wait_until(lambda: share.clients)
+        session.transmitter.send_bytes(b"one\r\ntw")
+        session.transmitter.send_bytes(b"o\r\n")
+        expected = app.encode_log_text("one\ntwo\n")
+        assert receive(client, len(expected)) == expected
+
+
+def test_share_websocket_client(shared_session):
+    session = shared_session(mode="raw", write=True)
+    with connect(session.share) as client:
+        assert handshake(client).startswith("HTTP/1.1 101")
+        send_frame(client, b"ws\n")
+        assert receive_frame(client) == (0x2, b"ws\n")
+        send_frame(client, b"beat", opcode=0x9)
+        assert receive_frame(client) == (0xA, b"beat")
+        send_frame(client, b"\x03\xe8", opcode=0x8)
+        assert receive_frame(client) == (0x8, b"\x03\xe8")
+        assert client.recv(1) == b""
+
+
+@pytest.mark.parametrize(
+    ("origin", "allowed"),
+    [
+        (None, True),  # Not a browser
+        ("http://localhost:8000", True),
+        ("http://127.0.0.1", True),
+        ("http://[::1]:3000", True),
+        ("https://dash.example/", True),
+        ("http://evil.example", False),
+        ("http://localhost.evil.example", False),
+        ("https://dash.example:8443", False),
+        ("null", False),
+    ],
+)
+def test_share_websocket_origin(shared_session, origin, allowed):
+    origins = app.parse_share_origins("https://Dash.example/, ")
+    session = shared_session(write=True, origins=origins)
+    with connect(session.share) as client:
+        status = handshake(client, origin)
+        assert status.startswith("HTTP/1.1 101" if allowed else "HTTP/1.1 403")
+        if not allowed:
+            assert client.recv(1) == b""
+            assert not session.share.clients